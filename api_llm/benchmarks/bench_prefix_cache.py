@@ -0,0 +1,113 @@
+"""
+Benchmark de stabilité du préfixe de prompt (cache de préfixe fournisseur).
+
+Rejoue des sessions de chat synthétiques à travers PromptBuilder et le
+substitut local src/fake_llm.py, puis mesure :
+- la stabilité du préfixe : part des tours dont le prompt commence par le
+  prompt du tour précédent (condition pour que le fournisseur le serve du cache) ;
+- la part de tokens de prompt servis depuis le cache simulé ;
+- la latence simulée (le fake ne dort pas : les chiffres sont calculés).
+
+Deux dispositions sont comparées : troncature par paliers (défaut) et
+troncature glissante (un tour retiré à chaque nouveau tour, PROMPT_TRUNCATE_STEP=0).
+
+Usage (depuis api_llm/) :
+    python -m benchmarks.bench_prefix_cache [--sessions 200] [--turns 12] [--budget 1500]
+"""
+
+import argparse
+import random
+import statistics
+from typing import Dict, List
+
+from src.fake_llm import FakeCompletions
+from src.prompt_builder import PromptBuilder
+
+TOPICS = [
+    "ma facture du mois dernier est incorrecte, le montant prélevé est plus élevé que prévu",
+    "je n'arrive plus à me connecter à mon compte depuis la mise à jour de l'application",
+    "ma commande n'est toujours pas livrée alors que le suivi indique qu'elle est expédiée",
+    "je voudrais modifier l'adresse e-mail associée à mon compte client",
+    "le produit reçu est endommagé et je souhaite obtenir un remboursement",
+]
+FOLLOW_UPS = [
+    "Pouvez-vous vérifier s'il vous plaît ?",
+    "J'ai déjà essayé de redémarrer et de vider le cache, sans succès.",
+    "Mon numéro de commande est le {n}, passée il y a {d} jours.",
+    "C'est assez urgent, j'en ai besoin pour mon travail cette semaine.",
+    "Merci, et combien de temps faut-il compter pour le traitement ?",
+]
+
+
+def make_sessions(count: int, turns: int, seed: int = 7) -> List[List[str]]:
+    rng = random.Random(seed)
+    sessions = []
+    for _ in range(count):
+        messages = [f"Bonjour, {rng.choice(TOPICS)}."]
+        for _ in range(turns - 1):
+            text = rng.choice(FOLLOW_UPS).format(n=rng.randint(10000, 99999), d=rng.randint(2, 30))
+            # Longueur variable : certains clients détaillent beaucoup
+            messages.append(" ".join([text] * rng.randint(1, 6)))
+        sessions.append(messages)
+    return sessions
+
+
+def replay(sessions: List[List[str]], builder: PromptBuilder, fake: FakeCompletions) -> Dict:
+    latencies, stable, follow_ups = [], 0, 0
+    prompt_tokens = cached_tokens = 0
+    prefixes = set()
+    for messages in sessions:
+        history: List[Dict] = []
+        previous = None
+        for message in messages:
+            prompt = builder.chat(message, history)
+            prefixes.add(prompt.prefix_id)
+            if previous is not None:
+                follow_ups += 1
+                stable += prompt.messages[:len(previous)] == previous
+            response = fake.create(model="fake", messages=prompt.messages)
+            latencies.append(response.simulated_latency_ms)
+            prompt_tokens += response.usage.prompt_tokens
+            cached_tokens += response.usage.prompt_tokens_details.cached_tokens
+            reply = response.choices[0].message.content
+            previous = prompt.messages + [{"role": "assistant", "content": reply}]
+            history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "system_prefixes": len(prefixes),
+        "prefix_stability": stable / max(1, follow_ups),
+        "cached_ratio": cached_tokens / max(1, prompt_tokens),
+        "avg_prompt_tokens": prompt_tokens / max(1, len(latencies)),
+        "latency_p50": statistics.median(latencies),
+        "latency_p95": latencies[int(len(latencies) * 0.95) - 1],
+        "latency_mean": statistics.fmean(latencies),
+    }
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de stabilité du préfixe de prompt")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--budget", type=int, default=1500, help="Budget de tokens du prompt")
+    parser.add_argument("--min-prefix", type=int, default=1024, help="Seuil d'activation du cache simulé")
+    parser.add_argument("--step", type=float, default=0.25, help="Palier de troncature (disposition stable)")
+    args = parser.parse_args(argv)
+
+    sessions = make_sessions(args.sessions, args.turns)
+    layouts = {
+        f"paliers ({args.step:g})": PromptBuilder(budget=args.budget, truncate_step=args.step),
+        "glissante": PromptBuilder(budget=args.budget, truncate_step=0),
+    }
+    print(f"{args.sessions} sessions x {args.turns} tours, budget {args.budget} tokens\n")
+    print(f"{'disposition':<16}{'préfixe stable':>16}{'tokens cachés':>15}{'tokens/appel':>14}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'moy. ms':>9}")
+    for name, builder in layouts.items():
+        r = replay(sessions, builder, FakeCompletions(min_prefix_tokens=args.min_prefix))
+        assert r["system_prefixes"] == 1, "le message système doit être identique d'un appel à l'autre"
+        print(f"{name:<16}{r['prefix_stability']:>15.1%}{r['cached_ratio']:>15.1%}{r['avg_prompt_tokens']:>14.0f}"
+              f"{r['latency_p50']:>9.0f}{r['latency_p95']:>9.0f}{r['latency_mean']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
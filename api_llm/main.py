@@ -1,27 +1,164 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from openai import OpenAI
+import asyncio
 import os
-import json
-import re
+import time
 import logging
 
+from src.generation import Generation, OutputStats, generate, policies_from_env
+from src.knowledge import knowledge_base_from_env
+from src.preclassifier import PreClassifier
+from src.prompt_builder import Prompt, PromptBuilder, PromptTooLarge
+from src.routing import RouteDecision, router_from_env
+from src.scheduler import Priority, SchedulerOverloaded, scheduler_from_env
+from src.shared_state import ResponseCache, shared_store_from_env
+from src.utils import ParseStats, PromptCacheStats, safe_json_parse, validate_classification
+
 # Charger les variables d'environnement
 load_dotenv()
 
-# Initialisation du client OpenAI
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("La clé API OpenAI est manquante. Vérifiez le fichier .env.")
-client = OpenAI(api_key=api_key)
+# Client OpenAI créé au démarrage du serveur (lifespan), pas à l'import :
+# le SDK openai (httpx, pydantic, types) est lourd à charger.
+client = None
+# Base de connaissances (KB_PATH), chargée au démarrage elle aussi
+knowledge_base = None
+
+
+def create_client():
+    if os.getenv("LLM_FAKE", "false").lower() == "true":
+        # Substitut local (sans réseau ni clé) : développement et benchmarks
+        from src.fake_llm import FakeOpenAI
+
+        return FakeOpenAI()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("La clé API OpenAI est manquante. Vérifiez le fichier .env.")
+    from openai import OpenAI
+
+    return OpenAI(api_key=api_key)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, knowledge_base
+    if client is None:
+        client = await asyncio.to_thread(create_client)
+    if knowledge_base is None:
+        knowledge_base = await asyncio.to_thread(knowledge_base_from_env)
+    yield
+
 
 # Configuration de l'application FastAPI
-app = FastAPI(title="SmartSupport LLM Proxy", version="1.0.0")
+app = FastAPI(title="SmartSupport LLM Proxy", version="1.0.0", lifespan=lifespan)
 
 # Configuration des logs
 logging.basicConfig(level=logging.INFO)
 
+# État commun aux workers (serve.py --workers N) : quota OpenAI et cache
+shared_store = shared_store_from_env()
+
+# Ordonnanceur partagé : quota OpenAI commun à /chats et /classify
+scheduler = scheduler_from_env(shared_store)
+
+# Classifications déjà calculées (même conversation reclassifiée, renvois du backend)
+classify_cache = ResponseCache(shared_store, ttl=float(os.getenv("CLASSIFY_CACHE_TTL", "3600")))
+
+# Choix du modèle par tâche et complexité
+router = router_from_env()
+
+# Classification locale (règles + modèle chargé à la demande)
+preclassifier = PreClassifier()
+classify_sources = {"heuristic": 0, "llm": 0}
+
+# Assemblage des prompts (gabarits précompilés, budget de tokens)
+prompts = PromptBuilder()
+
+# Sortie JSON native du modèle (désactivable pour les modèles qui ne la gèrent pas)
+JSON_MODE = os.getenv("LLM_JSON_MODE", "true").lower() == "true"
+parse_stats = ParseStats()
+# Tokens servis depuis le cache de préfixe du fournisseur (disposition stable des prompts)
+prompt_cache = PromptCacheStats()
+
+# Longueur de sortie par tâche (max_tokens, séquences d'arrêt, échéance de génération)
+output_policies = policies_from_env()
+output_stats = OutputStats()
+
+
+def overloaded(exc: SchedulerOverloaded) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(exc),
+        headers={"Retry-After": str(int(exc.retry_after) + 1)},
+    )
+
+
+def too_large(exc: PromptTooLarge) -> HTTPException:
+    return HTTPException(status_code=413, detail=str(exc))
+
+
+def model_failure(exc: Exception, what: str) -> HTTPException:
+    # 502 : le backend compte l'échec dans son disjoncteur et n'enregistre pas de réponse
+    logging.error(f"Erreur OpenAI : {str(exc)}")
+    return HTTPException(status_code=502, detail=f"Erreur lors de la {what} : {str(exc)}")
+
+
+async def complete(task: str, priority: Priority, decision: RouteDecision, prompt: Prompt, **params) -> Generation:
+    """
+    Appel OpenAI ordonnancé sous la politique de sortie de la tâche, avec
+    mesure de latence/coût pour le routeur.
+    """
+    policy = output_policies[task]
+    start = time.perf_counter()
+    # Le quota TPM d'OpenAI compte max_tokens dès l'envoi de la requête
+    generation = await scheduler.run(
+        priority,
+        prompt.tokens + policy.max_tokens,
+        lambda: generate(
+            client.chat.completions.create,
+            policy,
+            model=decision.model,
+            messages=prompt.messages,
+            **params
+        ),
+        used_tokens=lambda g: getattr(g.usage, "total_tokens", 0) or prompt.tokens + g.completion_tokens,
+    )
+    usage = generation.usage
+    if usage is not None:
+        prompt_cache.record(task, usage)
+    output_stats.record(generation)
+    router.record(
+        decision,
+        (time.perf_counter() - start) * 1000,
+        getattr(usage, "total_tokens", 0) or prompt.tokens + generation.completion_tokens,
+    )
+    if generation.over_length:
+        logging.warning(
+            f"Réponse {task} trop longue ({generation.finish_reason}) : "
+            f"{generation.completion_tokens} tokens en {generation.elapsed_ms:.0f} ms"
+        )
+    return generation
+
+async def retrieve_context(message: str, history: list[dict]) -> list[str]:
+    """
+    Passages de la base de connaissances pour ce tour. La recherche respecte
+    son propre budget (KB_LATENCY_BUDGET_MS) ; l'attente est en plus bornée
+    ici : une base lente ou en erreur ne retarde pas la réponse.
+    """
+    if knowledge_base is None:
+        return []
+    query = knowledge_base.query_text(message, history)
+    try:
+        passages = await asyncio.wait_for(
+            asyncio.to_thread(knowledge_base.retrieve, query),
+            timeout=2 * knowledge_base.budget_ms / 1000,
+        )
+    except Exception as e:
+        logging.warning(f"Base de connaissances ignorée pour ce tour : {e!r}")
+        return []
+    return [p.text for p in passages]
+
 # Modèles de requêtes
 class ChatReq(BaseModel):
     message: str
@@ -35,59 +172,91 @@ async def chats(req: ChatReq):
     """
     Endpoint pour gérer les conversations avec le chatbot.
     """
-    system_prompt = {
-        "role": "system",
-        "content": (
-            "Tu es SmartSupport, un assistant client intelligent, bienveillant et professionnel. "
-            "Tu réponds en français de manière claire, utile et concise, même en cas d’erreur. "
-            "Tu peux poser des questions pour mieux comprendre les besoins de l’utilisateur."
-        )
-    }
-
-    messages = [
-        system_prompt,
-        *[{ "role": m["role"], "content": m["content"] } for m in req.conversation_history],
-        { "role": "user", "content": req.message }
-    ]
+    # L'historique du backend ne contient que les tours précédents ; les
+    # éventuels messages système ou doublons du message courant sont retirés.
+    context = await retrieve_context(req.message, req.conversation_history)
+    try:
+        prompt = prompts.chat(req.message, req.conversation_history, context=context)
+    except PromptTooLarge as e:
+        raise too_large(e)
 
-    logging.info(f"Messages envoyés à OpenAI : {messages}")
+    turns = [m for m in prompt.messages[1:-1] if m["role"] != "system"]
+    decision = router.route("chat", turns, req.message, prompt.tokens)
+    logging.info(
+        f"Modèle {decision.model} ({decision.reason}), préfixe {prompt.prefix_id}, {len(prompt.messages)} messages, "
+        f"{prompt.tokens} tokens ({prompt.dropped} retirés de l'historique, {len(context)} passages)"
+    )
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7
+        generation = await complete("chat", Priority.INTERACTIVE, decision, prompt, temperature=0.7)
+        logging.info(
+            f"Réponse OpenAI : {generation.completion_tokens} tokens en {generation.elapsed_ms:.0f} ms "
+            f"({generation.finish_reason})"
         )
-        logging.info(f"Réponse OpenAI : {response}")
-        return {"response": response.choices[0].message.content.strip()}
+        if not generation.text:
+            raise ValueError("réponse vide du modèle")
+        return {"response": generation.text}
+    except SchedulerOverloaded as e:
+        raise overloaded(e)
     except Exception as e:
-        logging.error(f"Erreur OpenAI : {str(e)}")
-        return {"response": f"Erreur lors de la génération : {str(e)}"}
+        raise model_failure(e, "génération")
 
 @app.post("/classify")
 async def classify(req: ClassifyReq):
     """
     Endpoint pour classifier une conversation.
+    Les cas évidents sont classés localement ; seuls les cas ambigus
+    sont envoyés au modèle.
     """
-    prompt = (
-        "Classifie la conversation ci-dessous et renvoie un JSON avec les champs : "
-        "category, urgency, summary, keywords[]\n\n"
-        + "\n".join(f'{m["role"]}: {m["content"]}' for m in req.conversation_history)
-    )
+    local, confidence = preclassifier.classify(req.conversation_history)
+    if preclassifier.is_confident(confidence):
+        classify_sources["heuristic"] += 1
+        return {"classification": local, "source": "heuristic", "confidence": confidence}
+    classify_sources["llm"] += 1
 
-    logging.info(f"Prompt envoyé à OpenAI pour classification : {prompt}")
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0
-        )
-        logging.info(f"Réponse OpenAI : {response}")
+        prompt = prompts.classify(req.conversation_history)
+    except PromptTooLarge as e:
+        raise too_large(e)
+    logging.info(f"Classification : {prompt.tokens} tokens ({prompt.dropped} messages retirés)")
+    cache_key = classify_cache.key("classify", prompt.messages)
+    cached = classify_cache.get(cache_key)
+    if cached is not None:
+        return {"classification": cached, "source": "cache"}
 
-        # Extraire le JSON de la réponse
-        content = response.choices[0].message.content
-        match = re.search(r"\{.*\}", content, re.S)
-        classification = json.loads(match.group(0)) if match else {}
-        return {"classification": classification}
+    decision = router.route("classify", req.conversation_history, estimated_tokens=prompt.tokens)
+    try:
+        params = {"response_format": {"type": "json_object"}} if JSON_MODE else {}
+        generation = await complete("classify", Priority.BATCH, decision, prompt, temperature=0.0, **params)
+        logging.info(f"Réponse OpenAI : {generation.raw_text!r} ({generation.finish_reason})")
+
+        # Objet déjà extrait en flux, sinon parsing du texte complet
+        parsed = generation.parsed or safe_json_parse(generation.text)
+        parse_stats.record("classify", bool(parsed))
+        if not parsed:
+            return {"classification": {}, "error": "Réponse du modèle non exploitable"}
+        classification = validate_classification(parsed)
+        classify_cache.set(cache_key, classification)
+        return {"classification": classification, "source": "llm"}
+    except SchedulerOverloaded as e:
+        raise overloaded(e)
     except Exception as e:
-        logging.error(f"Erreur OpenAI : {str(e)}")
-        return {"classification": {}, "error": f"Erreur lors de la classification : {str(e)}"}
+        raise model_failure(e, "classification")
+
+@app.get("/metrics")
+def metrics():
+    """
+    Compteurs de l'ordonnanceur et du routage multi-modèles.
+    """
+    return {
+        "worker": os.getpid(),
+        "shared_state": shared_store.snapshot() if shared_store else None,
+        "classify_cache": classify_cache.snapshot(),
+        "scheduler": scheduler.snapshot(),
+        "models": router.snapshot(),
+        "classify_sources": classify_sources,
+        "json_parsing": parse_stats.snapshot(),
+        "prompts": prompts.snapshot(),
+        "prompt_cache": prompt_cache.snapshot(),
+        "output": output_stats.snapshot(),
+        "knowledge_base": knowledge_base.snapshot() if knowledge_base else None,
+    }
@@ -0,0 +1,85 @@
+"""
+Lancement multi-workers supervisé d'api_llm.
+
+Le superviseur ouvre le socket d'écoute une seule fois, démarre N workers
+uvicorn qui le partagent (le noyau répartit les connexions), et relance
+tout worker qui s'arrête de façon inattendue. Les workers partagent le
+quota OpenAI et le cache via le fichier SQLite LLM_SHARED_STATE
+(voir src/shared_state.py).
+
+Depuis api_llm/ :
+    python serve.py --workers 4 --port 8001
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from typing import List
+
+logger = logging.getLogger("api_llm.serve")
+
+DEFAULT_STATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api_llm_state.db")
+
+
+def _run_worker(config, sockets) -> None:
+    import uvicorn
+
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+def main(argv: List[str] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="api_llm multi-workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--state", default=os.getenv("LLM_SHARED_STATE", DEFAULT_STATE),
+                        help="Fichier SQLite partagé (quota, cache)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    # Hérité par les workers : quota et cache communs
+    os.environ["LLM_SHARED_STATE"] = args.state
+
+    config = uvicorn.Config("main:app", host=args.host, port=args.port, workers=args.workers)
+    sock = config.bind_socket()
+    ctx = multiprocessing.get_context("spawn")
+
+    def start() -> multiprocessing.Process:
+        process = ctx.Process(target=_run_worker, args=(config, [sock]), daemon=False)
+        process.start()
+        return process
+
+    workers = [start() for _ in range(args.workers)]
+    logger.info(f"{args.workers} workers sur {args.host}:{args.port}, état partagé {args.state}")
+
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        while not stopping:
+            for i, process in enumerate(workers):
+                if not process.is_alive():
+                    logger.warning(f"Worker {process.pid} arrêté (code {process.exitcode}), redémarrage")
+                    workers[i] = start()
+            time.sleep(1)
+    finally:
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.join(timeout=10)
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
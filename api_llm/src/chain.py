@@ -3,23 +3,41 @@
 """Configuration OpenAI pour Smart Support"""
 
 import os
-import json
+import time
 from typing import Dict, List
 from openai import OpenAI
-from .prompts import SYSTEM_PROMPT, CLASSIFICATION_PROMPT, EXTRACTION_PROMPT
+from .generation import policies_from_env
+from .prompt_builder import Prompt, PromptBuilder
+from .routing import ModelRouter, router_from_env
+from .utils import ParseStats, safe_json_parse
+
+JSON_MODE = os.getenv("LLM_JSON_MODE", "true").lower() == "true"
 
 class SmartSupportChain:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, router: ModelRouter = None, prompts: PromptBuilder = None):
         self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
-        self.model = "gpt-3.5-turbo"
+        self.router = router or router_from_env()
+        self.prompts = prompts or PromptBuilder()
+        self.parse_stats = ParseStats()
+        self.output_policies = policies_from_env()
     
-    def _call_api(self, messages: List[Dict], temp: float = 0.7) -> str:
+    def _call_api(self, prompt: Prompt, temp: float = 0.7, task: str = "chat", json_mode: bool = False) -> str:
+        messages = prompt.messages
+        decision = self.router.route(task, messages[1:-1], messages[-1]["content"], prompt.tokens)
         try:
+            start = time.perf_counter()
             response = self.client.chat.completions.create(
-                model=self.model,
+                model=decision.model,
                 messages=messages,
-                max_tokens=500,
-                temperature=temp
+                temperature=temp,
+                **self.output_policies[task].params(),
+                **({"response_format": {"type": "json_object"}} if json_mode and JSON_MODE else {})
+            )
+            usage = getattr(response, "usage", None)
+            self.router.record(
+                decision,
+                (time.perf_counter() - start) * 1000,
+                getattr(usage, "total_tokens", 0) or 0,
             )
             return response.choices[0].message.content.strip()
         except Exception as e:
@@ -27,45 +45,26 @@ class SmartSupportChain:
             return f"Erreur API: {str(e)}"
     
     def generate_response(self, user_message: str, history: List[Dict] = None) -> str:
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        if history:
-            messages.extend(history[-5:])
-        messages.append({"role": "user", "content": user_message})
-        return self._call_api(messages)
+        return self._call_api(self.prompts.chat(user_message, history, max_history=5))
 
     def classify_request(self, conversation: List[Dict]) -> Dict:
-        conv_text = "\n".join([f"{m['role']}: {m['content']}" for m in conversation])
-        prompt = CLASSIFICATION_PROMPT.format(conversation_history=conv_text)
-
-        messages = [
-            {"role": "system", "content": "Vous classifiez les demandes clients."},
-            {"role": "user", "content": prompt}
-        ]
-
-        response = self._call_api(messages, temp=0.3)
-        try:
-            return json.loads(response)
-        except Exception as e:
-            print(f"[WARNING] Erreur JSON classification: {e}")
-            return {
-                "category": "autre",
-                "urgency": "moyen", 
-                "summary": "Classification automatique",
-                "keywords": ["support"]
-            }
+        response = self._call_api(self.prompts.classify(conversation), temp=0.3, task="classify", json_mode=True)
+        parsed = safe_json_parse(response)
+        self.parse_stats.record("classify", bool(parsed))
+        if parsed:
+            return parsed
+        print("[WARNING] Erreur JSON classification")
+        return {
+            "category": "autre",
+            "urgency": "moyen", 
+            "summary": "Classification automatique",
+            "keywords": ["support"]
+        }
 
     def extract_client_info(self, conversation: List[Dict]) -> Dict:
-        conv_text = "\n".join([f"{m['role']}: {m['content']}" for m in conversation])
-        prompt = EXTRACTION_PROMPT.format(conversation_history=conv_text)
-
-        messages = [
-            {"role": "system", "content": "Vous extrayez les informations clients."},
-            {"role": "user", "content": prompt}
-        ]
-
-        response = self._call_api(messages, temp=0.2)
-        try:
-            return json.loads(response)
-        except Exception as e:
-            print(f"[WARNING] Erreur JSON extraction: {e}")
-            return {}
+        response = self._call_api(self.prompts.extract(conversation), temp=0.2, task="extract", json_mode=True)
+        parsed = safe_json_parse(response)
+        self.parse_stats.record("extract", bool(parsed))
+        if not parsed:
+            print("[WARNING] Erreur JSON extraction")
+        return parsed
@@ -0,0 +1,166 @@
+# api_llm/src/fake_llm.py
+
+"""
+Substitut local du client OpenAI (développement, benchmarks, démonstrations).
+
+Même interface que `OpenAI().chat.completions.create` pour ce qu'utilise
+api_llm, sans réseau ni clé. Le cache de préfixe du fournisseur est simulé :
+le prompt sérialisé est découpé en blocs, et les blocs de tête déjà vus
+(au-delà d'un préfixe minimal) sont comptés en `cached_tokens`. La latence
+simulée dépend des seuls tokens non cachés et des tokens générés.
+
+`max_tokens`, `stop` et `stream=True` sont respectés comme par l'API : la
+réponse est tronquée (finish_reason « length ») et, en flux, découpée en
+morceaux de quelques mots suivis du morceau d'usage (`stream_options`).
+
+Activation dans main.py : LLM_FAKE=true.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, List
+
+from .prompt_builder import TOKENS_PER_REPLY, count_tokens, messages_tokens
+
+CHARS_PER_TOKEN = 4
+
+
+class FakeCompletions:
+    def __init__(
+        self,
+        min_prefix_tokens: int = 1024,   # seuil d'activation du cache (comme OpenAI)
+        block_tokens: int = 128,         # granularité des préfixes mis en cache
+        base_latency_ms: float = 150.0,
+        ms_per_uncached_token: float = 0.4,
+        ms_per_cached_token: float = 0.04,
+        ms_per_output_token: float = 20.0,
+        reply_tokens: int = 120,         # longueur approximative des réponses de chat
+        sleep: bool = False,             # True : attend réellement la latence simulée
+        max_entries: int = 100_000,
+    ):
+        self.min_prefix_tokens = min_prefix_tokens
+        self.block_tokens = block_tokens
+        self.base_latency_ms = base_latency_ms
+        self.ms_per_uncached_token = ms_per_uncached_token
+        self.ms_per_cached_token = ms_per_cached_token
+        self.ms_per_output_token = ms_per_output_token
+        self.reply_tokens = reply_tokens
+        self.sleep = sleep
+        self.max_entries = max_entries
+        self._prefixes: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.simulated_ms = 0.0
+
+    # ---------- Cache de préfixe simulé ---------- #
+    def _cached_tokens(self, messages: List[Dict]) -> int:
+        text = "".join(f"<|{m['role']}|>{m.get('content') or ''}" for m in messages)
+        block = self.block_tokens * CHARS_PER_TOKEN
+        digest = hashlib.sha1()
+        cached_chars = 0
+        with self._lock:
+            for end in range(block, len(text) + 1, block):
+                digest.update(text[end - block:end].encode("utf-8"))
+                key = digest.copy().hexdigest()
+                if key in self._prefixes:
+                    self._prefixes.move_to_end(key)
+                    if cached_chars == end - block:
+                        cached_chars = end
+                else:
+                    self._prefixes[key] = None
+            while len(self._prefixes) > self.max_entries:
+                self._prefixes.popitem(last=False)
+        cached = cached_chars // CHARS_PER_TOKEN
+        return cached if cached >= self.min_prefix_tokens else 0
+
+    # ---------- Réponses ---------- #
+    def _reply(self, messages: List[Dict], params: Dict) -> str:
+        if params.get("response_format", {}).get("type") == "json_object":
+            return json.dumps({
+                "category": "Support général",
+                "urgency": "Moyen",
+                "summary": "Réponse simulée",
+                "keywords": ["simulation"],
+            }, ensure_ascii=False)
+        last = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        reply = f"Réponse simulée à : {last[:80]}"
+        filler = " Je vérifie votre dossier et je reviens vers vous avec une solution adaptée."
+        while len(reply) < self.reply_tokens * CHARS_PER_TOKEN:
+            reply += filler
+        return reply
+
+    @staticmethod
+    def _limit(content: str, params: Dict):
+        finish_reason = "stop"
+        for stop in params.get("stop") or ():
+            if stop in content:
+                content = content[:content.index(stop)]
+        max_tokens = params.get("max_tokens")
+        if max_tokens and len(content) > max_tokens * CHARS_PER_TOKEN:
+            content, finish_reason = content[:max_tokens * CHARS_PER_TOKEN], "length"
+        return content, finish_reason
+
+    def _stream(self, model: str, content: str, finish_reason: str, usage, latency: float, include_usage: bool):
+        words = content.split(" ")
+        pieces = [" ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "") for i in range(0, len(words), 4)]
+        for i, piece in enumerate(pieces):
+            if self.sleep:
+                time.sleep(latency / len(pieces) / 1000)
+            yield SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(
+                    index=0,
+                    delta=SimpleNamespace(content=piece),
+                    finish_reason=finish_reason if i == len(pieces) - 1 else None,
+                )],
+                usage=None,
+            )
+        if include_usage:
+            yield SimpleNamespace(model=model, choices=[], usage=usage)
+
+    def create(self, model: str, messages: List[Dict], **params):
+        content, finish_reason = self._limit(self._reply(messages, params), params)
+        prompt_tokens = messages_tokens(messages)
+        cached = min(self._cached_tokens(messages), prompt_tokens - TOKENS_PER_REPLY)
+        completion_tokens = count_tokens(content)
+        latency = (
+            self.base_latency_ms
+            + (prompt_tokens - cached) * self.ms_per_uncached_token
+            + cached * self.ms_per_cached_token
+            + completion_tokens * self.ms_per_output_token
+        )
+        with self._lock:
+            self.calls += 1
+            self.simulated_ms += latency
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached),
+        )
+        if params.get("stream"):
+            include_usage = bool((params.get("stream_options") or {}).get("include_usage"))
+            return self._stream(model, content, finish_reason, usage, latency, include_usage)
+        if self.sleep:
+            time.sleep(latency / 1000)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(
+                index=0,
+                message=SimpleNamespace(role="assistant", content=content),
+                finish_reason=finish_reason,
+            )],
+            usage=usage,
+            simulated_latency_ms=latency,
+        )
+
+
+class FakeOpenAI:
+    """Client factice exposant `chat.completions.create`."""
+
+    def __init__(self, **options):
+        self.chat = SimpleNamespace(completions=FakeCompletions(**options))
@@ -0,0 +1,296 @@
+# api_llm/src/generation.py
+
+"""
+Longueur de sortie bornée par tâche : max_tokens, séquences d'arrêt et
+arrêt anticipé en flux.
+
+Chaque tâche (chat, classify, extract) a sa politique (`OutputPolicy`) :
+- `max_tokens`, envoyé au fournisseur : borne dure du nombre de tokens générés ;
+- `stop` : séquences d'arrêt (le modèle n'enchaîne pas sur un faux tour
+  « Client: … ») ;
+- `deadline_ms` : durée maximale de génération. La réponse est lue en flux
+  et le flux est fermé à l'échéance ; le texte reçu est conservé. L'attente
+  est en plus bornée côté asyncio (flux bloqué) : le p99 a un plafond dur ;
+- tâches JSON : le flux est fermé dès que l'objet est complet
+  (IncrementalJSONParser), sans attendre d'éventuels tokens parasites.
+
+Une réponse de chat coupée (max_tokens ou échéance) est ramenée à sa
+dernière phrase complète. Les réponses trop longues sont comptées par
+`OutputStats` (/metrics), avec les percentiles de durée de génération.
+
+Réglage par variables d'environnement, par tâche (CHAT, CLASSIFY, EXTRACT) :
+OUTPUT_MAX_TOKENS_<TÂCHE>, OUTPUT_DEADLINE_MS_<TÂCHE>, OUTPUT_STOP_<TÂCHE>
+(séquences séparées par « | », « \\n » pour un saut de ligne).
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .prompt_builder import count_tokens
+from .utils import IncrementalJSONParser
+
+logger = logging.getLogger(__name__)
+
+# Lecture en flux (nécessaire à l'arrêt anticipé) ; false : appel classique
+OUTPUT_STREAM = os.getenv("OUTPUT_STREAM", "true").lower() == "true"
+# Marge accordée au thread de lecture au-delà de l'échéance avant abandon
+DEADLINE_GRACE_MS = float(os.getenv("OUTPUT_DEADLINE_GRACE_MS", "500"))
+LATENCY_WINDOW = 1000
+
+# (max_tokens, échéance en ms, séquences d'arrêt, sortie JSON)
+DEFAULT_POLICIES = {
+    "chat": (350, 8000, "\\nClient:|\\nClient :|\\nUtilisateur:", False),
+    "classify": (200, 6000, "", True),
+    "extract": (300, 8000, "", True),
+}
+# Fins de génération comptées comme dépassement de longueur
+OVER_LENGTH = ("length", "deadline")
+
+_SENTENCE_END = re.compile(r"[.!?…](?=\s|$)|\n")
+
+
+class GenerationTimeout(TimeoutError):
+    """Aucun texte reçu avant l'échéance de génération."""
+
+
+@dataclass(frozen=True)
+class OutputPolicy:
+    task: str
+    max_tokens: int
+    deadline_ms: float
+    stop: Tuple[str, ...] = ()
+    json: bool = False
+
+    def params(self) -> Dict[str, Any]:
+        """Paramètres de l'appel `chat.completions.create`."""
+        params: Dict[str, Any] = {"max_tokens": self.max_tokens}
+        if self.stop:
+            params["stop"] = list(self.stop[:4])  # limite de l'API OpenAI
+        return params
+
+
+def _parse_stop(value: str) -> Tuple[str, ...]:
+    return tuple(s.replace("\\n", "\n") for s in value.split("|") if s)
+
+
+def policies_from_env() -> Dict[str, OutputPolicy]:
+    policies = {}
+    for task, (max_tokens, deadline_ms, stop, json_output) in DEFAULT_POLICIES.items():
+        name = task.upper()
+        policies[task] = OutputPolicy(
+            task=task,
+            max_tokens=int(os.getenv(f"OUTPUT_MAX_TOKENS_{name}", str(max_tokens))),
+            deadline_ms=float(os.getenv(f"OUTPUT_DEADLINE_MS_{name}", str(deadline_ms))),
+            stop=_parse_stop(os.getenv(f"OUTPUT_STOP_{name}", stop)),
+            json=json_output,
+        )
+    return policies
+
+
+@functools.lru_cache(maxsize=None)
+def _accepted_params(func: Callable) -> Tuple[frozenset, bool]:
+    params = inspect.signature(func).parameters.values()
+    return frozenset(p.name for p in params), any(p.kind is p.VAR_KEYWORD for p in params)
+
+
+def stream_usage_params(create: Callable, extra_body: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Paramètres demandant le morceau d'usage en fin de flux. `stream_options`
+    n'est un argument de `create` que dans les clients OpenAI récents ; sinon
+    il est ajouté au corps de la requête (`extra_body`), ou omis si le client
+    n'accepte ni l'un ni l'autre (usage alors estimé localement).
+    """
+    names, any_keyword = _accepted_params(getattr(create, "__func__", create))
+    options = {"include_usage": True}
+    if "stream_options" in names or any_keyword:
+        return {"stream_options": options}
+    if "extra_body" in names:
+        return {"extra_body": {**(extra_body or {}), "stream_options": options}}
+    return {}
+
+
+def _as_usage(value: Any) -> Any:
+    """Usage d'un morceau de flux : champ brut (dict) pour les clients antérieurs à `stream_options`."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _as_usage(item) for key, item in value.items()})
+    return value
+
+
+def trim_to_sentence(text: str) -> str:
+    """Coupe après la dernière fin de phrase, si elle garde au moins la moitié du texte."""
+    ends = [m.end() for m in _SENTENCE_END.finditer(text)]
+    if ends and ends[-1] >= len(text) // 2:
+        return text[:ends[-1]].rstrip()
+    return text.rstrip()
+
+
+class Generation:
+    """
+    Réponse en cours de lecture. Alimentée par le thread qui lit le flux ;
+    `stop()` l'interrompt depuis l'extérieur (échéance dépassée côté asyncio).
+    """
+
+    def __init__(self, policy: OutputPolicy):
+        self.policy = policy
+        self.started = time.perf_counter()
+        self.deadline = self.started + policy.deadline_ms / 1000
+        self.finish_reason: Optional[str] = None
+        self.usage = None
+        self.parsed: Optional[Dict] = None
+        self.elapsed_ms = 0.0
+        self._parts = []
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    # ---------- Lecture (thread) ---------- #
+    def run(self, create: Callable, stream: bool, **params) -> None:
+        params = {**self.policy.params(), **params}
+        if not stream:
+            response = create(**params)
+            choice = response.choices[0]
+            with self._lock:
+                self._parts.append(choice.message.content or "")
+                self.finish_reason = choice.finish_reason or "stop"
+                self.usage = getattr(response, "usage", None)
+            return
+        params.update(stream_usage_params(create, params.get("extra_body")))
+        chunks = create(stream=True, **params)
+        try:
+            self._consume(chunks)
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()  # connexion fermée : le fournisseur cesse de générer
+
+    def _consume(self, chunks) -> None:
+        parser = IncrementalJSONParser() if self.policy.json else None
+        for chunk in chunks:
+            with self._lock:
+                if self._stopped:
+                    return
+                self.usage = _as_usage(getattr(chunk, "usage", None)) or self.usage
+                for choice in getattr(chunk, "choices", None) or ():
+                    delta = getattr(choice.delta, "content", None) or ""
+                    if delta:
+                        self._parts.append(delta)
+                        if parser is not None and self.parsed is None:
+                            self.parsed = parser.feed(delta)
+                    if choice.finish_reason:
+                        self.finish_reason = choice.finish_reason
+                if self.parsed is not None and self.finish_reason is None:
+                    self.finish_reason = "json_complete"
+                    return
+                if self.finish_reason is None and time.perf_counter() >= self.deadline:
+                    self.finish_reason = "deadline"
+                    return
+                # Après la fin, seul le morceau d'usage (include_usage) est encore attendu
+
+    def stop(self, reason: str) -> None:
+        with self._lock:
+            self._stopped = True
+            if self.finish_reason is None:
+                self.finish_reason = reason
+
+    # ---------- Résultat ---------- #
+    def finish(self) -> "Generation":
+        with self._lock:
+            self._stopped = True
+            self.finish_reason = self.finish_reason or "stop"
+            self.elapsed_ms = (time.perf_counter() - self.started) * 1000
+        return self
+
+    @property
+    def raw_text(self) -> str:
+        with self._lock:
+            return "".join(self._parts)
+
+    @property
+    def text(self) -> str:
+        text = self.raw_text.strip()
+        if not self.policy.json and self.over_length:
+            return trim_to_sentence(text)
+        return text
+
+    @property
+    def over_length(self) -> bool:
+        return self.finish_reason in OVER_LENGTH
+
+    @property
+    def completion_tokens(self) -> int:
+        # Flux interrompu : pas d'usage renvoyé par le fournisseur, estimation locale
+        return getattr(self.usage, "completion_tokens", 0) or count_tokens(self.raw_text)
+
+
+async def generate(create: Callable, policy: OutputPolicy, stream: bool = OUTPUT_STREAM, **params) -> Generation:
+    """
+    Appel `create` (bloquant, exécuté dans un thread) sous la politique de la
+    tâche. L'attente ne dépasse jamais l'échéance plus DEADLINE_GRACE_MS : au-delà,
+    le texte déjà reçu est retourné, ou GenerationTimeout levée s'il n'y en a pas.
+    """
+    generation = Generation(policy)
+    try:
+        await asyncio.wait_for(
+            asyncio.to_thread(generation.run, create, stream, **params),
+            timeout=(policy.deadline_ms + DEADLINE_GRACE_MS) / 1000,
+        )
+    except asyncio.TimeoutError:
+        generation.stop("deadline")
+        if not generation.raw_text:
+            raise GenerationTimeout(f"Aucune réponse en {policy.deadline_ms:.0f} ms ({policy.task})")
+        logger.warning(f"Génération {policy.task} interrompue à l'échéance (flux bloqué)")
+    return generation.finish()
+
+
+class OutputStats:
+    """Longueur et durée des générations par tâche ; dépassements de longueur."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.counts: Dict[str, Dict[str, Any]] = {}
+        self._latencies: Dict[str, deque] = {}
+
+    def record(self, generation: Generation) -> None:
+        task = generation.policy.task
+        entry = self.counts.setdefault(
+            task, {"calls": 0, "over_length": 0, "completion_tokens": 0, "max_tokens": 0, "finish": {}}
+        )
+        tokens = generation.completion_tokens
+        entry["calls"] += 1
+        entry["over_length"] += 1 if generation.over_length else 0
+        entry["completion_tokens"] += tokens
+        entry["max_tokens"] = max(entry["max_tokens"], tokens)
+        entry["finish"][generation.finish_reason] = entry["finish"].get(generation.finish_reason, 0) + 1
+        self._latencies.setdefault(task, deque(maxlen=self.window)).append(generation.elapsed_ms)
+
+    @staticmethod
+    def _percentile(values, q: float) -> float:
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1) if ordered else 0.0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        snapshot = {}
+        for task, c in self.counts.items():
+            latencies = self._latencies.get(task, ())
+            snapshot[task] = {
+                **c,
+                "finish": dict(c["finish"]),
+                "over_length_rate": round(c["over_length"] / max(1, c["calls"]), 4),
+                "avg_completion_tokens": round(c["completion_tokens"] / max(1, c["calls"]), 1),
+                "generation_ms": {
+                    "p50": self._percentile(latencies, 0.5),
+                    "p95": self._percentile(latencies, 0.95),
+                    "p99": self._percentile(latencies, 0.99),
+                    "max": round(max(latencies), 1) if latencies else 0.0,
+                },
+            }
+        return snapshot
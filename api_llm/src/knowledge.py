@@ -0,0 +1,368 @@
+# api_llm/src/knowledge.py
+
+"""
+Base de connaissances locale pour /chats (génération augmentée par recherche).
+
+Ingestion (hors ligne) : les documents .md / .txt d'un dossier sont découpés
+en passages d'environ KB_CHUNK_TOKENS tokens (paragraphes regroupés, léger
+chevauchement), vectorisés puis écrits dans un index :
+
+    <index>/vectors.f32   vecteurs float32 normalisés, ligne par ligne
+    <index>/chunks.jsonl  texte et source de chaque passage (même ordre)
+    <index>/meta.json     dimension, vectoriseur, nombre de passages
+
+À l'exécution, `vectors.f32` est projeté en mémoire (numpy.memmap si numpy
+est installé, sinon mmap lu en Python pur) : le démarrage ne charge rien et
+les pages sont partagées entre workers par le cache du système.
+
+Vectoriseurs : modèle sentence-transformers sur CPU si KB_EMBED_MODEL est
+défini et le paquet installé, sinon hachage des mots et bigrammes
+(dimension fixe, sans dépendance, déterministe).
+
+Recherche : top-k par produit scalaire (cosinus), sous un budget de latence
+(KB_LATENCY_BUDGET_MS) au-delà duquel le meilleur résultat partiel est
+retourné ; résultats mis en cache par requête normalisée.
+
+    python -m src.knowledge ingest ../docs --out knowledge_index
+    python -m src.knowledge search "remboursement double prélèvement"
+
+Activation dans main.py : KB_PATH=/chemin/vers/knowledge_index
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .prompt_builder import count_tokens
+
+logger = logging.getLogger(__name__)
+
+KB_PATH = os.getenv("KB_PATH")
+KB_TOP_K = int(os.getenv("KB_TOP_K", "3"))
+KB_MIN_SCORE = float(os.getenv("KB_MIN_SCORE", "0.12"))
+KB_LATENCY_BUDGET_MS = float(os.getenv("KB_LATENCY_BUDGET_MS", "50"))
+KB_CACHE_SIZE = int(os.getenv("KB_CACHE_SIZE", "1024"))
+KB_CHUNK_TOKENS = int(os.getenv("KB_CHUNK_TOKENS", "200"))
+KB_EMBED_MODEL = os.getenv("KB_EMBED_MODEL")
+HASHING_DIM = 384
+BLOCK_ROWS = 4096  # lignes comparées entre deux vérifications du budget
+
+_WORD = re.compile(r"\w+")
+
+
+# ---------- Découpage ---------- #
+def chunk_text(text: str, max_tokens: int = KB_CHUNK_TOKENS, overlap: int = 1) -> List[str]:
+    """
+    Regroupe les paragraphes en passages d'au plus `max_tokens` tokens ; les
+    `overlap` derniers paragraphes d'un passage ouvrent le suivant.
+    Un paragraphe trop long est coupé par phrases.
+    """
+    paragraphs: List[str] = []
+    for block in re.split(r"\n\s*\n", text):
+        block = " ".join(block.split())
+        if not block:
+            continue
+        if count_tokens(block) <= max_tokens:
+            paragraphs.append(block)
+            continue
+        sentence = ""
+        for part in re.split(r"(?<=[.!?])\s+", block):
+            if sentence and count_tokens(f"{sentence} {part}") > max_tokens:
+                paragraphs.append(sentence)
+                sentence = part
+            else:
+                sentence = f"{sentence} {part}".strip()
+        if sentence:
+            paragraphs.append(sentence)
+
+    chunks, current = [], []
+    for paragraph in paragraphs:
+        if current and count_tokens("\n".join(current + [paragraph])) > max_tokens:
+            chunks.append("\n".join(current))
+            current = current[-overlap:] if overlap else []
+            if current and count_tokens("\n".join(current + [paragraph])) > max_tokens:
+                current = []
+        current.append(paragraph)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def iter_documents(root: str) -> Iterator[Tuple[str, str]]:
+    """(chemin relatif, texte) des fichiers .md / .txt sous `root`, dans un ordre stable."""
+    for directory, _, files in sorted(os.walk(root)):
+        for name in sorted(files):
+            if name.lower().endswith((".md", ".txt")):
+                path = os.path.join(directory, name)
+                with open(path, encoding="utf-8") as fh:
+                    yield os.path.relpath(path, root), fh.read()
+
+
+# ---------- Vectoriseurs ---------- #
+def _fold(text: str) -> str:
+    """Minuscules sans accents (« Prélèvement » -> « prelevement »)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+class HashingEmbedder:
+    """
+    Mots, préfixes de mots (radical approché : « rembourse » ~ « remboursement »)
+    et bigrammes, hachés sur `dim` composantes signées ; poids log(1 + tf), L2.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM, prefix: int = 5):
+        self.dim = dim
+        self.prefix = prefix
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> Iterator[str]:
+        words = [w for w in _WORD.findall(_fold(text)) if len(w) >= 3]
+        yield from words
+        yield from (f"~{w[:self.prefix]}" for w in words if len(w) > self.prefix)
+        yield from (f"{a} {b}" for a, b in zip(words, words[1:]))
+
+    def embed(self, text: str) -> List[float]:
+        counts = Counter(self._features(text))
+        vector = [0.0] * self.dim
+        for feature, tf in counts.items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += (1.0 if (digest >> 63) else -1.0) * (1.0 + math.log(tf))
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self.embed(t) for t in texts]
+
+
+class SentenceTransformerEmbedder:
+    """Modèle sentence-transformers sur CPU (optionnel : paquet `sentence-transformers`)."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer  # dépendance optionnelle
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st:{model_name}"
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return [list(map(float, v)) for v in self.model.encode(list(texts), normalize_embeddings=True)]
+
+
+def create_embedder(name: Optional[str] = None):
+    """Vectoriseur nommé dans meta.json (ou KB_EMBED_MODEL) ; repli sur le hachage."""
+    name = name or (f"st:{KB_EMBED_MODEL}" if KB_EMBED_MODEL else f"hashing-{HASHING_DIM}")
+    if name.startswith("st:"):
+        try:
+            return SentenceTransformerEmbedder(name[3:])
+        except Exception as exc:
+            raise RuntimeError(f"Vectoriseur {name} indisponible : {exc}") from exc
+    return HashingEmbedder(int(name.rsplit("-", 1)[1]))
+
+
+# ---------- Index ---------- #
+def write_index(out_dir: str, chunks: Sequence[Dict], embedder, batch_size: int = 256) -> int:
+    """Écrit vectors.f32 / chunks.jsonl / meta.json ; meta.json en dernier (index complet)."""
+    os.makedirs(out_dir, exist_ok=True)
+    row = struct.Struct(f"<{embedder.dim}f")
+    with open(os.path.join(out_dir, "vectors.f32"), "wb") as vectors, \
+            open(os.path.join(out_dir, "chunks.jsonl"), "w", encoding="utf-8") as meta:
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            for chunk, vector in zip(batch, embedder.embed_many([c["text"] for c in batch])):
+                vectors.write(row.pack(*vector))
+                meta.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump({"dim": embedder.dim, "embedder": embedder.name, "count": len(chunks)}, fh)
+    return len(chunks)
+
+
+def ingest(source_dir: str, out_dir: str, max_tokens: int = KB_CHUNK_TOKENS, embedder=None) -> int:
+    embedder = embedder or create_embedder()
+    chunks = [
+        {"source": source, "text": text}
+        for source, document in iter_documents(source_dir)
+        for text in chunk_text(document, max_tokens)
+    ]
+    return write_index(out_dir, chunks, embedder)
+
+
+@dataclass
+class Passage:
+    text: str
+    source: str
+    score: float
+
+
+class VectorIndex:
+    """Index projeté en mémoire ; recherche exacte (produit scalaire) par blocs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        self.embedder = create_embedder(meta["embedder"])
+        with open(os.path.join(path, "chunks.jsonl"), encoding="utf-8") as fh:
+            self.chunks = [json.loads(line) for line in fh]
+        self._np = self._vectors = None
+        if self.count:
+            try:
+                import numpy  # dépendance optionnelle : produit matriciel vectorisé
+
+                self._np = numpy
+                self._vectors = numpy.memmap(
+                    os.path.join(path, "vectors.f32"), dtype="<f4", mode="r", shape=(self.count, self.dim)
+                )
+            except ImportError:
+                with open(os.path.join(path, "vectors.f32"), "rb") as fh:
+                    self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                self._vectors = memoryview(self._mmap).cast("f")
+
+    @property
+    def backend(self) -> str:
+        return "numpy.memmap" if self._np is not None else "mmap"
+
+    def search(self, query: Sequence[float], k: int, deadline: Optional[float] = None) -> Tuple[List[Tuple[float, int]], bool]:
+        """
+        (score, rang) des k meilleurs passages. Les blocs de lignes sont
+        parcourus jusqu'à `deadline` (time.perf_counter) ; le second élément
+        vaut True si la recherche a été interrompue (résultat partiel).
+        """
+        best: List[Tuple[float, int]] = []
+        for start in range(0, self.count, BLOCK_ROWS):
+            if deadline is not None and best and time.perf_counter() > deadline:
+                return best, True
+            end = min(self.count, start + BLOCK_ROWS)
+            if self._np is not None:
+                scores = self._vectors[start:end] @ self._np.asarray(query, dtype="<f4")
+                top = self._np.argsort(-scores)[:k]
+                block = [(float(scores[i]), start + int(i)) for i in top]
+            else:
+                block = []
+                for row in range(start, end):
+                    offset = row * self.dim
+                    block.append((sum(q * v for q, v in zip(query, self._vectors[offset:offset + self.dim])), row))
+            best = sorted(best + block, reverse=True)[:k]
+        return best, False
+
+
+class KnowledgeBase:
+    """Recherche de passages pour un tour de chat, avec cache et budget de latence."""
+
+    def __init__(self, index: VectorIndex, top_k: int = KB_TOP_K, min_score: float = KB_MIN_SCORE,
+                 budget_ms: float = KB_LATENCY_BUDGET_MS, cache_size: int = KB_CACHE_SIZE):
+        self.index = index
+        self.top_k = top_k
+        self.min_score = min_score
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[Passage]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "cache_hits": 0, "partial": 0, "passages": 0, "total_ms": 0.0}
+
+    @staticmethod
+    def query_text(message: str, history: Optional[Sequence[Dict]] = None) -> str:
+        """Message courant ; s'il est très court (« et pour ça ? »), précédé du message client précédent."""
+        if len(_WORD.findall(message)) >= 5 or not history:
+            return message
+        previous = next((m.get("content") or "" for m in reversed(history) if m.get("role") == "user"), "")
+        return f"{previous}\n{message}" if previous != message else message
+
+    def retrieve(self, query: str) -> List[Passage]:
+        key = " ".join(_WORD.findall(query.lower()))
+        with self._lock:
+            self._stats["queries"] += 1
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return cached
+
+        start = time.perf_counter()
+        vector = self.index.embedder.embed(query)
+        ranked, partial = self.index.search(vector, self.top_k, start + self.budget_ms / 1000)
+        passages = [
+            Passage(self.index.chunks[row]["text"], self.index.chunks[row]["source"], score)
+            for score, row in ranked
+            if score >= self.min_score
+        ]
+        with self._lock:
+            self._stats["total_ms"] += (time.perf_counter() - start) * 1000
+            self._stats["passages"] += len(passages)
+            if partial:
+                self._stats["partial"] += 1
+            else:  # un résultat partiel n'est pas mis en cache
+                self._cache[key] = passages
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return passages
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        searched = max(1, stats["queries"] - stats["cache_hits"])
+        return {
+            "chunks": self.index.count,
+            "embedder": self.index.embedder.name,
+            "backend": self.index.backend,
+            "queries": stats["queries"],
+            "cache_hits": stats["cache_hits"],
+            "partial": stats["partial"],
+            "avg_passages": round(stats["passages"] / searched, 2),
+            "avg_search_ms": round(stats["total_ms"] / searched, 2),
+        }
+
+
+def knowledge_base_from_env() -> Optional[KnowledgeBase]:
+    if not KB_PATH:
+        return None
+    if not os.path.exists(os.path.join(KB_PATH, "meta.json")):
+        logger.warning(f"Base de connaissances introuvable : {KB_PATH}")
+        return None
+    kb = KnowledgeBase(VectorIndex(KB_PATH))
+    logger.info(f"Base de connaissances : {kb.index.count} passages ({kb.index.embedder.name}, {kb.index.backend})")
+    return kb
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Base de connaissances (RAG)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_ingest = sub.add_parser("ingest", help="Découpe, vectorise et indexe un dossier de documents")
+    p_ingest.add_argument("source")
+    p_ingest.add_argument("--out", default=KB_PATH or "knowledge_index")
+    p_ingest.add_argument("--chunk-tokens", type=int, default=KB_CHUNK_TOKENS)
+    p_search = sub.add_parser("search", help="Passages les plus proches d'une question")
+    p_search.add_argument("query")
+    p_search.add_argument("--index", default=KB_PATH or "knowledge_index")
+    p_search.add_argument("-k", type=int, default=KB_TOP_K)
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        count = ingest(args.source, args.out, args.chunk_tokens)
+        print(f"{count} passages indexés dans {args.out}")
+    else:
+        kb = KnowledgeBase(VectorIndex(args.index), top_k=args.k, min_score=0.0)
+        for passage in kb.retrieve(args.query):
+            print(f"{passage.score:.3f}  {passage.source}\n    {passage.text[:200]}")
+        print(kb.snapshot())
+
+
+if __name__ == "__main__":
+    main()
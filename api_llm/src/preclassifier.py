@@ -0,0 +1,249 @@
+# api_llm/src/preclassifier.py
+
+"""
+Pré-classification locale : règles mots-clés/regex + modèle linéaire optionnel.
+
+Les sessions classées avec une confiance suffisante ne partent pas chez
+OpenAI. Le modèle (Naive Bayes multinomial) est entraîné hors ligne sur les
+lignes `classifications` de la base backend :
+
+    python -m src.preclassifier train --db ../smart_support.db --out preclassifier.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .utils import clean_text, extract_keywords, validate_classification
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = os.getenv("PRECLASSIFIER_MODEL", os.path.join(os.path.dirname(__file__), "..", "preclassifier.json"))
+CONFIDENCE_THRESHOLD = float(os.getenv("PRECLASSIFIER_THRESHOLD", "0.8"))
+
+# ---------- Table de règles ---------- #
+# (catégorie, motif, poids) : les poids des motifs trouvés sont additionnés.
+CATEGORY_RULES: List[Tuple[str, str, float]] = [
+    ("Facturation", r"factur|paiement|payé|prélèvement|rembours|tarif|prix|carte bancaire|débit", 1.0),
+    ("Livraison", r"livr|colis|commande|expédi|suivi|transporteur|retour produit", 1.0),
+    ("Gestion de compte", r"mot de passe|identifiant|mon compte|créer un compte|supprimer (?:mon )?compte|adresse e-?mail", 1.0),
+    ("Problème technique", r"bug|erreur|plant|ne fonctionne pas|ne marche pas|connexion|écran|application|crash", 1.0),
+    ("Réclamation", r"plainte|inadmissible|inacceptable|scandale|mécontent|déçu|réclamation", 1.2),
+    ("Demande d'information", r"comment|est-ce que|renseignement|information|horaires|savoir si", 0.6),
+]
+URGENCY_RULES: List[Tuple[str, str, float]] = [
+    ("Urgent", r"urgent|immédiatement|bloqué|impossible|inadmissible|avocat|depuis \d+ (?:jours|semaines)|!!", 1.0),
+    ("Faible", r"simple question|juste savoir|pas pressé|renseignement|merci d'avance", 1.0),
+]
+
+# Score du meilleur label à partir duquel les indices suffisent (confiance non pénalisée).
+# L'urgence est explicite (« urgent », « pas pressé ») : un seul indice suffit.
+CATEGORY_EVIDENCE = 2.0
+URGENCY_EVIDENCE = 1.0
+# Confiance de l'urgence « Moyen » par défaut (aucun indice), sous le seuil par
+# défaut : sans indice d'urgence, la conversation est confiée au modèle
+DEFAULT_URGENCY_CONFIDENCE = 0.6
+
+_CATEGORY_RULES = [(c, re.compile(p, re.IGNORECASE), w) for c, p, w in CATEGORY_RULES]
+_URGENCY_RULES = [(u, re.compile(p, re.IGNORECASE), w) for u, p, w in URGENCY_RULES]
+_TOKEN = re.compile(r"\b\w{3,}\b")
+
+
+def _user_text(conversation: List[Dict]) -> str:
+    return "\n".join(m.get("content", "") for m in conversation if m.get("role") == "user")
+
+
+def _rule_scores(text: str, rules) -> Dict[str, float]:
+    scores: Dict[str, float] = defaultdict(float)
+    for label, pattern, weight in rules:
+        hits = len(pattern.findall(text))
+        if hits:
+            scores[label] += weight * min(hits, 3)
+    return scores
+
+
+def _rule_confidence(scores: Dict[str, float], required: float = CATEGORY_EVIDENCE) -> Tuple[Optional[str], float]:
+    """Confiance = part du meilleur score, pénalisée si son score n'atteint pas `required`."""
+    if not scores:
+        return None, 0.0
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    best, top = ranked[0]
+    total = sum(scores.values())
+    evidence = min(top / required, 1.0)
+    return best, round((top / total) * evidence, 3)
+
+
+# ---------- Modèle linéaire (Naive Bayes multinomial) ---------- #
+class NaiveBayesModel:
+    def __init__(self, priors: Dict[str, float], likelihoods: Dict[str, Dict[str, float]], unseen: Dict[str, float]):
+        self.priors = priors
+        self.likelihoods = likelihoods
+        self.unseen = unseen
+
+    @classmethod
+    def train(cls, texts: List[str], labels: List[str], max_vocab: int = 5000) -> "NaiveBayesModel":
+        df = Counter()
+        tokenized = []
+        for text in texts:
+            tokens = _TOKEN.findall(text.lower())
+            tokenized.append(tokens)
+            df.update(set(tokens))
+        vocab = {t for t, _ in df.most_common(max_vocab)}
+
+        counts: Dict[str, Counter] = defaultdict(Counter)
+        for tokens, label in zip(tokenized, labels):
+            counts[label].update(t for t in tokens if t in vocab)
+
+        n = len(labels)
+        label_counts = Counter(labels)
+        priors = {label: math.log(c / n) for label, c in label_counts.items()}
+        likelihoods, unseen = {}, {}
+        for label, counter in counts.items():
+            denom = sum(counter.values()) + len(vocab)
+            likelihoods[label] = {t: math.log((c + 1) / denom) for t, c in counter.items()}
+            unseen[label] = math.log(1 / denom)
+        return cls(priors, likelihoods, unseen)
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        if not self.priors:
+            return None, 0.0
+        tokens = _TOKEN.findall(text.lower())
+        scores = {
+            label: prior + sum(self.likelihoods[label].get(t, self.unseen[label]) for t in tokens)
+            for label, prior in self.priors.items()
+        }
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        norm = sum(math.exp(s - top) for s in scores.values())
+        return best, round(1 / norm, 3)
+
+    def to_dict(self) -> Dict:
+        return {"priors": self.priors, "likelihoods": self.likelihoods, "unseen": self.unseen}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "NaiveBayesModel":
+        return cls(data["priors"], data["likelihoods"], data["unseen"])
+
+
+class PreClassifier:
+    """Combine règles et modèle appris ; le modèle est chargé au premier appel."""
+
+    def __init__(self, model_path: str = MODEL_PATH, threshold: float = CONFIDENCE_THRESHOLD):
+        self.model_path = model_path
+        self.threshold = threshold
+        self._models: Optional[Dict[str, NaiveBayesModel]] = None
+
+    def _load(self) -> Dict[str, NaiveBayesModel]:
+        if self._models is None:
+            self._models = {}
+            if self.model_path and os.path.exists(self.model_path):
+                try:
+                    with open(self.model_path, encoding="utf-8") as fh:
+                        data = json.load(fh)
+                    self._models = {k: NaiveBayesModel.from_dict(v) for k, v in data.items()}
+                    logger.info(f"Modèle de pré-classification chargé : {self.model_path}")
+                except Exception as e:
+                    logger.warning(f"Modèle de pré-classification illisible : {e}")
+        return self._models
+
+    def _predict(self, field: str, text: str, rules, required: float) -> Tuple[Optional[str], float]:
+        label, confidence = _rule_confidence(_rule_scores(text, rules), required)
+        model = self._load().get(field)
+        if model:
+            m_label, m_conf = model.predict(text)
+            if label is None or m_label == label:
+                # Règle et modèle concordent : confiance combinée
+                confidence = 1 - (1 - confidence) * (1 - m_conf) if label else m_conf
+                label = m_label
+            elif m_conf > confidence:
+                label, confidence = m_label, m_conf * (1 - confidence)
+        return label, round(confidence, 3)
+
+    def classify(self, conversation: List[Dict]) -> Tuple[Dict, float]:
+        """Retourne (classification validée, confiance globale entre 0 et 1)."""
+        text = _user_text(conversation)
+        if not text.strip():
+            return validate_classification({}), 0.0
+
+        category, cat_conf = self._predict("category", text, _CATEGORY_RULES, CATEGORY_EVIDENCE)
+        urgency, urg_conf = self._predict("urgency", text, _URGENCY_RULES, URGENCY_EVIDENCE)
+        if urgency is None:
+            # Pas d'indice d'urgence : « Moyen » par défaut, moins sûr qu'un indice explicite
+            urgency, urg_conf = "Moyen", DEFAULT_URGENCY_CONFIDENCE
+
+        first = next((m.get("content", "") for m in conversation if m.get("role") == "user"), "")
+        classification = validate_classification({
+            "category": category or "",
+            "urgency": urgency,
+            "summary": clean_text(first)[:200],
+            "keywords": extract_keywords(text, 5),
+        })
+        return classification, round(min(cat_conf, urg_conf), 3)
+
+    def is_confident(self, confidence: float) -> bool:
+        return confidence >= self.threshold
+
+
+# ---------- Entraînement (CLI) ---------- #
+def load_training_rows(db_path: str) -> List[Tuple[str, str, str]]:
+    """(texte utilisateur, catégorie, urgence) pour chaque session classée, archivées comprises."""
+    conn = sqlite3.connect(db_path)
+    try:
+        archived = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_archive'"
+        ).fetchone()
+        messages = "messages"
+        if archived:
+            messages = (
+                "(SELECT session_id, seq, id, role, content FROM messages "
+                "UNION ALL SELECT session_id, seq, id, role, content FROM messages_archive)"
+            )
+        rows = conn.execute(
+            f"""
+            SELECT c.category, c.urgency, group_concat(m.content, '\n')
+            FROM classifications c
+            JOIN {messages} m ON m.session_id = c.session_id AND upper(m.role) = 'USER'
+            GROUP BY c.id
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+    return [(text or "", category, urgency) for category, urgency, text in rows]
+
+
+def train(db_path: str, out_path: str, min_rows: int = 20) -> int:
+    rows = load_training_rows(db_path)
+    if len(rows) < min_rows:
+        raise SystemExit(f"Pas assez de classifications pour entraîner ({len(rows)} < {min_rows}).")
+    texts = [r[0] for r in rows]
+    models = {
+        "category": NaiveBayesModel.train(texts, [r[1] for r in rows]),
+        "urgency": NaiveBayesModel.train(texts, [r[2] for r in rows]),
+    }
+    with open(out_path, "w", encoding="utf-8") as fh:
+        json.dump({k: m.to_dict() for k, m in models.items()}, fh, ensure_ascii=False)
+    return len(rows)
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Pré-classifieur Smart Support")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_train = sub.add_parser("train", help="Entraîne le modèle sur les classifications existantes")
+    p_train.add_argument("--db", required=True, help="Chemin de la base SQLite du backend")
+    p_train.add_argument("--out", default=MODEL_PATH, help="Fichier JSON du modèle")
+    p_train.add_argument("--min-rows", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        n = train(args.db, args.out, args.min_rows)
+        print(f"Modèle entraîné sur {n} sessions -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# api_llm/src/prompt_builder.py
+
+"""
+Assemblage des prompts : gabarits précompilés, comptage de tokens et budget.
+
+Seul point de construction des messages envoyés au modèle (/chats, /classify,
+SmartSupportChain). Les parties statiques (prompts système) sont construites
+et comptées une seule fois ; l'historique reçu du backend est nettoyé
+(messages système et dernier message utilisateur dupliqués retirés) puis
+tronqué par le début s'il dépasse le budget de tokens.
+
+Disposition stable pour le cache de préfixe des fournisseurs : le message
+système (statique, octet pour octet identique) vient toujours en tête, puis
+l'historique dans l'ordre, puis la partie variable. L'historique n'est jamais
+réécrit ; quand il faut tronquer, les plus anciens tours sont retirés par
+paliers (`PROMPT_TRUNCATE_STEP` du budget) : le point de coupe reste le même
+pendant plusieurs tours et le préfixe continue d'être servi depuis le cache.
+
+Les passages de la base de connaissances (src/knowledge.py) forment un
+message système placé après l'historique, juste avant le message courant :
+ils changent à chaque tour et ne doivent pas casser le préfixe en cache.
+
+Le comptage est exact si `tiktoken` est installé, sinon estimé (≈ 4 caractères
+par token) ; le tokenizer utilisé est exposé dans `snapshot()`.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from .prompts import CLASSIFICATION_PROMPT, EXTRACTION_PROMPT, SYSTEM_PROMPT
+
+logger = logging.getLogger(__name__)
+
+# Budget d'entrée par défaut : contexte de 4k tokens moins la réponse (max_tokens)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3500"))
+TOKENIZER_ENCODING = os.getenv("PROMPT_TOKENIZER_ENCODING", "cl100k_base")
+# Palier de troncature, en fraction du budget d'historique (0 : coupe glissante, tour par tour)
+PROMPT_TRUNCATE_STEP = float(os.getenv("PROMPT_TRUNCATE_STEP", "0.25"))
+# Part maximale du budget réservée aux passages de la base de connaissances
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "600"))
+CONTEXT_HEADER = (
+    "Extraits de la base de connaissances de l'entreprise. Appuie ta réponse sur ces "
+    "informations quand elles répondent à la question, sans les inventer ni les citer en entier :"
+)
+
+# Surcoût du format chat (cl100k) : par message, et amorce de la réponse
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+ROLES = ("user", "assistant")
+ROLE_LABELS = {"user": "Client", "assistant": "Assistant"}
+
+
+class PromptTooLarge(ValueError):
+    """Le message courant seul dépasse le budget de tokens."""
+
+    def __init__(self, tokens: int, budget: int):
+        super().__init__(f"Prompt trop long : {tokens} tokens pour un budget de {budget}")
+        self.tokens = tokens
+        self.budget = budget
+
+
+# ---------- Comptage de tokens ---------- #
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as exc:  # non installé ou fichier d'encodage indisponible
+        logger.info(f"tiktoken indisponible ({exc}), comptage estimé à 4 caractères par token")
+        return None
+
+
+def tokenizer_name() -> str:
+    return f"tiktoken:{TOKENIZER_ENCODING}" if _encoder() else "chars/4"
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """Tokens d'un texte ; mémoïsé (parties statiques, historique renvoyé à chaque tour)."""
+    if not text:
+        return 0
+    encoder = _encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message: Dict) -> int:
+    return TOKENS_PER_MESSAGE + count_tokens(message.get("content") or "")
+
+
+def messages_tokens(messages: Sequence[Dict]) -> int:
+    return sum(message_tokens(m) for m in messages) + TOKENS_PER_REPLY
+
+
+# ---------- Gabarits ---------- #
+class PromptTemplate:
+    """
+    Gabarit découpé une fois pour toutes en parties statiques et champs
+    `{nom}`. Seuls les champs déclarés sont remplacés : les accolades des
+    exemples JSON restent intactes.
+    """
+
+    def __init__(self, text: str, fields: Sequence[str] = ()):
+        self.fields = tuple(fields)
+        if self.fields:
+            pattern = re.compile(r"\{(" + "|".join(map(re.escape, self.fields)) + r")\}")
+            pieces = pattern.split(text)
+        else:
+            pieces = [text]
+        self._static = pieces[0::2]
+        self._slots = pieces[1::2]
+        self.static_tokens = sum(count_tokens(p) for p in self._static)
+
+    def render(self, **values: str) -> str:
+        out = [self._static[0]]
+        for slot, static in zip(self._slots, self._static[1:]):
+            out.append(values[slot])
+            out.append(static)
+        return "".join(out)
+
+
+def _system(text: str) -> Dict:
+    return {"role": "system", "content": text}
+
+
+def format_conversation(messages: Sequence[Dict]) -> str:
+    return "\n".join(
+        f"{ROLE_LABELS.get(m.get('role'), 'Client')}: {m.get('content', '')}" for m in messages
+    )
+
+
+def clean_history(history: Optional[Sequence[Dict]], message: Optional[str] = None) -> List[Dict]:
+    """
+    Ne garde que les tours user/assistant ({role, content}) ; retire les
+    messages système éventuellement envoyés par le client et, si l'historique
+    se termine déjà par `message`, ce doublon du message courant.
+    """
+    cleaned = [
+        {"role": m["role"], "content": m.get("content") or ""}
+        for m in history or []
+        if m.get("role") in ROLES
+    ]
+    if message is not None and cleaned and cleaned[-1]["role"] == "user" and cleaned[-1]["content"] == message:
+        cleaned.pop()
+    return cleaned
+
+
+# ---------- Assemblage ---------- #
+@dataclass
+class Prompt:
+    messages: List[Dict]
+    tokens: int
+    dropped: int = 0  # messages d'historique retirés pour tenir le budget
+
+    @property
+    def prefix_id(self) -> str:
+        """Empreinte du message système : doit être constante pour une tâche donnée."""
+        return hashlib.sha1(self.messages[0]["content"].encode("utf-8")).hexdigest()[:12]
+
+
+class PromptBuilder:
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET, truncate_step: float = PROMPT_TRUNCATE_STEP,
+                 context_tokens: int = PROMPT_CONTEXT_TOKENS):
+        self.budget = budget
+        self.truncate_step = truncate_step
+        self.context_tokens = context_tokens
+        # Messages système construits une seule fois (ne jamais les modifier)
+        self.chat_system = _system(SYSTEM_PROMPT)
+        self.classify_system = _system(CLASSIFICATION_PROMPT)
+        self.extract_system = _system(EXTRACTION_PROMPT)
+        self.classify_user = PromptTemplate("{conversation}\n\nCLASSIFICATION :", ("conversation",))
+        self.extract_user = PromptTemplate("{conversation}\n\nINFORMATIONS :", ("conversation",))
+        self._lock = threading.Lock()
+        self._stats = {"built": 0, "truncated": 0, "dropped_messages": 0, "rejected": 0, "with_context": 0}
+
+    def chat(
+        self,
+        message: str,
+        history: Optional[Sequence[Dict]] = None,
+        max_history: Optional[int] = None,
+        context: Optional[Sequence[str]] = None,
+    ) -> Prompt:
+        """`context` : passages de la base de connaissances, du plus au moins pertinent."""
+        turns = clean_history(history, message)
+        if max_history is not None:
+            turns = turns[-max_history:] if max_history else []
+        current = {"role": "user", "content": message}
+        extra = self._context(context)
+        fixed = message_tokens(self.chat_system) + message_tokens(current) + TOKENS_PER_REPLY
+        fixed += sum(message_tokens(m) for m in extra)
+        kept, dropped = self._fit(turns, fixed)
+        if extra:
+            with self._lock:
+                self._stats["with_context"] += 1
+        return self._done(
+            [self.chat_system, *kept, *extra, current],
+            fixed + sum(message_tokens(m) for m in kept),
+            dropped,
+        )
+
+    def _context(self, passages: Optional[Sequence[str]]) -> List[Dict]:
+        """Message système des passages retenus, dans la limite de `context_tokens`."""
+        kept, used = [], count_tokens(CONTEXT_HEADER)
+        for passage in passages or ():
+            cost = count_tokens(passage) + 1
+            if used + cost > self.context_tokens:
+                break
+            kept.append(passage)
+            used += cost
+        if not kept:
+            return []
+        return [_system("\n\n".join([CONTEXT_HEADER, *(f"- {p}" for p in kept)]))]
+
+    def classify(self, conversation: Sequence[Dict]) -> Prompt:
+        return self._document(self.classify_system, self.classify_user, conversation)
+
+    def extract(self, conversation: Sequence[Dict]) -> Prompt:
+        return self._document(self.extract_system, self.extract_user, conversation)
+
+    def _document(self, system: Dict, template: PromptTemplate, conversation: Sequence[Dict]) -> Prompt:
+        """Conversation rendue dans un seul message utilisateur, tronquée par le début si besoin."""
+        turns = clean_history(conversation)
+        fixed = message_tokens(system) + TOKENS_PER_MESSAGE + template.static_tokens + TOKENS_PER_REPLY
+        # +1 : saut de ligne entre deux tours
+        kept, dropped = self._fit(turns, fixed, lambda m: count_tokens(format_conversation([m])) + 1)
+        content = template.render(conversation=format_conversation(kept))
+        user = {"role": "user", "content": content}
+        return self._done([system, user], message_tokens(system) + message_tokens(user) + TOKENS_PER_REPLY, dropped)
+
+    def _fit(self, turns: List[Dict], fixed: int, cost=message_tokens):
+        """
+        Retire les tours les plus anciens jusqu'à tenir dans le budget restant.
+        La quantité retirée est arrondie au palier supérieur : d'un tour à
+        l'autre, la coupe ne bouge qu'au franchissement d'un palier.
+        """
+        if fixed > self.budget:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise PromptTooLarge(fixed, self.budget)
+        remaining = self.budget - fixed
+        costs = [cost(turn) for turn in turns]
+        excess = sum(costs) - remaining
+        if excess <= 0:
+            return turns, 0
+        step = int(remaining * self.truncate_step)
+        if step > 0:
+            excess = -(-excess // step) * step
+        cut, removed = 0, 0
+        while cut < len(turns) and removed < excess:
+            removed += costs[cut]
+            cut += 1
+        return turns[cut:], cut
+
+    def _done(self, messages: List[Dict], tokens: int, dropped: int) -> Prompt:
+        with self._lock:
+            self._stats["built"] += 1
+            if dropped:
+                self._stats["truncated"] += 1
+                self._stats["dropped_messages"] += dropped
+        return Prompt(messages, tokens, dropped)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        return {"tokenizer": tokenizer_name(), "budget": self.budget, **stats}
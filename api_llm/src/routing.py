@@ -0,0 +1,219 @@
+# api_llm/src/routing.py
+
+"""Routage multi-modèles : choix du modèle par tâche et par complexité de la requête"""
+
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TASKS = ("chat", "classify", "extract")
+
+_COMPLEX_MARKERS = re.compile(
+    r"rembours|litige|avocat|plainte|réclamation|facture|contrat|résili|urgent|"
+    r"erreur \d+|ne fonctionne (?:toujours )?pas|depuis \d+ jours",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class ModelTier:
+    name: str
+    model: str
+    max_latency_ms: float = 5000            # budget de latence (moyenne glissante)
+    cost_per_1k_tokens: float = 0.002       # coût indicatif entrée + sortie
+    max_cost_per_call: float = 0.05         # budget de coût par appel
+    fallback: Optional[str] = None          # palier utilisé si un budget est dépassé
+
+
+@dataclass
+class RoutingRule:
+    tier: str
+    task: Optional[str] = None
+    min_history: int = 0
+    max_history: Optional[int] = None
+    min_complexity: float = 0.0
+    max_complexity: Optional[float] = None
+
+    def matches(self, task: str, history_len: int, complexity: float) -> bool:
+        if self.task and self.task != task:
+            return False
+        if history_len < self.min_history:
+            return False
+        if self.max_history is not None and history_len > self.max_history:
+            return False
+        if complexity < self.min_complexity:
+            return False
+        if self.max_complexity is not None and complexity > self.max_complexity:
+            return False
+        return True
+
+
+@dataclass
+class RouteDecision:
+    tier: ModelTier
+    complexity: float
+    reason: str
+
+    @property
+    def model(self) -> str:
+        return self.tier.model
+
+
+@dataclass
+class _TierStats:
+    calls: int = 0
+    latency_ewma_ms: float = 0.0
+    tokens: int = 0
+    cost: float = 0.0
+    budget_fallbacks: int = 0
+
+
+def default_tiers() -> List[ModelTier]:
+    """
+    Palier « fast » seul par défaut. Le palier « large » (plus coûteux) n'existe
+    que si LLM_MODEL_LARGE est défini : les règles qui le visent sont ignorées sinon.
+    """
+    tiers = [
+        ModelTier(
+            name="fast",
+            model=os.getenv("LLM_MODEL_FAST", "gpt-3.5-turbo"),
+            max_latency_ms=3000,
+            cost_per_1k_tokens=0.002,
+            max_cost_per_call=0.01,
+        ),
+    ]
+    large = os.getenv("LLM_MODEL_LARGE")
+    if large:
+        tiers.append(ModelTier(
+            name="large",
+            model=large,
+            max_latency_ms=15000,
+            cost_per_1k_tokens=0.045,
+            max_cost_per_call=0.15,
+            fallback="fast",
+        ))
+    return tiers
+
+
+DEFAULT_RULES = [
+    RoutingRule(tier="fast", task="classify"),
+    RoutingRule(tier="fast", task="extract"),
+    RoutingRule(tier="large", task="chat", min_complexity=0.6),
+    RoutingRule(tier="large", task="chat", min_history=16),
+    RoutingRule(tier="fast"),
+]
+
+
+def estimate_complexity(message: str, history: List[Dict]) -> float:
+    """
+    Score heuristique entre 0 et 1 : longueur du message, nombre de questions,
+    vocabulaire de litige/facturation et longueur de l'historique.
+    """
+    message = message or ""
+    score = min(len(message) / 600, 0.4)
+    score += min(message.count("?") * 0.1, 0.2)
+    score += min(len(_COMPLEX_MARKERS.findall(message)) * 0.2, 0.4)
+    score += min(len(history) / 40, 0.2)
+    return round(min(score, 1.0), 3)
+
+
+class ModelRouter:
+    """Applique les règles dans l'ordre ; la première qui correspond choisit le palier."""
+
+    def __init__(self, tiers: List[ModelTier] = None, rules: List[RoutingRule] = None):
+        self.tiers: Dict[str, ModelTier] = {t.name: t for t in (tiers or default_tiers())}
+        self.rules = rules or DEFAULT_RULES
+        self._stats: Dict[str, _TierStats] = {name: _TierStats() for name in self.tiers}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str) -> "ModelRouter":
+        """Charge paliers et règles depuis un JSON `{"tiers": [...], "rules": [...]}`."""
+        with open(path, encoding="utf-8") as fh:
+            config = json.load(fh)
+        tiers = [ModelTier(**t) for t in config.get("tiers", [])] or None
+        rules = [RoutingRule(**r) for r in config.get("rules", [])] or None
+        return cls(tiers, rules)
+
+    def route(
+        self,
+        task: str,
+        history: List[Dict] = None,
+        message: str = "",
+        estimated_tokens: int = 0,
+    ) -> RouteDecision:
+        history = history or []
+        complexity = estimate_complexity(message, history)
+        rule = next(
+            (r for r in self.rules if r.tier in self.tiers and r.matches(task, len(history), complexity)),
+            None,
+        )
+        tier = self.tiers[rule.tier] if rule else next(iter(self.tiers.values()))
+        reason = f"rule:{rule.tier}" if rule else "default"
+
+        # Dégradation vers le palier de repli si un budget est dépassé
+        seen = set()
+        while tier.fallback in self.tiers and tier.name not in seen:
+            seen.add(tier.name)
+            over = self._over_budget(tier, estimated_tokens)
+            if not over:
+                break
+            with self._lock:
+                stats = self._stats[tier.name]
+                stats.budget_fallbacks += 1
+                if over == "latency":
+                    # Décroissance : le palier est retenté une fois la moyenne
+                    # repassée sous son budget.
+                    stats.latency_ewma_ms *= 0.95
+            reason = f"{over}:{tier.name}->{tier.fallback}"
+            tier = self.tiers[tier.fallback]
+
+        return RouteDecision(tier=tier, complexity=complexity, reason=reason)
+
+    def _over_budget(self, tier: ModelTier, estimated_tokens: int) -> Optional[str]:
+        stats = self._stats[tier.name]
+        if stats.calls and stats.latency_ewma_ms > tier.max_latency_ms:
+            return "latency"
+        if estimated_tokens / 1000 * tier.cost_per_1k_tokens > tier.max_cost_per_call:
+            return "cost"
+        return None
+
+    def record(self, decision: RouteDecision, latency_ms: float, total_tokens: int = 0) -> None:
+        """Enregistre la latence et le coût observés pour un appel."""
+        tier = decision.tier
+        with self._lock:
+            stats = self._stats[tier.name]
+            stats.latency_ewma_ms = (
+                latency_ms if not stats.calls else 0.8 * stats.latency_ewma_ms + 0.2 * latency_ms
+            )
+            stats.calls += 1
+            stats.tokens += total_tokens
+            stats.cost += total_tokens / 1000 * tier.cost_per_1k_tokens
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                name: {
+                    "model": self.tiers[name].model,
+                    "calls": s.calls,
+                    "latency_ewma_ms": round(s.latency_ewma_ms, 1),
+                    "tokens": s.tokens,
+                    "cost": round(s.cost, 4),
+                    "budget_fallbacks": s.budget_fallbacks,
+                }
+                for name, s in self._stats.items()
+            }
+
+
+def router_from_env() -> ModelRouter:
+    path = os.getenv("LLM_ROUTING_FILE")
+    if path:
+        logger.info(f"Règles de routage chargées depuis {path}")
+        return ModelRouter.from_file(path)
+    return ModelRouter()
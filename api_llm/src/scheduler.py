@@ -0,0 +1,357 @@
+# api_llm/src/scheduler.py
+
+"""Ordonnanceur des appels OpenAI : quotas RPM/TPM, priorités et backoff 429"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Classes de priorité : plus la valeur est basse, plus la requête passe tôt."""
+    INTERACTIVE = 0   # /chats – un utilisateur attend la réponse
+    BATCH = 1         # /classify – best effort
+
+
+class SchedulerOverloaded(Exception):
+    """Levée quand une requête est rejetée par le contrôle d'admission."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Seau à jetons rechargé en continu (capacité par minute)."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Secondes à attendre avant de pouvoir consommer `amount` jetons."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        """Rend `amount` jetons ; négatif : consommation supplémentaire (dette)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LocalQuota:
+    """Quota RPM/TPM et pause après 429, propres au processus."""
+
+    blocking = False
+
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+
+    def try_acquire(self, tokens: int, reserve: float = 0.0) -> float:
+        """Consomme 1 requête et `tokens` si disponibles (en laissant `reserve` du quota), sinon retourne l'attente."""
+        wait = max(
+            self.paused_for(),
+            self.requests.wait_time(1 + self.requests.capacity * reserve),
+            self.tokens.wait_time(tokens + self.tokens.capacity * reserve),
+        )
+        if wait > 0:
+            return wait
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        return 0.0
+
+    def refund_tokens(self, tokens: float) -> None:
+        self.tokens.refund(tokens)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def paused_for(self) -> float:
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def eta(self) -> float:
+        return max(1.0, self.paused_for(), self.requests.wait_time(1))
+
+
+class SharedQuota:
+    """
+    Même interface que LocalQuota, l'état vivant dans un SharedStore commun aux
+    workers. Chaque appel est une transaction SQLite qui peut attendre le
+    verrou d'écriture (busy_timeout) : l'ordonnanceur l'exécute hors de la
+    boucle d'événements.
+    """
+
+    blocking = True
+
+    def __init__(self, store, rpm: int, tpm: int):
+        self.store = store
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+
+    def try_acquire(self, tokens: int, reserve: float = 0.0) -> float:
+        paused = self.paused_for()
+        if paused > 0:
+            return paused
+        return self.store.take({
+            "rpm": (1, 1 + self.rpm * reserve, self.rpm),
+            "tpm": (tokens, tokens + self.tpm * reserve, self.tpm),
+        })
+
+    def refund_tokens(self, tokens: float) -> None:
+        self.store.refund("tpm", tokens, self.tpm)
+
+    def pause(self, seconds: float) -> None:
+        self.store.max_value("paused_until", time.time() + seconds)
+
+    def paused_for(self) -> float:
+        return max(0.0, self.store.get_value("paused_until") - time.time())
+
+    def eta(self) -> float:
+        return max(1.0, self.paused_for(), self.store.wait_time("rpm", 1, self.rpm))
+
+
+@dataclass(order=True)
+class _Ticket:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    deadline: float = field(compare=False)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Extrait l'en-tête Retry-After d'une erreur 429 OpenAI, s'il existe."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after-ms", "retry-after"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            continue
+        return seconds / 1000 if name.endswith("-ms") else seconds
+    return None
+
+
+def _is_rate_limit(exc: Exception) -> bool:
+    return getattr(exc, "status_code", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+class RateLimitScheduler:
+    """
+    File d'attente à priorités devant le quota OpenAI.
+
+    Les requêtes interactives passent toujours avant la classification ;
+    la classification est retardée ou rejetée (SchedulerOverloaded) quand
+    sa file dépasse `max_batch_queue` ou quand elle attendrait plus de
+    `max_batch_wait` secondes.
+    """
+
+    def __init__(
+        self,
+        rpm: int = 3500,
+        tpm: int = 90000,
+        max_batch_queue: int = 50,
+        max_batch_wait: float = 30.0,
+        max_interactive_wait: float = 20.0,
+        max_retries: int = 3,
+        batch_reserve: float = 0.2,
+        quota=None,
+    ):
+        # Quota local au processus, ou partagé entre workers (SharedQuota)
+        self.quota = quota or LocalQuota(rpm, tpm)
+        self.max_batch_queue = max_batch_queue
+        self.max_wait = {
+            Priority.INTERACTIVE: max_interactive_wait,
+            Priority.BATCH: max_batch_wait,
+        }
+        self.max_retries = max_retries
+        # Part du quota que la classification ne peut pas consommer : elle reste
+        # disponible pour les conversations en cours.
+        self.batch_reserve = batch_reserve
+        self._queue: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {"admitted": 0, "shed": 0, "rate_limited": 0, "retries": 0, "reconciled_tokens": 0}
+
+    # ------------------------------------------------------------------ #
+    # API publique
+    # ------------------------------------------------------------------ #
+    async def run(
+        self,
+        priority: Priority,
+        estimated_tokens: int,
+        call: Callable[[], Awaitable[Any]],
+        used_tokens: Optional[Callable[[Any], Optional[int]]] = None,
+    ) -> Any:
+        """
+        Exécute `call` quand le quota le permet, en rejouant les 429.
+        `used_tokens(résultat)` donne la consommation réelle (usage.total_tokens) :
+        l'écart avec l'estimation réservée est rendu au seau TPM, ou prélevé.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(priority, estimated_tokens)
+            try:
+                result = await call()
+            except Exception as exc:
+                if not _is_rate_limit(exc):
+                    raise
+                # Requête refusée : aucun token consommé chez le fournisseur
+                await self.reconcile(estimated_tokens, 0)
+                if attempt == self.max_retries:
+                    raise
+                delay = _retry_after(exc) or min(2 ** attempt, 30)
+                self.stats["rate_limited"] += 1
+                self.stats["retries"] += 1
+                await self._quota_call(self.quota.pause, delay)
+                logger.warning(f"429 OpenAI, nouvelle tentative dans {delay:.1f}s")
+                continue
+            if used_tokens is not None:
+                actual = used_tokens(result)
+                if actual is not None:
+                    await self.reconcile(estimated_tokens, actual)
+            return result
+
+    async def reconcile(self, reserved: int, actual: int) -> None:
+        """Ajuste le seau TPM de la réservation `reserved` à la consommation `actual`."""
+        if actual != reserved:
+            await self._quota_call(self.quota.refund_tokens, reserved - actual)
+            self.stats["reconciled_tokens"] += reserved - actual
+
+    async def acquire(self, priority: Priority, estimated_tokens: int) -> None:
+        """Attend un créneau ; lève SchedulerOverloaded si la requête est délestée."""
+        self._ensure_worker()
+        if priority == Priority.BATCH:
+            queued = sum(1 for t in self._queue if t.priority == Priority.BATCH)
+            if queued >= self.max_batch_queue:
+                self.stats["shed"] += 1
+                raise SchedulerOverloaded("File de classification saturée", await self._eta())
+
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(
+            priority=int(priority),
+            seq=next(self._seq),
+            tokens=estimated_tokens,
+            future=loop.create_future(),
+            deadline=time.monotonic() + self.max_wait[priority],
+        )
+        heapq.heappush(self._queue, ticket)
+        self._wakeup.set()
+        await ticket.future
+        self.stats["admitted"] += 1
+
+    def pause(self, seconds: float) -> None:
+        """Suspend tous les envois (429 reçu ou Retry-After imposé)."""
+        self.quota.pause(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "queued_interactive": sum(1 for t in self._queue if t.priority == Priority.INTERACTIVE),
+            "queued_batch": sum(1 for t in self._queue if t.priority == Priority.BATCH),
+            "paused_for": self.quota.paused_for(),
+            "shared_quota": isinstance(self.quota, SharedQuota),
+        }
+
+    # ------------------------------------------------------------------ #
+    # Boucle de distribution
+    # ------------------------------------------------------------------ #
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _quota_call(self, method: Callable, *args) -> Any:
+        """Appel au quota ; dans un thread si le quota partagé peut bloquer."""
+        if self.quota.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _eta(self) -> float:
+        return await self._quota_call(self.quota.eta)
+
+    async def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [t for t in self._queue if not t.future.done() and t.deadline < now]
+        if expired:
+            eta = await self._eta()
+            for ticket in expired:
+                if not ticket.future.done():
+                    self.stats["shed"] += 1
+                    ticket.future.set_exception(SchedulerOverloaded("Quota OpenAI indisponible", eta))
+        if any(t.future.done() for t in self._queue):
+            self._queue = [t for t in self._queue if not t.future.done()]
+            heapq.heapify(self._queue)
+
+    async def _try_acquire(self, ticket: _Ticket) -> float:
+        # La classification laisse une réserve du quota aux conversations en cours
+        reserve = self.batch_reserve if ticket.priority == Priority.BATCH else 0.0
+        return await self._quota_call(self.quota.try_acquire, ticket.tokens, reserve)
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._expire()
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            ticket = self._queue[0]
+            wait = await self._try_acquire(ticket)
+            if wait > 0:
+                self._wakeup.clear()
+                try:
+                    # Réveil anticipé si une requête plus prioritaire arrive.
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(wait, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # La file a pu changer pendant l'appel au quota : retrait de ce ticket précis
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            if ticket.future.done():  # requête abandonnée entre-temps
+                await self._quota_call(self.quota.refund_tokens, ticket.tokens)
+                continue
+            ticket.future.set_result(None)
+
+
+def scheduler_from_env(store=None) -> RateLimitScheduler:
+    """`store` (SharedStore) : quota commun à tous les workers de la machine."""
+    rpm = int(os.getenv("OPENAI_RPM_LIMIT", "3500"))
+    tpm = int(os.getenv("OPENAI_TPM_LIMIT", "90000"))
+    return RateLimitScheduler(
+        rpm=rpm,
+        tpm=tpm,
+        max_batch_queue=int(os.getenv("CLASSIFY_MAX_QUEUE", "50")),
+        max_batch_wait=float(os.getenv("CLASSIFY_MAX_WAIT", "30")),
+        max_interactive_wait=float(os.getenv("CHAT_MAX_WAIT", "20")),
+        quota=SharedQuota(store, rpm, tpm) if store is not None else None,
+    )
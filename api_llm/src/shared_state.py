@@ -0,0 +1,229 @@
+# api_llm/src/shared_state.py
+
+"""
+État partagé entre les workers api_llm d'une même machine (SQLite en mode WAL).
+
+Avec plusieurs processus (serve.py --workers N), chaque worker a son propre
+ordonnanceur et sa propre file à priorités, mais le quota OpenAI (seaux RPM
+et TPM, pause après un 429) et le cache des classifications vivent dans un
+fichier SQLite commun : le quota reste global et un résultat calculé par un
+worker sert aux autres.
+
+Chaque écriture est une transaction courte (BEGIN IMMEDIATE), sérialisée
+entre processus ; les lectures se font hors transaction et ne bloquent pas (WAL).
+
+Activation : LLM_SHARED_STATE=/chemin/vers/api_llm_state.db
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires);
+"""
+
+
+class SharedStore:
+    """Connexion SQLite WAL d'un processus (protégée par un verrou pour les threads)."""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    # ---------- Seaux à jetons ---------- #
+    def take(self, demands: Dict[str, Tuple[float, float, float]]) -> float:
+        """
+        Consomme atomiquement plusieurs seaux, ou aucun.
+
+        `demands` : nom -> (quantité à consommer, quantité requise disponible,
+        capacité par minute). La quantité requise peut dépasser la quantité
+        consommée (réserve laissée aux requêtes prioritaires).
+        Retourne 0 si consommé, sinon les secondes à attendre.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            levels = {}
+            wait = 0.0
+            for name, (_, required, capacity) in demands.items():
+                tokens = self._level(conn, name, capacity, now)
+                levels[name] = tokens
+                rate = capacity / 60.0
+                required = min(required, capacity)
+                if tokens < required:
+                    wait = max(wait, (required - tokens) / rate)
+            if wait > 0:
+                return wait
+            for name, (amount, _, capacity) in demands.items():
+                self._save(conn, name, levels[name] - min(amount, capacity), now)
+            return 0.0
+
+    def wait_time(self, name: str, amount: float, capacity: float) -> float:
+        # Lecture seule : pas de transaction d'écriture (les lectures WAL ne bloquent pas)
+        with self._lock:
+            tokens = self._level(self._conn, name, capacity, time.time())
+        amount = min(amount, capacity)
+        return 0.0 if tokens >= amount else (amount - tokens) / (capacity / 60.0)
+
+    def refund(self, name: str, amount: float, capacity: float) -> None:
+        now = time.time()
+        with self.transaction() as conn:
+            tokens = self._level(conn, name, capacity, now)
+            self._save(conn, name, min(capacity, tokens + amount), now)
+
+    @staticmethod
+    def _level(conn: sqlite3.Connection, name: str, capacity: float, now: float) -> float:
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return capacity
+        tokens, updated = row
+        return min(capacity, tokens + max(0.0, now - updated) * capacity / 60.0)
+
+    @staticmethod
+    def _save(conn: sqlite3.Connection, name: str, tokens: float, now: float) -> None:
+        conn.execute(
+            "INSERT INTO buckets (name, tokens, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+            (name, tokens, now),
+        )
+
+    # ---------- Valeurs partagées ---------- #
+    def get_value(self, key: str, default: float = 0.0) -> float:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def max_value(self, key: str, value: float) -> None:
+        """state[key] = max(state[key], value)"""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = max(value, excluded.value)",
+                (key, value),
+            )
+
+    # ---------- Cache ---------- #
+    def cache_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def cache_set(self, key: str, value: bytes, ttl: float) -> None:
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+                (key, value, now + ttl),
+            )
+            conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT count(*) FROM cache WHERE expires > ?", (time.time(),)).fetchone()[0]
+        return {"path": self.path, "cache_entries": entries}
+
+
+class ResponseCache:
+    """
+    Cache de réponses du modèle par empreinte de prompt : dans le SharedStore
+    (commun aux workers) s'il est configuré, sinon en mémoire du processus.
+    """
+
+    def __init__(self, store: Optional[SharedStore] = None, ttl: float = 3600, max_local: int = 1024):
+        self.store = store
+        self.ttl = ttl
+        self.max_local = max_local
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(task: str, messages: List[Dict]) -> str:
+        payload = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+        return f"{task}:{hashlib.sha1(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._get(key)
+        with self._lock:
+            self.stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    def _get(self, key: str) -> Optional[Any]:
+        if self.ttl <= 0:
+            return None
+        if self.store is not None:
+            raw = self.store.cache_get(key)
+            return json.loads(raw) if raw is not None else None
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._local.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        if self.store is not None:
+            self.store.cache_set(key, json.dumps(value, ensure_ascii=False).encode("utf-8"), self.ttl)
+            return
+        with self._lock:
+            self._local[key] = (time.time() + self.ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local:
+                self._local.popitem(last=False)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        return {**stats, "shared": self.store is not None}
+
+
+def shared_store_from_env() -> Optional[SharedStore]:
+    path = os.getenv("LLM_SHARED_STATE")
+    if not path:
+        return None
+    logger.info(f"État partagé entre workers : {path}")
+    return SharedStore(path)
@@ -6,7 +6,7 @@ import re
 import json
 import logging
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -57,19 +57,118 @@ def validate_classification(data: Dict) -> Dict:
         "keywords": data.get("keywords", [])[:5]
     }
 
+class IncrementalJSONParser:
+    """
+    Extrait le premier objet JSON complet d'un flux de texte, morceau par morceau.
+
+    Les accolades sont comptées en ignorant celles contenues dans les chaînes,
+    ce qui gère les objets imbriqués et le texte parasite avant/après l'objet.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Optional[Dict]:
+        """Ajoute un morceau ; retourne l'objet dès qu'il est complet, sinon None."""
+        self.buffer += chunk or ""
+        while self._pos < len(self.buffer):
+            char = self.buffer[self._pos]
+            self._pos += 1
+            if self._start < 0:
+                if char == "{":
+                    self._start, self._depth = self._pos - 1, 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = self.buffer[self._start:self._pos]
+                    try:
+                        value = json.loads(candidate)
+                        if isinstance(value, dict):
+                            self._start = -1
+                            return value
+                    except ValueError:
+                        pass
+                    # Faux départ : on reprend juste après l'accolade ouvrante
+                    self._pos, self._start = self._start + 1, -1
+        return None
+
+
+def extract_json_object(text: str) -> Optional[Dict]:
+    """Premier objet JSON (éventuellement imbriqué) contenu dans `text`."""
+    return IncrementalJSONParser().feed(text)
+
+
 def safe_json_parse(text: str) -> Dict:
     """Tente de parser du JSON même si la réponse est bruitée"""
     try:
-        return json.loads(text)
+        value = json.loads(text)
+        if isinstance(value, dict):
+            return value
     except Exception as e:
         logger.warning(f"Échec parsing JSON direct: {e}")
-        match = re.search(r'\{.*?\}', text, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group())
-            except Exception as e2:
-                logger.warning(f"Échec parsing JSON partiel: {e2}")
+    value = extract_json_object(text or "")
+    if value is None:
+        logger.warning("Aucun objet JSON exploitable dans la réponse")
         return {}
+    return value
+
+
+class ParseStats:
+    """Compteurs de parsing JSON par tâche (succès / échecs)."""
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, task: str, ok: bool) -> None:
+        entry = self.counts.setdefault(task, {"ok": 0, "failed": 0})
+        entry["ok" if ok else "failed"] += 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {
+            task: {**c, "failure_rate": round(c["failed"] / max(1, c["ok"] + c["failed"]), 4)}
+            for task, c in self.counts.items()
+        }
+
+
+class PromptCacheStats:
+    """Tokens de prompt servis depuis le cache de préfixe du fournisseur, par tâche."""
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, task: str, usage) -> None:
+        # `prompt_tokens_details.cached_tokens` n'existe pas dans tous les SDK/modèles
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or 0
+        entry = self.counts.setdefault(task, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "hits": 0})
+        entry["calls"] += 1
+        entry["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        entry["cached_tokens"] += cached
+        entry["hits"] += 1 if cached else 0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {
+            task: {**c, "cached_ratio": round(c["cached_tokens"] / max(1, c["prompt_tokens"]), 4)}
+            for task, c in self.counts.items()
+        }
+
 
 def get_timestamp() -> str:
     """Retourne un timestamp ISO"""
@@ -0,0 +1,28 @@
+"""
+Tests d'api_llm, depuis api_llm/ :
+    python -m pytest tests
+
+Le client OpenAI est remplacé par le substitut local (LLM_FAKE) ; les tests
+qui ont besoin d'un autre comportement remplacent `main.client`.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("LLM_FAKE", "true")
+os.environ.setdefault("KB_PATH", "")
+os.environ.setdefault("LLM_SHARED_STATE", "")
+
+
+@pytest.fixture
+def app_client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+import main
+
+
+def _failing_client(exc):
+    def create(**params):
+        raise exc
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def test_chat_reply(app_client):
+    r = app_client.post("/chats", json={"message": "Bonjour", "conversation_history": []})
+    assert r.status_code == 200
+    assert r.json()["response"]
+
+
+def test_model_failure_is_a_502(app_client, monkeypatch):
+    monkeypatch.setattr(main, "client", _failing_client(RuntimeError("modèle indisponible")))
+    r = app_client.post("/chats", json={"message": "Bonjour", "conversation_history": []})
+    assert r.status_code == 502
+    assert "modèle indisponible" in r.json()["detail"]
+
+
+def test_classification_failure_is_a_502(app_client, monkeypatch):
+    monkeypatch.setattr(main, "client", _failing_client(RuntimeError("modèle indisponible")))
+    monkeypatch.setattr(main.preclassifier, "threshold", 2.0)
+    r = app_client.post(
+        "/classify", json={"conversation_history": [{"role": "user", "content": "question sans indice clair"}]}
+    )
+    assert r.status_code == 502
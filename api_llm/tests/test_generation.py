@@ -0,0 +1,158 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from src import generation
+from src.generation import GenerationTimeout, OutputPolicy, generate, stream_usage_params
+
+CHAT = OutputPolicy(task="chat", max_tokens=50, deadline_ms=2000)
+CLASSIFY = OutputPolicy(task="classify", max_tokens=50, deadline_ms=2000, json=True)
+
+
+def _chunk(content=None, finish_reason=None):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)], usage=None
+    )
+
+
+class Stream:
+    """Flux factice : morceaux produits à la demande, fermeture observée."""
+
+    def __init__(self, chunks, pause=0.0, block_after=None):
+        self.chunks, self.pause, self.block_after = chunks, pause, block_after
+        self.consumed = 0
+        self.closed = False
+        self.release = threading.Event()
+
+    def __iter__(self):
+        for i, chunk in enumerate(self.chunks):
+            if i == self.block_after:
+                self.release.wait(5)  # flux bloqué (connexion muette)
+            if self.pause:
+                time.sleep(self.pause)
+            self.consumed += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+    def create(self, **params):
+        return self
+
+
+def _generate(stream, policy=CHAT):
+    return asyncio.run(generate(stream.create, policy, stream=True, model="m", messages=[]))
+
+
+def _generate_stalled(stream, policy):
+    """(génération, durée d'attente) ; le flux est débloqué avant l'arrêt de la boucle."""
+    async def run():
+        started = time.perf_counter()
+        try:
+            result = await generate(stream.create, policy, stream=True, model="m", messages=[])
+            return result, time.perf_counter() - started
+        finally:
+            stream.release.set()
+
+    return asyncio.run(run())
+
+
+# ---------- Client OpenAI réel ---------- #
+def _sse_client(seen):
+    chunks = [
+        {"choices": [{"index": 0, "delta": {"content": "Bonjour."}, "finish_reason": None}]},
+        {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]},
+        {"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}},
+    ]
+
+    def handler(request):
+        seen.append(json.loads(request.content))
+        body = "".join(
+            f"data: {json.dumps({'id': 'c', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'm', **c})}\n\n"
+            for c in chunks
+        )
+        return httpx.Response(200, text=body + "data: [DONE]\n\n", headers={"content-type": "text/event-stream"})
+
+    return openai.OpenAI(
+        api_key="test", base_url="http://llm.test/v1", http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    )
+
+
+def test_stream_with_installed_openai_client_reads_usage():
+    seen = []
+    client = _sse_client(seen)
+    result = asyncio.run(generate(
+        client.chat.completions.create, CHAT, stream=True, model="m", messages=[{"role": "user", "content": "Bonjour"}]
+    ))
+    assert result.text == "Bonjour."
+    assert result.finish_reason == "stop"
+    assert seen[0]["stream_options"] == {"include_usage": True}
+    assert seen[0]["max_tokens"] == CHAT.max_tokens
+    assert (result.usage.total_tokens, result.completion_tokens) == (7, 2)
+
+
+def test_stream_options_follow_the_client_signature():
+    def modern(*, model, messages, stream=False, stream_options=None, extra_body=None):
+        pass
+
+    def legacy(*, model, messages, stream=False, extra_body=None):
+        pass
+
+    def minimal(*, model, messages, stream=False):
+        pass
+
+    assert stream_usage_params(modern) == {"stream_options": {"include_usage": True}}
+    assert stream_usage_params(legacy, {"user": "x"}) == {
+        "extra_body": {"user": "x", "stream_options": {"include_usage": True}}
+    }
+    assert stream_usage_params(minimal) == {}
+
+
+# ---------- Arrêt anticipé ---------- #
+def test_length_cut_is_trimmed_to_the_last_sentence():
+    stream = Stream([_chunk("Votre colis est parti hier. Il arrivera "), _chunk("demain dans", "length")])
+    result = _generate(stream)
+    assert result.finish_reason == "length" and result.over_length
+    assert result.text == "Votre colis est parti hier."
+    assert stream.closed
+
+
+def test_deadline_closes_the_stream_and_keeps_the_text():
+    policy = OutputPolicy(task="chat", max_tokens=50, deadline_ms=100)
+    stream = Stream([_chunk(f"Phrase {i}. ") for i in range(50)], pause=0.03)
+    result = _generate(stream, policy)
+    assert result.finish_reason == "deadline"
+    assert stream.closed and stream.consumed < 50
+    assert result.text.startswith("Phrase 0.")
+
+
+def test_stalled_stream_returns_after_the_grace_period(monkeypatch):
+    monkeypatch.setattr(generation, "DEADLINE_GRACE_MS", 50)
+    policy = OutputPolicy(task="chat", max_tokens=50, deadline_ms=100)
+    stream = Stream([_chunk("Je vérifie votre dossier. "), _chunk("Un instant.")], block_after=1)
+    result, waited = _generate_stalled(stream, policy)
+    assert waited < 1
+    assert result.finish_reason == "deadline"
+    assert result.text == "Je vérifie votre dossier."
+
+
+def test_stalled_stream_without_text_times_out(monkeypatch):
+    monkeypatch.setattr(generation, "DEADLINE_GRACE_MS", 50)
+    policy = OutputPolicy(task="chat", max_tokens=50, deadline_ms=100)
+    stream = Stream([_chunk("trop tard")], block_after=0)
+    with pytest.raises(GenerationTimeout):
+        _generate_stalled(stream, policy)
+
+
+def test_json_task_stops_once_the_object_is_complete():
+    stream = Stream([_chunk('{"category": "Livraison", '), _chunk('"urgency": "Moyen"}'), _chunk(" Voilà !")])
+    result = _generate(stream, CLASSIFY)
+    assert result.finish_reason == "json_complete"
+    assert result.parsed == {"category": "Livraison", "urgency": "Moyen"}
+    assert stream.consumed == 2 and stream.closed
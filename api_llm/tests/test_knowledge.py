@@ -0,0 +1,60 @@
+import sys
+import time
+
+import pytest
+
+from src import knowledge
+from src.knowledge import HashingEmbedder, KnowledgeBase, VectorIndex, write_index
+
+CHUNKS = [
+    {"source": "livraison.md", "text": "Les colis sont livrés sous 3 à 5 jours ouvrés ; le suivi est envoyé par e-mail."},
+    {"source": "facturation.md", "text": "En cas de double prélèvement, le remboursement est effectué sous 10 jours."},
+    {"source": "compte.md", "text": "Pour réinitialiser votre mot de passe, utilisez le lien « mot de passe oublié »."},
+    {"source": "retours.md", "text": "Un article peut être retourné gratuitement dans les 30 jours suivant la livraison."},
+    {"source": "contact.md", "text": "Le service client est joignable du lundi au vendredi de 9 h à 18 h."},
+]
+QUERY = "On m'a prélevé deux fois, comment obtenir un remboursement ?"
+
+
+@pytest.fixture(params=["numpy", "mmap"])
+def index(request, tmp_path, monkeypatch):
+    """Index écrit sur disque puis relu, par numpy.memmap ou par mmap en Python pur."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setitem(sys.modules, "numpy", None)  # `import numpy` lève ImportError
+    write_index(str(tmp_path), CHUNKS, HashingEmbedder(), batch_size=2)
+    index = VectorIndex(str(tmp_path))
+    assert index.backend == ("numpy.memmap" if request.param == "numpy" else "mmap")
+    return index
+
+
+def test_round_trip_finds_the_matching_chunk(index):
+    assert (index.count, index.dim) == (len(CHUNKS), knowledge.HASHING_DIM)
+    ranked, partial = index.search(index.embedder.embed(QUERY), k=2)
+    assert not partial
+    assert [row for _, row in ranked][0] == 1
+    assert ranked[0][0] > ranked[1][0]
+    assert index.chunks[ranked[0][1]]["source"] == "facturation.md"
+
+
+def test_search_returns_the_best_partial_result_past_the_deadline(index, monkeypatch):
+    monkeypatch.setattr(knowledge, "BLOCK_ROWS", 2)
+    vector = index.embedder.embed(QUERY)
+    ranked, partial = index.search(vector, k=3, deadline=time.perf_counter() - 1)
+    # Seul le premier bloc (lignes 0 et 1) a été parcouru
+    assert partial and sorted(row for _, row in ranked) == [0, 1]
+    assert ranked[0][1] == 1
+
+
+def test_knowledge_base_caches_complete_results_only(index, monkeypatch):
+    monkeypatch.setattr(knowledge, "BLOCK_ROWS", 2)  # budget vérifié entre deux blocs
+    kb = KnowledgeBase(index, top_k=1, min_score=0.0)
+    assert [p.source for p in kb.retrieve(QUERY)] == ["facturation.md"]
+    kb.retrieve(QUERY)
+    assert kb.snapshot()["cache_hits"] == 1
+
+    late = KnowledgeBase(index, top_k=1, min_score=0.0, budget_ms=-1000)
+    late.retrieve(QUERY)
+    late.retrieve(QUERY)
+    assert (late.snapshot()["partial"], late.snapshot()["cache_hits"]) == (2, 0)
@@ -0,0 +1,55 @@
+import sqlite3
+
+from src.preclassifier import DEFAULT_URGENCY_CONFIDENCE, PreClassifier, load_training_rows
+
+
+def _classify(text):
+    # Règles seules (pas de modèle appris chargé depuis le disque)
+    return PreClassifier(model_path="").classify([{"role": "user", "content": text}])
+
+
+def test_single_urgency_cue_is_handled_locally():
+    classifier = PreClassifier(model_path="")
+    classification, confidence = _classify("C'est urgent : ma facture est fausse, le prélèvement est en double.")
+    assert classification["urgency"] == "Urgent"
+    assert classification["category"] == "Facturation"
+    assert classifier.is_confident(confidence)
+
+
+def test_default_urgency_is_not_more_confident_than_a_cue():
+    text = "Ma facture est fausse, le prélèvement est en double."
+    default, default_conf = _classify(text)
+    urgent, urgent_conf = _classify(text + " C'est urgent.")
+    assert default["urgency"] == "Moyen"
+    assert default_conf <= urgent_conf
+    assert default_conf <= DEFAULT_URGENCY_CONFIDENCE
+
+
+def test_conflicting_urgency_cues_go_to_the_model():
+    classifier = PreClassifier(model_path="")
+    _, confidence = _classify("Ma facture est fausse, c'est urgent mais pas pressé.")
+    assert not classifier.is_confident(confidence)
+
+
+def test_training_rows_include_archived_sessions(tmp_path):
+    path = str(tmp_path / "backend.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE classifications (id INTEGER PRIMARY KEY, session_id INT, category TEXT, urgency TEXT);
+        CREATE TABLE messages (id INTEGER PRIMARY KEY, session_id INT, seq INT, role TEXT, content TEXT);
+        CREATE TABLE messages_archive (id INTEGER PRIMARY KEY, session_id INT, seq INT, role TEXT, content TEXT);
+        INSERT INTO classifications VALUES (1, 1, 'Livraison', 'Moyen'), (2, 2, 'Facturation', 'Urgent');
+        INSERT INTO messages VALUES (1, 1, 1, 'USER', 'colis en retard');
+        INSERT INTO messages_archive VALUES (2, 2, 1, 'USER', 'facture fausse');
+    """)
+    conn.commit()
+    conn.close()
+    rows = sorted(load_training_rows(path))
+    assert rows == [("colis en retard", "Livraison", "Moyen"), ("facture fausse", "Facturation", "Urgent")]
+
+
+def test_without_urgency_cue_the_model_decides():
+    classifier = PreClassifier(model_path="")
+    classification, confidence = _classify("Ma facture est fausse, le prélèvement est en double sur mon compte.")
+    assert classification["category"] == "Facturation"
+    assert not classifier.is_confident(confidence)
@@ -0,0 +1,94 @@
+import pytest
+
+import main
+from src.prompt_builder import (
+    TOKENS_PER_REPLY,
+    PromptBuilder,
+    PromptTooLarge,
+    clean_history,
+    message_tokens,
+)
+
+MESSAGE = "Ma commande 1234 n'est toujours pas arrivée, que faire ?"
+
+
+def _history(n):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Tour {i} : " + "détails de la demande " * 3}
+        for i in range(n)
+    ]
+
+
+def _fixed(builder, message=MESSAGE):
+    return message_tokens(builder.chat_system) + message_tokens({"role": "user", "content": message}) + TOKENS_PER_REPLY
+
+
+def test_clean_history_keeps_only_conversation_turns():
+    history = [
+        {"role": "system", "content": "Consigne envoyée par le client"},
+        {"role": "user", "content": "Bonjour"},
+        {"role": "tool", "content": "?"},
+        {"role": "assistant", "content": None},
+        {"role": "user", "content": MESSAGE, "timestamp": "2024-01-01"},
+    ]
+    assert clean_history(history, MESSAGE) == [
+        {"role": "user", "content": "Bonjour"},
+        {"role": "assistant", "content": ""},
+    ]
+    # Le doublon n'est retiré qu'en fin d'historique
+    assert len(clean_history(history, "Bonjour")) == 3
+
+
+def test_truncation_keeps_the_system_prompt_and_the_latest_turns():
+    builder = PromptBuilder(budget=0, truncate_step=0)
+    history = _history(20)
+    builder.budget = _fixed(builder) + 5 * message_tokens(history[-1])
+
+    prompt = builder.chat(MESSAGE, history)
+    assert prompt.messages[0] is builder.chat_system
+    assert prompt.messages[-1] == {"role": "user", "content": MESSAGE}
+    kept = prompt.messages[1:-1]
+    assert kept == history[-len(kept):] and prompt.dropped == 20 - len(kept) > 0
+    assert prompt.tokens <= builder.budget
+
+
+def test_truncation_drops_whole_tiers_oldest_first():
+    cost = lambda turn: 10  # noqa: E731
+    turns = [{"role": "user", "content": str(i)} for i in range(14)]
+    tiered = PromptBuilder(budget=100, truncate_step=0.25)  # paliers de 25 tokens
+    sliding = PromptBuilder(budget=100, truncate_step=0)
+
+    # La coupe ne bouge qu'au franchissement d'un palier : préfixe stable d'un tour à l'autre
+    assert [tiered._fit(turns[:n], 0, cost)[1] for n in (10, 11, 12, 13, 14)] == [0, 3, 3, 5, 5]
+    assert [sliding._fit(turns[:n], 0, cost)[1] for n in (10, 11, 12, 13, 14)] == [0, 1, 2, 3, 4]
+    kept, dropped = tiered._fit(turns[:12], 0, cost)
+    assert kept == turns[3:12] and dropped == 3
+
+
+def test_minimum_prompt_drops_all_history_then_is_rejected():
+    builder = PromptBuilder(budget=0)
+    builder.budget = _fixed(builder)
+    prompt = builder.chat(MESSAGE, _history(4))
+    assert [m["role"] for m in prompt.messages] == ["system", "user"] and prompt.dropped == 4
+
+    builder.budget -= 1
+    with pytest.raises(PromptTooLarge) as exc:
+        builder.chat(MESSAGE, _history(4))
+    assert (exc.value.tokens, exc.value.budget) == (builder.budget + 1, builder.budget)
+    assert builder.snapshot()["rejected"] == 1
+
+
+def test_classification_document_keeps_the_latest_turns():
+    builder = PromptBuilder(budget=0, truncate_step=0)
+    builder.budget = message_tokens(builder.classify_system) + 120
+    prompt = builder.classify(_history(30))
+    content = prompt.messages[1]["content"]
+    assert prompt.dropped > 0
+    assert "Tour 29" in content and "Tour 0 " not in content
+    assert content.endswith("CLASSIFICATION :")
+
+
+def test_oversized_message_is_a_413(app_client, monkeypatch):
+    monkeypatch.setattr(main, "prompts", PromptBuilder(budget=50))
+    r = app_client.post("/chats", json={"message": "trop long " * 100, "conversation_history": []})
+    assert r.status_code == 413
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from src.routing import ModelRouter, ModelTier, RoutingRule, default_tiers, estimate_complexity
+
+COMPLEX = "Je conteste la facture, demande un remboursement et déposerai plainte ? Litige depuis 12 jours ?"
+TIERS = [
+    ModelTier(name="fast", model="petit", max_latency_ms=3000, cost_per_1k_tokens=0.002, max_cost_per_call=0.01),
+    ModelTier(name="large", model="grand", max_latency_ms=1000, cost_per_1k_tokens=0.045,
+              max_cost_per_call=0.15, fallback="fast"),
+]
+
+
+def _router():
+    return ModelRouter(TIERS, [
+        RoutingRule(tier="fast", task="classify"),
+        RoutingRule(tier="large", task="chat", min_complexity=0.6),
+        RoutingRule(tier="large", task="chat", min_history=16),
+        RoutingRule(tier="fast"),
+    ])
+
+
+def test_large_tier_is_opt_in(monkeypatch):
+    monkeypatch.delenv("LLM_MODEL_LARGE", raising=False)
+    assert [t.name for t in default_tiers()] == ["fast"]
+    decision = ModelRouter().route("chat", [{"role": "user", "content": "?"}] * 20, COMPLEX)
+    assert decision.tier.name == "fast"
+
+    monkeypatch.setenv("LLM_MODEL_LARGE", "gpt-4")
+    decision = ModelRouter().route("chat", [], COMPLEX)
+    assert (decision.tier.name, decision.model) == ("large", "gpt-4")
+
+
+def test_rules_pick_the_tier_by_task_complexity_and_history():
+    router = _router()
+    assert estimate_complexity(COMPLEX, []) >= 0.6
+    assert router.route("chat", [], "Bonjour").tier.name == "fast"
+    assert router.route("chat", [], COMPLEX).reason == "rule:large"
+    assert router.route("chat", [{"role": "user", "content": "ok"}] * 16, "Merci").tier.name == "large"
+    assert router.route("classify", [], COMPLEX).tier.name == "fast"
+
+
+def test_slow_tier_falls_back_until_its_latency_recovers():
+    router = _router()
+    decision = router.route("chat", [], COMPLEX)
+    router.record(decision, latency_ms=1100)
+    fallback = router.route("chat", [], COMPLEX)
+    assert (fallback.tier.name, fallback.reason) == ("fast", "latency:large->fast")
+    # Décroissance de la moyenne à chaque repli : le palier est retenté ensuite
+    for _ in range(5):
+        router.route("chat", [], COMPLEX)
+    assert router.route("chat", [], COMPLEX).tier.name == "large"
+
+
+def test_cost_budget_falls_back():
+    decision = _router().route("chat", [], COMPLEX, estimated_tokens=5000)  # 0,225 > 0,15
+    assert (decision.tier.name, decision.reason) == ("fast", "cost:large->fast")
+
+
+def test_from_file(tmp_path):
+    path = tmp_path / "routing.json"
+    path.write_text(json.dumps({
+        "tiers": [{"name": "mini", "model": "gpt-4o-mini"}, {"name": "maxi", "model": "gpt-4o", "fallback": "mini"}],
+        "rules": [{"tier": "maxi", "task": "extract"}, {"tier": "mini"}],
+    }))
+    router = ModelRouter.from_file(str(path))
+    assert router.route("extract").model == "gpt-4o"
+    assert router.route("chat", [], COMPLEX).model == "gpt-4o-mini"
+    assert router.snapshot()["maxi"]["model"] == "gpt-4o"
+
+
+def test_unknown_fields_in_file_are_rejected(tmp_path):
+    path = tmp_path / "routing.json"
+    path.write_text(json.dumps({"tiers": [{"name": "x", "model": "m", "prix": 1}]}))
+    with pytest.raises(TypeError):
+        ModelRouter.from_file(str(path))
@@ -0,0 +1,195 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.scheduler import LocalQuota, Priority, RateLimitScheduler, SchedulerOverloaded, SharedQuota
+from src.shared_state import SharedStore
+
+
+class RateLimitError(Exception):
+    status_code = 429
+    response = SimpleNamespace(headers={"retry-after-ms": "1"})
+
+
+def _run(scheduler, estimated, result, used=lambda r: r):
+    async def call():
+        return result
+
+    return asyncio.run(scheduler.run(Priority.INTERACTIVE, estimated, call, used_tokens=used))
+
+
+def test_reconcile_refunds_unused_reservation():
+    scheduler = RateLimitScheduler(rpm=100, tpm=10_000)
+    _run(scheduler, 2_000, 300)
+    assert scheduler.quota.tokens.tokens == pytest.approx(10_000 - 300, abs=5)
+    assert scheduler.stats["reconciled_tokens"] == 1_700
+
+
+def test_reconcile_charges_underestimate():
+    scheduler = RateLimitScheduler(rpm=100, tpm=10_000)
+    _run(scheduler, 100, 900)
+    assert scheduler.quota.tokens.tokens == pytest.approx(10_000 - 900, abs=5)
+
+
+def test_without_usage_the_reservation_is_kept():
+    scheduler = RateLimitScheduler(rpm=100, tpm=10_000)
+    _run(scheduler, 2_000, None)
+    assert scheduler.quota.tokens.tokens == pytest.approx(10_000 - 2_000, abs=5)
+
+
+def test_rate_limited_attempts_are_refunded():
+    scheduler = RateLimitScheduler(rpm=100, tpm=10_000, max_retries=1)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RateLimitError("429")
+        return 500
+
+    asyncio.run(scheduler.run(Priority.BATCH, 1_000, call, used_tokens=lambda r: r))
+    assert len(attempts) == 2
+    assert scheduler.quota.tokens.tokens == pytest.approx(10_000 - 500, abs=5)
+
+
+def test_shared_quota_reconciles_in_store(tmp_path):
+    store = SharedStore(str(tmp_path / "state.db"))
+    scheduler = RateLimitScheduler(quota=SharedQuota(store, rpm=100, tpm=10_000))
+    _run(scheduler, 2_000, 300)
+    with store.transaction() as conn:
+        level = store._level(conn, "tpm", 10_000, time.time())
+    assert level == pytest.approx(10_000 - 300, abs=5)
+
+
+def test_local_quota_refund_is_capped():
+    quota = LocalQuota(rpm=10, tpm=1_000)
+    quota.refund_tokens(5_000)
+    assert quota.tokens.tokens == 1_000
+
+
+class GateQuota:
+    """Quota fermé tant que `slots` vaut 0 ; chaque créneau ouvert admet une requête."""
+
+    blocking = False
+
+    def __init__(self):
+        self.slots = 0
+
+    def try_acquire(self, tokens, reserve=0.0):
+        if self.slots > 0:
+            self.slots -= 1
+            return 0.0
+        return 0.01
+
+    def refund_tokens(self, tokens):
+        pass
+
+    def pause(self, seconds):
+        pass
+
+    def paused_for(self):
+        return 0.0
+
+    def eta(self):
+        return 4.0
+
+
+def test_interactive_requests_pass_before_queued_batch():
+    quota = GateQuota()
+    scheduler = RateLimitScheduler(quota=quota)
+    admitted = []
+
+    async def request(name, priority):
+        await scheduler.acquire(priority, 10)
+        admitted.append(name)
+
+    async def scenario():
+        tasks = [asyncio.create_task(request("batch-1", Priority.BATCH)),
+                 asyncio.create_task(request("batch-2", Priority.BATCH))]
+        await asyncio.sleep(0.05)
+        tasks.append(asyncio.create_task(request("chat", Priority.INTERACTIVE)))
+        await asyncio.sleep(0.05)
+        quota.slots = 3
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert admitted == ["chat", "batch-1", "batch-2"]
+
+
+def test_full_batch_queue_is_shed_but_chats_are_queued():
+    scheduler = RateLimitScheduler(quota=GateQuota(), max_batch_queue=2)
+
+    async def scenario():
+        waiting = [asyncio.create_task(scheduler.acquire(Priority.BATCH, 10)) for _ in range(2)]
+        chat = asyncio.create_task(scheduler.acquire(Priority.INTERACTIVE, 10))
+        await asyncio.sleep(0.05)
+        with pytest.raises(SchedulerOverloaded) as shed:
+            await scheduler.acquire(Priority.BATCH, 10)
+        assert not chat.done()
+        for task in waiting + [chat]:
+            task.cancel()
+        return shed.value
+
+    shed = asyncio.run(scenario())
+    assert shed.retry_after == 4.0
+    assert scheduler.stats["shed"] == 1
+
+
+def test_batch_requests_give_up_after_their_max_wait():
+    quota = GateQuota()
+    scheduler = RateLimitScheduler(quota=quota, max_batch_wait=0.1, max_interactive_wait=5)
+
+    async def scenario():
+        chat = asyncio.create_task(scheduler.acquire(Priority.INTERACTIVE, 10))
+        started = time.monotonic()
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.acquire(Priority.BATCH, 10)
+        waited = time.monotonic() - started
+        quota.slots = 1
+        await chat  # la requête interactive, elle, attend toujours son créneau
+        return waited
+
+    assert asyncio.run(scenario()) < 1
+
+
+def test_shed_classification_is_a_503_with_retry_after(app_client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.scheduler, "max_batch_queue", 0)
+    monkeypatch.setattr(main.preclassifier, "threshold", 2.0)
+    r = app_client.post(
+        "/classify", json={"conversation_history": [{"role": "user", "content": "question délestée 7f3a"}]}
+    )
+    assert r.status_code == 503
+    assert int(r.headers["Retry-After"]) >= 1
+
+
+class SlowStore:
+    """SharedStore dont chaque écriture attend le verrou SQLite d'un autre worker."""
+
+    def take(self, demands):
+        time.sleep(0.2)
+        return 0.0
+
+    def get_value(self, key, default=0.0):
+        return default
+
+
+def test_shared_quota_does_not_block_the_event_loop():
+    scheduler = RateLimitScheduler(quota=SharedQuota(SlowStore(), rpm=100, tpm=10_000))
+    ticks = []
+
+    async def ticker():
+        while len(ticks) < 100:
+            ticks.append(1)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        beat = asyncio.create_task(ticker())
+        await scheduler.acquire(Priority.INTERACTIVE, 10)
+        beat.cancel()
+
+    asyncio.run(scenario())
+    assert len(ticks) >= 5
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from src.shared_state import ResponseCache, SharedStore
+
+RPM = 60.0  # un jeton par seconde
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """Deux connexions sur le même fichier, comme deux workers."""
+    path = str(tmp_path / "state.db")
+    first, second = SharedStore(path), SharedStore(path)
+    yield first, second
+    first._conn.close()
+    second._conn.close()
+
+
+def test_take_is_shared_between_stores(stores):
+    first, second = stores
+    assert first.take({"rpm": (RPM, RPM, RPM)}) == 0
+    # Seau vidé par l'autre worker : attente d'environ une seconde par jeton manquant
+    assert 0 < second.wait_time("rpm", 1, RPM) <= 1
+    assert second.take({"rpm": (1, 1, RPM)}) > 0
+
+
+def test_take_is_all_or_nothing(stores):
+    first, second = stores
+    first.take({"tpm": (90, 90, 100)})
+    # tpm insuffisant : rpm n'est pas consommé non plus
+    assert second.take({"rpm": (1, 1, RPM), "tpm": (50, 50, 100)}) > 0
+    assert first.wait_time("rpm", RPM, RPM) == 0
+
+
+def test_refund_is_seen_by_the_other_store(stores):
+    first, second = stores
+    first.take({"rpm": (RPM, RPM, RPM)})
+    second.refund("rpm", RPM, RPM)
+    assert first.wait_time("rpm", RPM, RPM) == 0
+    assert first.take({"rpm": (RPM, RPM, RPM)}) == 0
+
+
+def test_shared_cache_is_seen_by_the_other_store(stores):
+    first, second = stores
+    ResponseCache(first).set("classify:a", {"category": "Livraison"})
+    cache = ResponseCache(second)
+    assert cache.get("classify:a") == {"category": "Livraison"}
+    assert cache.snapshot() == {"hits": 1, "misses": 0, "shared": True}
+
+
+def test_local_cache_without_a_store(monkeypatch):
+    cache = ResponseCache(ttl=60, max_local=2)
+    for key in ("a", "b"):
+        cache.set(key, {"key": key})
+    assert cache.get("a") == {"key": "a"}
+    cache.set("c", {"key": "c"})  # « b » est le moins récemment utilisé
+    assert (cache.get("b"), cache.get("c")) == (None, {"key": "c"})
+
+    expired = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: expired)
+    assert cache.get("a") is None
+    assert cache.snapshot() == {"hits": 2, "misses": 2, "shared": False}
+
+
+def test_cache_disabled_with_a_zero_ttl():
+    cache = ResponseCache(ttl=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
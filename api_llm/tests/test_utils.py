@@ -0,0 +1,46 @@
+import pytest
+
+from src.utils import IncrementalJSONParser, extract_json_object, safe_json_parse
+
+OBJECT = '{"category": "Livraison", "urgency": "Moyen", "meta": {"source": "chat", "tags": ["a", "b"]}}'
+EXPECTED = {"category": "Livraison", "urgency": "Moyen", "meta": {"source": "chat", "tags": ["a", "b"]}}
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(OBJECT)])
+def test_object_split_across_chunks(size):
+    parser = IncrementalJSONParser()
+    chunks = [OBJECT[i:i + size] for i in range(0, len(OBJECT), size)]
+    results = [parser.feed(chunk) for chunk in chunks]
+    assert results[-1] == EXPECTED
+    assert all(r is None for r in results[:-1])
+
+
+def test_braces_and_escaped_quotes_inside_strings():
+    text = r'{"summary": "le client a écrit \"}\" puis {", "urgency": "Urgent"}'
+    assert extract_json_object(text) == {"summary": 'le client a écrit "}" puis {', "urgency": "Urgent"}
+
+
+def test_prose_around_the_object():
+    text = 'Voici la classification :\n```json\n' + OBJECT + '\n```\nJ\'espère que cela aide {merci}.'
+    assert extract_json_object(text) == EXPECTED
+    assert safe_json_parse(text) == EXPECTED
+
+
+def test_false_start_is_skipped():
+    assert extract_json_object('Format {catégorie, urgence} : {"urgency": "Faible"}') == {"urgency": "Faible"}
+
+
+def test_object_is_returned_once_complete_even_before_the_stream_ends():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"urgency": "Urgent"}') == {"urgency": "Urgent"}
+    assert parser.feed(" Et d'autres tokens parasites") is None
+
+
+@pytest.mark.parametrize("text", ["", "pas de JSON", '{"urgency": "Urgent",}', '{"urgency": ', "[1, 2]", "null"])
+def test_malformed_input(text):
+    assert extract_json_object(text) is None
+    assert safe_json_parse(text) == {}
+
+
+def test_plain_json_is_parsed_directly():
+    assert safe_json_parse(OBJECT) == EXPECTED
@@ -0,0 +1,101 @@
+"""
+Benchmark de sérialisation des listings (messages).
+
+Compare le chemin historique (objets ORM -> validation Pydantic
+`from_attributes` -> encodeur JSON par défaut) au chemin rapide
+(projection en dicts -> orjson), puis la taille des payloads brute / gzip.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_serialization [--sizes 1000 10000 100000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Callable, List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from src.models import RoleEnum
+from src.schemas import MessageResponse
+
+try:
+    import brotli
+except ImportError:  # optionnel
+    brotli = None
+
+
+def make_rows(n: int) -> List[SimpleNamespace]:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(
+            id=i,
+            session_id=i // 20,
+            role=RoleEnum.USER if i % 2 == 0 else RoleEnum.ASSISTANT,
+            content=f"Message {i} : bonjour, j'ai un problème avec ma commande n°{i * 7}.",
+            timestamp=start + timedelta(seconds=i),
+        )
+        for i in range(n)
+    ]
+
+
+def legacy_path(rows) -> bytes:
+    adapter = TypeAdapter(List[MessageResponse])
+    models = adapter.validate_python(rows, from_attributes=True)
+    return json.dumps(jsonable_encoder(models)).encode("utf-8")
+
+
+def fast_path(rows) -> bytes:
+    return orjson.dumps([
+        {
+            "id": r.id,
+            "session_id": r.session_id,
+            "role": r.role.value,
+            "content": r.content,
+            "timestamp": r.timestamp,
+        }
+        for r in rows
+    ])
+
+
+def timed(func: Callable, *args, repeat: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    header = f"{'lignes':>8} | {'pydantic+json (ms)':>18} | {'orjson (ms)':>11} | {'x':>5} | {'brut (Ko)':>9} | {'gzip (Ko)':>9}"
+    if brotli:
+        header += f" | {'br (Ko)':>8}"
+    print(header)
+    print("-" * len(header))
+    for n in args.sizes:
+        rows = make_rows(n)
+        t_legacy, _ = timed(legacy_path, rows)
+        t_fast, body = timed(fast_path, rows)
+        line = (
+            f"{n:>8} | {t_legacy * 1000:>18.1f} | {t_fast * 1000:>11.1f} | {t_legacy / t_fast:>5.1f} | "
+            f"{len(body) / 1024:>9.0f} | {len(gzip.compress(body, 6)) / 1024:>9.0f}"
+        )
+        if brotli:
+            line += f" | {len(brotli.compress(body, quality=5)) / 1024:>8.0f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark du temps de démarrage (import de `main`) via `python -X importtime`.
+
+Chaque mesure lance un interpréteur neuf, importe le module applicatif et
+relève le temps cumulé d'import ; la médiane est comparée à un seuil pour
+détecter les régressions (code de sortie 1 si dépassé, utilisable en CI).
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_startup [--max-ms 1500] [--runs 5]
+    python -m benchmarks.bench_startup --app-dir ../api_llm --max-ms 1500
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# "import time:   self [us] | cumulative | imported package"
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(app_dir: str, module: str) -> Tuple[float, Dict[str, int]]:
+    """Temps total (ms) et temps cumulés (µs) des imports de premier et second niveau."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=app_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import de {module} impossible :\n{proc.stderr[-2000:]}")
+
+    modules: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        # Indentation : 1 espace au premier niveau, +2 par niveau d'imbrication
+        if match and len(match.group(3)) <= 3:
+            modules[match.group(4)] = int(match.group(2))
+    total_ms = modules.get(module, sum(modules.values())) / 1000
+    return total_ms, modules
+
+
+def report(runs: List[Tuple[float, Dict[str, int]]], top: int) -> float:
+    median = statistics.median(total for total, _ in runs)
+    print(f"Import : médiane {median:.0f} ms, min {min(t for t, _ in runs):.0f} ms ({len(runs)} mesures)")
+
+    # Imports directs les plus coûteux, hors module applicatif lui-même (dernière mesure)
+    _, modules = runs[-1]
+    heaviest = sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[1:top + 1]
+    for name, micros in heaviest:
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+    return median
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark du temps d'import")
+    parser.add_argument("--app-dir", default=".", help="Répertoire du service (backend/ ou api_llm/)")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Nombre d'imports les plus lents affichés")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=float(os.getenv("STARTUP_MAX_MS", "1500")),
+        help="Seuil de régression sur la médiane",
+    )
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.app_dir, args.module) for _ in range(args.runs)]
+    median = report(runs, args.top)
+    if median > args.max_ms:
+        print(f"RÉGRESSION : {median:.0f} ms > seuil {args.max_ms:.0f} ms")
+        sys.exit(1)
+    print(f"OK (seuil {args.max_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
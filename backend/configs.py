@@ -2,34 +2,172 @@
 
 from __future__ import annotations
 
+import hashlib
+import importlib
 import os
 from pathlib import Path
-from typing import Generator
+from typing import Generator, List, Optional, Tuple
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, insert, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.schema import CreateIndex, CreateTable
 
-from src.models import Base  # Base = declarative_base() dans models.py
+from src.models import Base, SchemaVersion  # Base = declarative_base() dans models.py
+from src.shared_state import shared_state
 
 # --------------------------------------------------------------------------- #
 # Base de données
 # --------------------------------------------------------------------------- #
 DEFAULT_SQLITE_PATH = Path(__file__).parent.parent / "smart_support.db"
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DEFAULT_SQLITE_PATH}")
+# Réplica en lecture (optionnel) : tableaux de bord, listes et exports
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+# Après une écriture, les lectures de l'utilisateur restent sur le primaire
+# le temps que le réplica rattrape son retard (lecture de ses propres écritures)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
 
-engine = create_engine(
-    DATABASE_URL,
-    future=True,
-    echo=os.getenv("DEBUG_SQL", "false").lower() == "true",
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
-)
+
+def _create_engine(url: str) -> Engine:
+    return create_engine(
+        url,
+        future=True,
+        echo=os.getenv("DEBUG_SQL", "false").lower() == "true",
+        connect_args={"check_same_thread": False} if url.startswith("sqlite") else {},
+    )
+
+
+engine = _create_engine(DATABASE_URL)
+read_engine = _create_engine(DATABASE_READ_URL) if DATABASE_READ_URL else engine
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, future=True)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _pin_writer(db: Session) -> None:
+    """Une écriture de l'utilisateur (db.info["user_id"]) épingle ses lectures au primaire."""
+    user_id = db.info.get("user_id")
+    if user_id is not None and read_engine is not engine:
+        shared_state.set(f"primary_pin:{user_id}", "1", READ_YOUR_WRITES_SECONDS)
+
+
+def read_session(user_id: Optional[int] = None) -> Session:
+    """
+    Session pour une requête en lecture seule : le réplica, sauf si aucun
+    n'est configuré ou si l'utilisateur vient d'écrire sur le primaire.
+    """
+    if read_engine is engine or (user_id is not None and shared_state.get(f"primary_pin:{user_id}")):
+        return SessionLocal()
+    return ReadSessionLocal()
+
+
+# Colonnes calculées depuis les données existantes : quand la migration les
+# ajoute à une table déjà remplie, elle lance le recalcul correspondant
+# (« module:fonction », appelée une fois avec une Session, avant la création
+# des index).
+COLUMN_BACKFILLS = {
+    **{("sessions", name): "src.stats:backfill" for name in (
+        "message_count", "user_message_count", "assistant_message_count", "total_chars", "last_activity_at",
+    )},
+    ("messages", "seq"): "src.stats:backfill_seq",
+    ("messages_archive", "seq"): "src.stats:backfill_seq",
+    ("classifications", "urgency_rank"): "src.work_queue:backfill",
+}
 
 
 def create_tables() -> None:
     """Crée toutes les tables SQL (noop si déjà créées)."""
     Base.metadata.create_all(bind=engine)
+    added = _add_missing_columns()
+    _run_backfills(added)
+    _create_missing_indexes()
+
+
+def _add_missing_columns() -> List[Tuple[str, str]]:
+    """
+    Ajoute aux tables existantes les colonnes apparues depuis leur création
+    (create_all ne modifie pas une table existante), avec le même DDL que
+    CREATE TABLE (type, valeur par défaut serveur, NOT NULL). Une colonne
+    NOT NULL sans valeur par défaut serveur est refusée : les lignes
+    existantes n'auraient pas de valeur.
+    Retourne les (table, colonne) ajoutées.
+    """
+    inspector = inspect(engine)
+    compiler = engine.dialect.ddl_compiler(engine.dialect, None)
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(
+                        f"{table.name}.{column.name} : colonne NOT NULL sans valeur par défaut serveur, "
+                        "migration manuelle nécessaire"
+                    )
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {compiler.get_column_specification(column)}"))
+                added.append((table.name, column.name))
+    return added
+
+
+def _run_backfills(added: List[Tuple[str, str]]) -> None:
+    """Recalcule les colonnes ajoutées listées dans COLUMN_BACKFILLS (chaque fonction une fois)."""
+    targets = list(dict.fromkeys(COLUMN_BACKFILLS[key] for key in added if key in COLUMN_BACKFILLS))
+    for target in targets:
+        module, function = target.split(":")
+        db = SessionLocal()
+        try:
+            getattr(importlib.import_module(module), function)(db)
+        finally:
+            db.close()
+
+
+def _create_missing_indexes() -> None:
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+# Migration : `python -m migrate` une fois par déploiement. SCHEMA_AUTO_MIGRATE=true
+# (poste de dev, un seul worker) la lance au démarrage ; désactivé par défaut,
+# plusieurs workers migreraient en concurrence (ALTER et recalculs en double).
+SCHEMA_AUTO_MIGRATE = os.getenv("SCHEMA_AUTO_MIGRATE", "false").lower() == "true"
+
+
+def schema_fingerprint() -> str:
+    """Empreinte du schéma déclaré (DDL des tables et index)."""
+    ddl = []
+    for table in Base.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(engine)))
+        ddl.extend(str(CreateIndex(index).compile(engine)) for index in sorted(table.indexes, key=lambda i: i.name))
+    return hashlib.sha1("\n".join(ddl).encode("utf-8")).hexdigest()
+
+
+def applied_fingerprint() -> str | None:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(SchemaVersion.__tablename__):
+            return None
+        return conn.execute(
+            select(SchemaVersion.fingerprint).order_by(SchemaVersion.id.desc()).limit(1)
+        ).scalar()
+
+
+def ensure_schema() -> bool:
+    """
+    Applique create_tables() seulement si le schéma a changé depuis la
+    dernière migration : au démarrage, une seule requête dans le cas courant.
+    Retourne True si une migration a été appliquée.
+    """
+    fingerprint = schema_fingerprint()
+    if applied_fingerprint() == fingerprint:
+        return False
+    create_tables()
+    with engine.begin() as conn:
+        conn.execute(insert(SchemaVersion).values(fingerprint=fingerprint))
+    return True
 
 
 def get_db() -> Generator:
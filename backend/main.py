@@ -2,30 +2,70 @@
 
 from __future__ import annotations
 
-from typing import List
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Generator, List, Literal, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
-from configs import API_CONFIG, CORS_CONFIG, create_tables, get_db
-from src.models import Message, Session as SessionModel, User
+from configs import (
+    API_CONFIG,
+    CORS_CONFIG,
+    SCHEMA_AUTO_MIGRATE,
+    ReadSessionLocal,
+    SessionLocal,
+    applied_fingerprint,
+    engine,
+    ensure_schema,
+    get_db,
+    read_session,
+    schema_fingerprint,
+)
+from src.bulk_import import ImportReport, StreamImporter, classify_imported
+from src.caching import (
+    classifications_version,
+    not_modified,
+    session_messages_version,
+    stats_version,
+    user_sessions_version,
+)
+from src.events import QUEUE_UPDATED, event_bus, sse_stream
+from src.export import FORMATS, stream_export
+from src.responses import CompressionMiddleware, fast_json
+from src.models import Session as SessionModel, User
 from src.schemas import (
     ClassificationResponse,
+    KeywordCount,
+    QueueItem,
+    ConversationRollup,
+    ConversationStats,
     DashboardStatsResponse,
+    ImportResult,
     MessageCreate,
     MessageResponse,
     SessionCreate,
     SessionResponse,
     SessionWithMessages,
+    SimilarSession,
     Token,
     UserCreate,
     UserLogin,
     UserResponse,
 )
-from src.sessions import SessionManager
+from src.idempotency import RequestInProgress, in_flight
+from src.keywords import trending
+from src.sessions import LLM_BREAKERS, SessionManager
+from src.similarity import find_similar
+from src.stats import rollup, session_stats
+from src.work_queue import ClaimConflict, claim, claim_next, list_queue, release, resolve
+from src.shared_state import shared_state
 from src.utils import (
+    cached_principal,
     create_access_token,
     get_stats_by_category,
     get_stats_by_urgency,
@@ -37,29 +77,74 @@ from src.utils import (
 # --------------------------------------------------------------------------- #
 # Initialisation FastAPI
 # --------------------------------------------------------------------------- #
-app = FastAPI(**API_CONFIG)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Hors du chemin d'import : le schéma est vérifié au démarrage du serveur,
+    # pas à chaque import de main (tests, outils, workers de rechargement).
+    if SCHEMA_AUTO_MIGRATE:
+        await run_in_threadpool(ensure_schema)
+    elif await run_in_threadpool(applied_fingerprint) != schema_fingerprint():
+        print("[⚠️ AVERTISSEMENT] Schéma de base non à jour : lancer `python -m migrate` depuis backend/.")
+    yield
+
+
+app = FastAPI(**API_CONFIG, lifespan=lifespan)
+app.add_middleware(CompressionMiddleware, minimum_size=1024, exclude_paths=("/events",))
 app.add_middleware(CORSMiddleware, **CORS_CONFIG)
 security = HTTPBearer()
-create_tables()
 
 
 # --------------------------------------------------------------------------- #
 # Auth & sécurité
 # --------------------------------------------------------------------------- #
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db),
-) -> User:
+def token_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
     token_data = verify_token(credentials.credentials)
     if not token_data:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide")
+    return token_data.get("user_id")
 
-    user = db.query(User).filter(User.id == token_data.get("user_id")).first()
+
+def _principal(db: Session, user_id: int) -> User:
+    user = cached_principal(db, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Utilisateur non trouvé")
     return user
 
 
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db),
+) -> User:
+    user = _principal(db, token_user_id(credentials))
+    # Les commits de cette session épinglent les lectures de l'utilisateur au primaire
+    db.info["user_id"] = user.id
+    return user
+
+
+def get_read_db(user_id: int = Depends(token_user_id)) -> Generator:
+    """
+    Session en lecture seule (réplica si DATABASE_READ_URL est défini),
+    choisie d'après le token : aucune session n'est ouverte sur le primaire.
+    """
+    db = read_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_user(user_id: int = Depends(token_user_id), db: Session = Depends(get_read_db)) -> User:
+    """Utilisateur courant des routes en lecture, lu dans la même session que get_read_db."""
+    try:
+        return _principal(db, user_id)
+    except HTTPException:
+        # Compte créé sur le primaire, pas encore répliqué
+        if db.get_bind() is engine:
+            raise
+    with SessionLocal() as primary:
+        return _principal(primary, user_id)
+
+
 # --------------------------------------------------------------------------- #
 # Auth
 # --------------------------------------------------------------------------- #
@@ -111,8 +196,14 @@ def create_session(
 
 @app.get("/sessions", response_model=List[SessionResponse])
 def list_user_sessions(
-    current_user: User = Depends(get_current_user), db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
+    cached = not_modified(request, response, *user_sessions_version(db, current_user.id))
+    if cached:
+        return cached
     manager = SessionManager(db)
     return manager.get_user_sessions(current_user.id)
 
@@ -120,8 +211,10 @@ def list_user_sessions(
 @app.get("/sessions/{session_id}", response_model=SessionWithMessages)
 def retrieve_session(
     session_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     session = db.query(SessionModel).filter(
         SessionModel.id == session_id,
@@ -129,7 +222,37 @@ def retrieve_session(
     ).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session non trouvée")
-    return session
+    cached = not_modified(request, response, *session_messages_version(db, session, "detail"))
+    if cached:
+        return cached
+    return fast_json(SessionManager(db).get_session_detail(session), response)
+
+
+@app.get("/sessions/{session_id}/stats", response_model=ConversationStats)
+def retrieve_session_stats(
+    session_id: int,
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+    if not session or (session.user_id != current_user.id and not current_user.is_agent):
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    return session_stats(session)
+
+
+@app.get("/sessions/{session_id}/similar", response_model=List[SimilarSession])
+def similar_sessions(
+    session_id: int,
+    limit: int = Query(default=5, ge=1, le=50),
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    """Conversations passées quasi identiques (index LSH, src/similarity.py) ; agents uniquement."""
+    if not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    if db.get(SessionModel, session_id) is None:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    return find_similar(db, session_id, limit)
 
 
 @app.post("/sessions/{session_id}/end")
@@ -171,6 +294,8 @@ def classify_session(
 def send_message(
     session_id: int,
     message_data: MessageCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(default=None, max_length=64),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -181,18 +306,29 @@ def send_message(
     if not session:
         raise HTTPException(status_code=404, detail="Session non trouvée")
 
+    # Idempotency-Key (en-tête) ou client_message_id (corps) : un renvoi ne rappelle pas le LLM
+    client_message_id = idempotency_key or message_data.client_message_id
     manager = SessionManager(db)
     try:
-        return manager.add_message(session_id, message_data)
+        message = manager.add_message(session_id, message_data, client_message_id)
+    except RequestInProgress as exc:
+        raise HTTPException(status_code=409, detail=str(exc), headers={"Retry-After": "5"}) from exc
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if manager.assistant_unavailable:
+        # Message enregistré sans réponse : le client affiche un avis, rien n'est stocké
+        response.headers["X-Assistant-Status"] = "unavailable"
+    return message
 
 
 @app.get("/sessions/{session_id}/messages", response_model=List[MessageResponse])
 def list_session_messages(
     session_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = None,
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     session = db.query(SessionModel).filter(
         SessionModel.id == session_id,
@@ -200,12 +336,40 @@ def list_session_messages(
     ).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session non trouvée")
+    cached = not_modified(request, response, *session_messages_version(db, session, after_id))
+    if cached:
+        return cached
+
+    # after_id : récupération incrémentale, uniquement les messages postérieurs
+    messages = SessionManager(db).list_messages(session_id, after_id, archived=session.archived_at is not None)
+    return fast_json(messages, response)
+
 
-    return (
-        db.query(Message)
-        .filter(Message.session_id == session_id)
-        .order_by(Message.timestamp)
-        .all()
+# --------------------------------------------------------------------------- #
+# Événements temps réel (SSE)
+# --------------------------------------------------------------------------- #
+def get_stream_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    """
+    Utilisateur d'un flux long (dépendance synchrone, exécutée dans le
+    threadpool) : la session DB est fermée avant le début du flux.
+    """
+    db = SessionLocal()
+    try:
+        return get_current_user(credentials, db)
+    finally:
+        db.close()
+
+
+@app.get("/events")
+async def stream_events(
+    session_id: Optional[int] = None,
+    current_user: User = Depends(get_stream_user),
+):
+    sub = event_bus.subscribe(current_user.id, current_user.is_agent, session_id)
+    return StreamingResponse(
+        sse_stream(event_bus, sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
@@ -214,36 +378,62 @@ def list_session_messages(
 # --------------------------------------------------------------------------- #
 @app.get("/classifications", response_model=List[ClassificationResponse])
 def list_classifications(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    keyword: Optional[str] = Query(default=None, max_length=50),
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     if not current_user.is_agent:
         raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    cached = not_modified(request, response, *classifications_version(db, keyword))
+    if cached:
+        return cached
+    # keyword : filtrage par l'index classification_keywords (src/keywords.py)
     manager = SessionManager(db)
-    return manager.get_all_classifications()
+    return fast_json(manager.get_all_classifications(keyword), response)
+
+
+@app.get("/keywords/trending", response_model=List[KeywordCount])
+def trending_keywords(
+    days: int = Query(default=7, ge=1, le=365),
+    limit: int = Query(default=10, ge=1, le=100),
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    """Mots-clés les plus fréquents sur les `days` derniers jours (compteurs journaliers)."""
+    if not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    return trending(db, days, limit)
 
 
 @app.get("/stats", response_model=DashboardStatsResponse)
 def dashboard_stats(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     if not current_user.is_agent:
         raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    cached = not_modified(request, response, *stats_version(db))
+    if cached:
+        return cached
 
     manager = SessionManager(db)
 
-    total_sessions = db.query(SessionModel).count()
+    # Totaux tirés des compteurs de sessions : aucun parcours de la table messages
+    totals = rollup(db)
     active_sessions = manager.get_active_sessions_count()
-    total_messages = db.query(Message).count()
     classifications = manager.get_all_classifications()
 
     return {
         "session_stats": {
-            "total_sessions": total_sessions,
+            "total_sessions": totals["session_count"],
             "active_sessions": active_sessions,
-            "total_messages": total_messages,
+            "total_messages": totals["message_count"],
         },
+        "conversation_stats": totals,
         "category_stats": [
             {"category": cat, "count": cnt}
             for cat, cnt in get_stats_by_category(classifications).items()
@@ -255,6 +445,164 @@ def dashboard_stats(
     }
 
 
+@app.get("/stats/users/{user_id}", response_model=ConversationRollup)
+def user_conversation_stats(
+    user_id: int,
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    if user_id != current_user.id and not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    return rollup(db, user_id)
+
+
+# --------------------------------------------------------------------------- #
+# File des agents
+# --------------------------------------------------------------------------- #
+def _queue_event(db: Session, item: dict, action: str) -> None:
+    owner_id = db.query(SessionModel.user_id).filter(SessionModel.id == item["session_id"]).scalar()
+    event_bus.publish(QUEUE_UPDATED, owner_id, item["session_id"], {**item, "action": action})
+
+
+@app.get("/queue", response_model=List[QueueItem])
+def agent_queue(
+    limit: int = Query(default=20, ge=1, le=200),
+    include_claimed: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Tickets non résolus, le plus urgent puis le plus récent d'abord (lu sur le primaire)."""
+    if not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    return list_queue(db, limit, include_claimed)
+
+
+@app.post("/queue/claim", response_model=QueueItem)
+def claim_next_ticket(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    if not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    item = claim_next(db, current_user.id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Aucun ticket disponible")
+    _queue_event(db, item, "claimed")
+    return item
+
+
+@app.post("/queue/{session_id}/claim", response_model=QueueItem)
+def claim_ticket(
+    session_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Prend en charge un ticket précis, ou prolonge le bail d'un ticket déjà détenu."""
+    if not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    try:
+        item = claim(db, session_id, current_user.id)
+    except ClaimConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    if item is None:
+        raise HTTPException(status_code=404, detail="Ticket non trouvé ou déjà résolu")
+    _queue_event(db, item, "claimed")
+    return item
+
+
+@app.post("/queue/{session_id}/release")
+def release_ticket(
+    session_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    if not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    if not release(db, session_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Ticket non détenu par cet agent")
+    _queue_event(db, {"session_id": session_id, "claimed_by": None}, "released")
+    return {"message": "Ticket remis dans la file"}
+
+
+@app.post("/queue/{session_id}/resolve", response_model=QueueItem)
+def resolve_ticket(
+    session_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    if not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    try:
+        item = resolve(db, session_id, current_user.id)
+    except ClaimConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    if item is None:
+        raise HTTPException(status_code=404, detail="Ticket non trouvé ou déjà résolu")
+    _queue_event(db, item, "resolved")
+    return item
+
+
+@app.get("/export/{entity}")
+def export_data(
+    entity: Literal["sessions", "messages", "classifications"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_read_user),
+):
+    if not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    filename = f"{entity}.{format}"
+    return StreamingResponse(
+        stream_export(ReadSessionLocal, entity, format, start, end),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def get_import_owner(user_id: Optional[int] = None, agent: User = Depends(get_stream_user)) -> int:
+    """Propriétaire des sessions importées (dépendance synchrone, exécutée dans le threadpool)."""
+    if not agent.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    owner_id = user_id if user_id is not None else agent.id
+    db = SessionLocal()
+    try:
+        if db.get(User, owner_id) is None:
+            raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    finally:
+        db.close()
+    return owner_id
+
+
+@app.post("/import/sessions", response_model=ImportResult, status_code=status.HTTP_201_CREATED)
+async def import_conversations(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    classify: bool = False,
+    owner_id: int = Depends(get_import_owner),
+):
+    """
+    Import NDJSON (une session par ligne, voir src/bulk_import.py), lu en flux
+    et inséré par lots. `user_id` : propriétaire des sessions (par défaut l'agent).
+    Un lot en échec est annulé et compté dans `failed` ; les lots déjà validés
+    restent importés et la réponse décrit ce qui l'a été.
+    """
+    db = SessionLocal()
+    try:
+        importer = StreamImporter(db, owner_id, ImportReport())
+        async for chunk in request.stream():
+            await run_in_threadpool(importer.feed, chunk)
+        report = await run_in_threadpool(importer.finish)
+    finally:
+        db.close()
+
+    queued = 0
+    if classify and report.session_ids:
+        background_tasks.add_task(classify_imported, SessionLocal, report.session_ids)
+        queued = len(report.session_ids)
+    return {**report.as_dict(), "classification_queued": queued}
+
+
 # --------------------------------------------------------------------------- #
 # Root – Healthcheck
 # --------------------------------------------------------------------------- #
@@ -263,6 +611,18 @@ def root():
     return {"message": "Smart Support Backend API", "status": "running"}
 
 
+@app.get("/metrics")
+def metrics(current_user: User = Depends(get_read_user)):
+    if not current_user.is_agent:
+        raise HTTPException(status_code=403, detail="Accès réservé aux agents")
+    return {
+        "circuit_breakers": {breaker.name: breaker.snapshot() for breaker in LLM_BREAKERS},
+        "events": event_bus.snapshot(),
+        "idempotency": in_flight.snapshot(),
+        "shared_state": shared_state.snapshot(),
+    }
+
+
 # --------------------------------------------------------------------------- #
 # Dev server
 # --------------------------------------------------------------------------- #
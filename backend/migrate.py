@@ -0,0 +1,32 @@
+"""
+Migration du schéma, à lancer une fois par déploiement (depuis backend/) :
+
+    python -m migrate            # applique si le schéma déclaré a changé
+    python -m migrate --check    # code de sortie 1 si une migration est nécessaire
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import List
+
+from configs import applied_fingerprint, ensure_schema, schema_fingerprint
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Migration du schéma Smart Support")
+    parser.add_argument("--check", action="store_true", help="Vérifier sans appliquer")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        if applied_fingerprint() != schema_fingerprint():
+            print("Migration nécessaire")
+            sys.exit(1)
+        print("Schéma à jour")
+        return
+    print("Migration appliquée" if ensure_schema() else "Schéma déjà à jour")
+
+
+if __name__ == "__main__":
+    main()
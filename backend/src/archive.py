@@ -0,0 +1,110 @@
+"""
+Archivage chaud/froid des messages.
+
+Les messages des sessions terminées depuis plus de N jours sont déplacés de
+`messages` vers `messages_archive` ; la table chaude reste petite et ses
+index restent en cache. Les lectures qui portent sur toutes les sessions
+passent par `all_messages()`, l'union des deux tables (recherche), ou lisent
+les deux tables à la suite (export).
+Lancement (cron) depuis backend/ :
+
+    python -m src.archive --days 90
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from sqlalchemy import delete, func, insert, select, text, union_all, update
+from sqlalchemy.orm import Session
+
+from .models import ArchivedMessage, Message, Session as SessionModel
+
+ARCHIVE_COLUMNS = ("id", "session_id", "seq", "role", "content", "timestamp")
+
+
+def all_messages():
+    """Messages des tables chaude et froide (sous-requête aux colonnes ARCHIVE_COLUMNS)."""
+    return union_all(
+        *(select(*(getattr(table, c) for c in ARCHIVE_COLUMNS)) for table in (Message, ArchivedMessage))
+    ).subquery("all_messages")
+
+
+def sessions_to_archive(db: Session, older_than_days: int, limit: int, after_id: int = 0) -> List[int]:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    return list(db.scalars(
+        select(SessionModel.id)
+        .where(
+            SessionModel.is_active.is_(False),
+            SessionModel.ended_at < cutoff,
+            SessionModel.archived_at.is_(None),
+            SessionModel.id > after_id,
+        )
+        .order_by(SessionModel.id)
+        .limit(limit)
+    ))
+
+
+def _reuses_ids(db: Session) -> bool:
+    """Table `messages` SQLite créée sans AUTOINCREMENT : le plus grand id libéré serait réattribué."""
+    if db.get_bind().dialect.name != "sqlite":
+        return False
+    ddl = db.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages'")).scalar()
+    return "AUTOINCREMENT" not in (ddl or "").upper()
+
+
+def archive_sessions(db: Session, session_ids: List[int]) -> int:
+    """Déplace les messages des sessions données ; une seule transaction."""
+    if session_ids and _reuses_ids(db):
+        # La session du dernier message attend un lot suivant : son id resterait sinon réutilisable
+        newest = db.execute(
+            select(Message.session_id).where(Message.id == select(func.max(Message.id)).scalar_subquery())
+        ).scalar()
+        session_ids = [sid for sid in session_ids if sid != newest]
+    if not session_ids:
+        return 0
+    source = select(*(getattr(Message, c) for c in ARCHIVE_COLUMNS)).where(
+        Message.session_id.in_(session_ids)
+    )
+    db.execute(insert(ArchivedMessage).from_select(list(ARCHIVE_COLUMNS), source))
+    moved = db.execute(delete(Message).where(Message.session_id.in_(session_ids))).rowcount
+    db.execute(
+        update(SessionModel)
+        .where(SessionModel.id.in_(session_ids))
+        .values(archived_at=datetime.now(timezone.utc))
+    )
+    db.commit()
+    return moved
+
+
+def run(db: Session, older_than_days: int, batch_size: int = 200) -> int:
+    """Archive par lots de sessions jusqu'à épuisement ; retourne le nombre de messages déplacés."""
+    total, last_id = 0, 0
+    while True:
+        ids = sessions_to_archive(db, older_than_days, batch_size, last_id)
+        if not ids:
+            return total
+        total += archive_sessions(db, ids)
+        last_id = ids[-1]
+
+
+def main(argv: List[str] = None) -> None:
+    from configs import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Archivage des messages des sessions terminées")
+    parser.add_argument("--days", type=int, default=90, help="Âge minimal (jours) depuis la fin de session")
+    parser.add_argument("--batch-size", type=int, default=200, help="Sessions par transaction")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        moved = run(db, args.days, args.batch_size)
+    finally:
+        db.close()
+    print(f"{moved} messages archivés")
+
+
+if __name__ == "__main__":
+    main()
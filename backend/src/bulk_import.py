@@ -0,0 +1,242 @@
+"""
+Import en masse de conversations historiques (NDJSON).
+
+Une ligne = une session et ses messages :
+
+    {"title": "…", "created_at": "2023-05-02T09:14:00", "ended_at": null,
+     "messages": [{"role": "user", "content": "…", "timestamp": "…"}, …]}
+
+Les lignes sont insérées par lots (un INSERT multi-lignes / executemany par
+table et par lot, un commit par lot) : pas d'appel LLM pour les réponses
+importées, pas de requête par message. Un lot en échec est annulé et signalé
+dans le bilan ; les lots déjà validés restent importés. Les compteurs de session et les
+numéros de séquence sont calculés pendant l'import. La classification peut
+être lancée ensuite, session par session, via le disjoncteur habituel.
+
+Depuis backend/ :
+    python -m src.bulk_import tickets.ndjson --user-id 42 --classify
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .models import Message, RoleEnum, Session as SessionModel
+from .similarity import index_sessions
+from .schemas import ImportSession
+from .utils import generate_session_title
+
+BATCH_SIZE = 500  # sessions par transaction
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportReport:
+    """Bilan cumulé d'un import (lignes rejetées comprises)."""
+
+    def __init__(self) -> None:
+        self.sessions = 0
+        self.messages = 0
+        self.failed = 0  # sessions valides perdues avec un lot annulé
+        self.errors: List[str] = []
+        self.session_ids: List[int] = []
+
+    def error(self, line_no: int, message: str) -> None:
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"ligne {line_no} : {message}")
+
+    def batch_failed(self, first_line: int, last_line: int, count: int, exc: Exception) -> None:
+        self.failed += count
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"lignes {first_line}-{last_line} : lot annulé ({type(exc).__name__})")
+
+    def as_dict(self) -> Dict:
+        return {"sessions": self.sessions, "messages": self.messages, "failed": self.failed, "errors": self.errors}
+
+
+def parse_lines(lines: Iterable[Tuple[int, bytes]], report: ImportReport) -> Iterator[ImportSession]:
+    """Valide chaque ligne ; les lignes invalides sont signalées puis ignorées."""
+    for line_no, line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield ImportSession.model_validate(orjson.loads(line))
+        except orjson.JSONDecodeError as exc:
+            report.error(line_no, f"JSON invalide ({exc})")
+        except ValidationError as exc:
+            first = exc.errors()[0]
+            report.error(line_no, f"{'.'.join(map(str, first['loc']))} : {first['msg']}")
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _session_row(item: ImportSession, user_id: int, imported_at: datetime) -> Dict:
+    stamps = [_utc(m.timestamp) for m in item.messages if m.timestamp]
+    created = _utc(item.created_at) or (min(stamps) if stamps else imported_at)
+    last = max(stamps) if stamps else created
+    first_user = next((m.content for m in item.messages if m.role == "user"), "")
+    users = sum(1 for m in item.messages if m.role == "user")
+    return {
+        "user_id": user_id,
+        "title": item.title or (generate_session_title(first_user) if first_user else "Conversation importée"),
+        "is_active": False,
+        "created_at": created,
+        "ended_at": _utc(item.ended_at) or last,
+        "message_count": len(item.messages),
+        "user_message_count": users,
+        "assistant_message_count": len(item.messages) - users,
+        "total_chars": sum(len(m.content) for m in item.messages),
+        "response_time_sum": 0.0,
+        "response_time_count": 0,
+        "last_activity_at": last,
+    }
+
+
+def import_batch(db: Session, items: List[ImportSession], user_id: int, report: ImportReport) -> List[int]:
+    """Insère un lot de sessions et leurs messages ; une transaction."""
+    if not items:
+        return []
+    now = datetime.now(timezone.utc)
+    session_ids = db.scalars(
+        insert(SessionModel).returning(SessionModel.id, sort_by_parameter_order=True),
+        [_session_row(item, user_id, now) for item in items],
+    ).all()
+
+    rows = []
+    for session_id, item in zip(session_ids, items):
+        fallback = _utc(item.created_at) or now
+        for seq, m in enumerate(item.messages, start=1):
+            rows.append({
+                "session_id": session_id,
+                "seq": seq,
+                "role": RoleEnum(m.role),
+                "content": m.content,
+                "timestamp": _utc(m.timestamp) or fallback,
+            })
+    if rows:
+        db.execute(insert(Message), rows)
+    index_sessions(db, {
+        session_id: [m.content for m in item.messages if m.role == "user"]
+        for session_id, item in zip(session_ids, items)
+    })
+    db.commit()
+
+    report.sessions += len(session_ids)
+    report.messages += len(rows)
+    report.session_ids.extend(session_ids)
+    return list(session_ids)
+
+
+class StreamImporter:
+    """
+    Import d'un corps NDJSON reçu par morceaux (coupures de lignes quelconques).
+    `feed` et `finish` sont synchrones (parsing + écriture DB) : l'endpoint
+    les exécute dans le threadpool.
+    """
+
+    def __init__(self, db: Session, user_id: int, report: ImportReport, batch_size: Optional[int] = None) -> None:
+        self.db, self.user_id, self.report = db, user_id, report
+        self.batch_size = batch_size or BATCH_SIZE
+        self.batch: List[ImportSession] = []
+        self.pending = b""
+        self.line_no = 0
+        self.first_line = 1  # première ligne du lot en cours
+
+    def feed(self, chunk: bytes) -> None:
+        *lines, self.pending = (self.pending + chunk).split(b"\n")
+        self._add(lines)
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+
+    def finish(self) -> ImportReport:
+        self._add([self.pending])
+        self.pending = b""
+        self._flush()
+        return self.report
+
+    def _add(self, lines: List[bytes]) -> None:
+        self.batch.extend(parse_lines(enumerate(lines, start=self.line_no + 1), self.report))
+        self.line_no += len(lines)
+
+    def _flush(self) -> None:
+        try:
+            import_batch(self.db, self.batch, self.user_id, self.report)
+        except SQLAlchemyError as exc:
+            self.db.rollback()
+            self.report.batch_failed(self.first_line, self.line_no, len(self.batch), exc)
+        self.batch = []
+        self.first_line = self.line_no + 1
+
+
+def import_sessions(
+    db: Session,
+    items: Iterable[ImportSession],
+    user_id: int,
+    report: Optional[ImportReport] = None,
+    batch_size: int = BATCH_SIZE,
+) -> ImportReport:
+    report = report or ImportReport()
+    batch: List[ImportSession] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            import_batch(db, batch, user_id, report)
+            batch = []
+    import_batch(db, batch, user_id, report)
+    return report
+
+
+def classify_imported(session_factory, session_ids: List[int]) -> int:
+    """Classification a posteriori (hors requête) ; retourne le nombre de réussites."""
+    from .sessions import SessionManager
+
+    done = 0
+    db = session_factory()
+    try:
+        manager = SessionManager(db)
+        for session_id in session_ids:
+            if manager.classify_session(session_id):
+                done += 1
+    finally:
+        db.close()
+    return done
+
+
+def main(argv: List[str] = None) -> None:
+    from configs import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Import NDJSON de conversations historiques")
+    parser.add_argument("path", help="Fichier NDJSON (une session par ligne)")
+    parser.add_argument("--user-id", type=int, required=True, help="Propriétaire des sessions importées")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--classify", action="store_true", help="Classifier les sessions après l'import")
+    args = parser.parse_args(argv)
+
+    report = ImportReport()
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as fh:
+            items = parse_lines(enumerate(fh, start=1), report)
+            import_sessions(db, items, args.user_id, report, args.batch_size)
+    finally:
+        db.close()
+    print(f"{report.sessions} sessions, {report.messages} messages importés")
+    for error in report.errors:
+        print(error)
+    if args.classify:
+        print(f"{classify_imported(SessionLocal, report.session_ids)} sessions classifiées")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Requêtes conditionnelles HTTP (ETag / Last-Modified / 304) pour les listings"""
+
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models import ArchivedMessage, Classification, Message, Session as SessionModel
+
+
+def make_etag(*parts: Any) -> str:
+    """ETag faible calculé à partir d'un petit tuple de « versions »."""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _latest(values: Iterable[Optional[datetime]]) -> Optional[datetime]:
+    dates = [v if v.tzinfo else v.replace(tzinfo=timezone.utc) for v in values if v]
+    return max(dates) if dates else None
+
+
+def not_modified(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+) -> Optional[Response]:
+    """
+    Pose ETag / Last-Modified sur `response` et retourne une réponse 304
+    si le client possède déjà cette version, sinon None.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if last_modified.replace(microsecond=0) <= since:
+            return Response(status_code=304, headers=headers)
+    return None
+
+
+# ---------- Validateurs (requêtes d'agrégat, sans charger les lignes) ---------- #
+def user_sessions_version(db: Session, user_id: int):
+    count, max_id, created, ended, activity = db.query(
+        func.count(SessionModel.id),
+        func.max(SessionModel.id),
+        func.max(SessionModel.created_at),
+        func.max(SessionModel.ended_at),
+        func.max(SessionModel.last_activity_at),
+    ).filter(SessionModel.user_id == user_id).one()
+    # Le titre change au premier message : le dernier message fait partie de la version
+    last_message, last_message_at = (
+        db.query(func.max(Message.id), func.max(Message.timestamp))
+        .join(SessionModel, SessionModel.id == Message.session_id)
+        .filter(SessionModel.user_id == user_id)
+        .one()
+    )
+    etag = make_etag("sessions", user_id, count, max_id, ended, activity, last_message)
+    # Mêmes entrées que l'ETag : un titre modifié ou un nouveau message avance Last-Modified
+    return etag, _latest([created, ended, activity, last_message_at])
+
+
+def session_messages_version(db: Session, session: SessionModel, *extra: Any):
+    table = ArchivedMessage if session.archived_at else Message
+    count, max_id, last = db.query(
+        func.count(table.id), func.max(table.id), func.max(table.timestamp)
+    ).filter(table.session_id == session.id).one()
+    etag = make_etag(
+        "messages", session.id, count, max_id, session.title, session.is_active, session.ended_at,
+        session.archived_at, *extra
+    )
+    return etag, _latest([last, session.created_at, session.ended_at])
+
+
+def classifications_version(db: Session, *extra: Any):
+    count, max_id, last = db.query(
+        func.count(Classification.id), func.max(Classification.id), func.max(Classification.classified_at)
+    ).one()
+    return make_etag("classifications", count, max_id, *extra), _latest([last])
+
+
+def stats_version(db: Session):
+    # Compteurs de sessions (src/stats.py) : pas de parcours de la table messages
+    sessions = db.query(
+        func.count(SessionModel.id),
+        func.max(SessionModel.id),
+        func.max(SessionModel.created_at),
+        func.max(SessionModel.ended_at),
+        func.sum(SessionModel.message_count),
+        func.max(SessionModel.last_activity_at),
+    ).one()
+    class_etag, class_last = classifications_version(db)
+    etag = make_etag("stats", sessions[0], sessions[1], sessions[3], sessions[4], sessions[5], class_etag)
+    return etag, _latest([sessions[2], sessions[3], sessions[5], class_last])
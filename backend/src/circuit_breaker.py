@@ -0,0 +1,146 @@
+"""Disjoncteur autour des appels au micro-service LLM"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """Levée quand le disjoncteur refuse un appel (service LLM jugé indisponible)."""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à trois états (closed / open / half_open).
+
+    - closed : les appels passent ; chaque résultat est enregistré dans une
+      fenêtre glissante. Un appel plus lent que `slow_call_threshold` compte
+      comme un échec (None : la durée n'est pas prise en compte).
+    - open : tous les appels échouent immédiatement pendant `open_seconds`.
+    - half_open : au plus `half_open_probes` appels d'essai passent ; un succès
+      referme le circuit, un échec le rouvre.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_threshold: Optional[float] = 10.0,
+        window_seconds: float = 60.0,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._calls: Deque[Tuple[float, bool]] = deque()  # (horodatage, échec ?)
+        self._counters = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    # ---------- État ---------- #
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self._counters["opened"] += 1
+
+    # ---------- Appels ---------- #
+    def _before_call(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                self._counters["rejected"] += 1
+                raise CircuitOpenError(f"Circuit {self.name} ouvert")
+            if state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    self._counters["rejected"] += 1
+                    raise CircuitOpenError(f"Circuit {self.name} en test")
+                self._probes_in_flight += 1
+
+    def _after_call(self, failed: bool, duration: float) -> None:
+        slow = self.slow_call_threshold is not None and duration >= self.slow_call_threshold
+        failed = failed or slow
+        now = time.monotonic()
+        with self._lock:
+            self._counters["calls"] += 1
+            self._counters["failures"] += int(failed)
+            self._counters["slow_calls"] += int(slow)
+
+            if self._state == self.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed:
+                    self._open()
+                else:
+                    self._state = self.CLOSED
+                    self._calls.clear()
+                return
+
+            self._calls.append((now, failed))
+            self._trim(now)
+            if len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, f in self._calls if f)
+                if failures / len(self._calls) >= self.failure_rate_threshold:
+                    self._open()
+
+    def call(self, func: Callable[..., Any], *args, is_failure: Callable[[Any], bool] = None, **kwargs) -> Any:
+        """
+        Exécute `func` sous la protection du disjoncteur.
+        `is_failure` permet de compter comme échec un résultat sans exception
+        (ex. réponse HTTP 5xx).
+        """
+        self._before_call()
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._after_call(True, time.monotonic() - start)
+            raise
+        self._after_call(bool(is_failure and is_failure(result)), time.monotonic() - start)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            state = self._current_state()
+            window = len(self._calls)
+            failures = sum(1 for _, f in self._calls if f)
+            return {
+                "state": state,
+                "window_calls": window,
+                "window_failure_rate": round(failures / window, 3) if window else 0.0,
+                "open_for": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1)
+                if state == self.OPEN else 0.0,
+                **self._counters,
+            }
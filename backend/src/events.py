@@ -0,0 +1,133 @@
+"""Diffusion d'événements temps réel (messages, classifications) vers les clients SSE"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from .shared_state import MemoryStore, shared_state, store_from_env
+
+MESSAGE_CREATED = "message_created"
+CLASSIFICATION_CREATED = "classification_created"
+QUEUE_UPDATED = "queue_updated"  # prise en charge / libération / résolution d'un ticket
+# Événements diffusés à tous les agents, quel que soit le propriétaire de la session
+AGENT_EVENTS = {CLASSIFICATION_CREATED, QUEUE_UPDATED}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "value"):  # Enum
+        return value.value
+    raise TypeError(f"Type non sérialisable : {type(value)!r}")
+
+
+class Subscription:
+    """File d'attente d'un client abonné, alimentée depuis n'importe quel thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, user_id: int, is_agent: bool,
+                 session_id: Optional[int] = None, maxsize: int = 100):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.user_id = user_id
+        self.is_agent = is_agent
+        self.session_id = session_id
+        self.dropped = 0
+
+    def accepts(self, event: Dict[str, Any]) -> bool:
+        if self.session_id is not None and event.get("session_id") != self.session_id:
+            return False
+        if event.get("user_id") == self.user_id:
+            return True
+        # Les agents suivent toutes les classifications et la file (tableau de bord)
+        return self.is_agent and event["type"] in AGENT_EVENTS
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client trop lent : on perd l'événement plutôt que de bloquer l'émetteur
+            self.dropped += 1
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        self.loop.call_soon_threadsafe(self._put, event)
+
+
+class EventBus:
+    """
+    Abonnés SSE du processus ; la diffusion passe par le store partagé
+    (src/shared_state.py) pour atteindre les abonnés des autres workers.
+    """
+
+    CHANNEL = "events"
+
+    def __init__(self, store=None):
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self.store = store or MemoryStore()
+        self.store.subscribe(self.CHANNEL, self._dispatch)
+        self.published = 0
+
+    def subscribe(self, user_id: int, is_agent: bool, session_id: Optional[int] = None) -> Subscription:
+        sub = Subscription(asyncio.get_running_loop(), user_id, is_agent, session_id)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event_type: str, user_id: int, session_id: int, data: Dict[str, Any]) -> None:
+        """Publie un événement ; sûr depuis les endpoints synchrones (threadpool)."""
+        event = {"type": event_type, "user_id": user_id, "session_id": session_id, "data": data}
+        with self._lock:
+            self.published += 1
+        self.store.publish(self.CHANNEL, json.dumps(event, default=_default))
+
+    def _dispatch(self, payload: str) -> None:
+        event = json.loads(payload)
+        with self._lock:
+            targets = [s for s in self._subscribers if s.accepts(event)]
+        for sub in targets:
+            sub.deliver(event)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "dropped": sum(s.dropped for s in self._subscribers),
+            }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def sse_stream(bus: EventBus, sub: Subscription, keepalive: float = 15.0):
+    """Générateur SSE ; envoie un commentaire keep-alive en l'absence d'événement."""
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        bus.unsubscribe(sub)
+
+
+def bus_from_env() -> EventBus:
+    # EVENTS_REDIS_URL (historique) : Redis pour les seuls événements
+    url = os.getenv("EVENTS_REDIS_URL")
+    return EventBus(store_from_env(url) if url else shared_state)
+
+
+event_bus = bus_from_env()
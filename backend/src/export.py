@@ -0,0 +1,182 @@
+"""
+Export en flux (NDJSON / CSV / Parquet) des sessions, messages et classifications.
+
+Les lignes sont lues par lots avec un curseur côté serveur (`yield_per`) :
+la mémoire reste constante quel que soit le volume exporté.
+
+Export Parquet (CLI, nécessite `pyarrow`) depuis backend/ :
+    python -m src.export messages --format parquet --out-dir exports/ --start 2024-01-01
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import ArchivedMessage, Classification, Message, Session as SessionModel
+
+BATCH_SIZE = 1000
+
+
+def _message_source(table):
+    return [table.id, table.session_id, table.role, table.content, table.timestamp], table.timestamp
+
+
+# entité -> sources [(colonnes exportées, colonne de filtre temporel)], lues l'une après l'autre.
+# Messages : table froide puis table chaude (src/archive.py), chacune dans l'ordre de sa clé
+# primaire ; pas d'union triée, qui forcerait un tri complet avant la première ligne.
+EXPORTS = {
+    "sessions": [(
+        [SessionModel.id, SessionModel.user_id, SessionModel.title, SessionModel.is_active,
+         SessionModel.created_at, SessionModel.ended_at],
+        SessionModel.created_at,
+    )],
+    "messages": [_message_source(ArchivedMessage), _message_source(Message)],
+    "classifications": [(
+        [Classification.id, Classification.session_id, Classification.category, Classification.urgency,
+         Classification.summary, Classification.keywords, Classification.classified_at],
+        Classification.classified_at,
+    )],
+}
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def columns(entity: str) -> List[str]:
+    return [col.key for col in EXPORTS[entity][0][0]]
+
+
+def iter_batches(
+    db: Session,
+    entity: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[List[Dict]]:
+    """Lots de dicts, lus via un curseur serveur, source par source dans l'ordre des ids."""
+    keys = columns(entity)
+    for cols, time_col in EXPORTS[entity]:
+        stmt = select(*cols)
+        if start:
+            stmt = stmt.where(time_col >= start)
+        if end:
+            stmt = stmt.where(time_col < end)
+        stmt = stmt.order_by(cols[0]).execution_options(stream_results=True, yield_per=batch_size)
+
+        for partition in db.execute(stmt).partitions():
+            yield [
+                {k: (v.value if hasattr(v, "value") else v) for k, v in zip(keys, row)}
+                for row in partition
+            ]
+
+
+def ndjson_chunks(batches: Iterator[List[Dict]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield b"".join(orjson.dumps(row) + b"\n" for row in batch)
+
+
+def csv_chunks(batches: Iterator[List[Dict]], header: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=header)
+    writer.writeheader()
+    for batch in batches:
+        for row in batch:
+            writer.writerow({
+                k: orjson.dumps(v).decode() if isinstance(v, (list, dict)) else v
+                for k, v in row.items()
+            })
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_export(
+    session_factory,
+    entity: str,
+    fmt: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Iterator[bytes]:
+    """Générateur pour StreamingResponse ; possède sa propre session DB."""
+    db = session_factory()
+    try:
+        batches = iter_batches(db, entity, start, end)
+        if fmt == "csv":
+            yield from csv_chunks(batches, columns(entity))
+        else:
+            yield from ndjson_chunks(batches)
+    finally:
+        db.close()
+
+
+def write_parquet(
+    db: Session,
+    entity: str,
+    out_dir: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> str:
+    """Écrit un fichier Parquet lot par lot (un row group par lot)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:  # pragma: no cover - dépendance optionnelle
+        raise RuntimeError("L'export Parquet nécessite pyarrow (pip install pyarrow).") from exc
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{entity}_{datetime.now():%Y%m%d_%H%M%S}.parquet")
+    writer = None
+    try:
+        for batch in iter_batches(db, entity, start, end):
+            for row in batch:
+                for k, v in row.items():
+                    if isinstance(v, (list, dict)):
+                        row[k] = orjson.dumps(v).decode()
+            table = pa.Table.from_pylist(batch)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def main(argv: List[str] = None) -> None:
+    from configs import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Export Smart Support")
+    parser.add_argument("entity", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=["ndjson", "csv", "parquet"], default="ndjson")
+    parser.add_argument("--out-dir", default="exports")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet":
+        db = SessionLocal()
+        try:
+            print(write_parquet(db, args.entity, args.out_dir, args.start, args.end))
+        finally:
+            db.close()
+        return
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    path = os.path.join(args.out_dir, f"{args.entity}.{args.format}")
+    with open(path, "wb") as fh:
+        for chunk in stream_export(SessionLocal, args.entity, args.format, args.start, args.end):
+            fh.write(chunk)
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
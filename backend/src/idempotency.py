@@ -0,0 +1,92 @@
+"""
+Requêtes idempotentes en cours (clé client -> attente du premier traitement).
+
+La déduplication durable repose sur l'index unique
+(messages.session_id, messages.client_message_id) ; ce registre couvre la
+fenêtre où le premier envoi attend encore le LLM et n'a rien écrit : un
+renvoi avec la même clé attend son résultat au lieu de rappeler le modèle.
+
+Les réservations vivent dans le store partagé (src/shared_state.py) : un
+renvoi arrivé sur un autre worker attend lui aussi le premier envoi.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from .shared_state import shared_state
+
+
+class RequestInProgress(Exception):
+    """Le premier envoi avec cette clé n'est pas terminé dans le délai d'attente."""
+
+
+class InFlightRegistry:
+    """Réservations des traitements en cours, par clé (TTL : un worker arrêté ne bloque pas la clé)."""
+
+    def __init__(self, store=None, poll: float = 0.1):
+        self.store = store or shared_state
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._local: Dict[str, threading.Event] = {}  # réveil immédiat dans le même processus
+        self.joined = 0
+
+    @staticmethod
+    def _key(key) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return "inflight:" + ":".join(map(str, parts))
+
+    def begin(self, key, ttl: float = 60.0) -> Optional["_Waiter"]:
+        """
+        Réserve `key`. Retourne None si l'appelant devient propriétaire du
+        traitement, sinon un objet dont `wait(timeout)` attend sa fin.
+        """
+        name = self._key(key)
+        if self.store.add(name, str(os.getpid()), ttl):
+            with self._lock:
+                self._local[name] = threading.Event()
+            return None
+        with self._lock:
+            self.joined += 1
+        return _Waiter(self, name)
+
+    def end(self, key) -> None:
+        """Libère `key` et réveille les requêtes en attente (succès ou échec)."""
+        name = self._key(key)
+        self.store.delete(name)
+        with self._lock:
+            event = self._local.pop(name, None)
+        if event is not None:
+            event.set()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"in_flight": len(self._local), "joined": self.joined}
+
+
+class _Waiter:
+    def __init__(self, registry: InFlightRegistry, name: str):
+        self.registry = registry
+        self.name = name
+
+    def wait(self, timeout: float) -> bool:
+        """True quand la réservation est libérée, False si `timeout` est écoulé."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.registry.store.get(self.name) is None:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self.registry._lock:
+                event = self.registry._local.get(self.name)
+            if event is not None:
+                event.wait(min(remaining, 1.0))
+            else:
+                time.sleep(min(remaining, self.registry.poll))
+
+
+in_flight = InFlightRegistry()
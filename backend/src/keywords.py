@@ -0,0 +1,180 @@
+"""
+Index des mots-clés de classification.
+
+`Classification.keywords` garde la liste telle que renvoyée par le modèle
+(colonne JSON) ; les formes normalisées (minuscules, sans doublon) sont
+aussi écrites, dans la transaction de la classification, dans :
+
+- `classification_keywords(keyword, classification_id)` : filtrage des
+  classifications par mot-clé via la clé primaire (keyword, …) ;
+- `keyword_daily_counts(day, keyword, count)` : compteurs journaliers
+  incrémentés à l'insertion ; les tendances d'une période somment quelques
+  lignes par jour au lieu de décoder toutes les classifications.
+
+Reconstruction (lignes antérieures, anciens mots-clés doublement encodés)
+depuis backend/ :
+    python -m src.keywords backfill
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .models import Classification, ClassificationKeyword, KeywordDailyCount
+
+MAX_KEYWORD_LENGTH = 50
+MAX_KEYWORDS = 10
+
+
+def decode_keywords(value) -> List[str]:
+    """
+    Liste de mots-clés depuis la colonne JSON. Les anciennes lignes contiennent
+    une chaîne JSON (liste encodée deux fois) : elle est décodée.
+    """
+    while isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return [value] if value else []
+    return [str(k) for k in value] if isinstance(value, list) else []
+
+
+def normalize_keywords(value) -> List[str]:
+    """Formes indexées : minuscules, espaces réduits, sans doublon, ordre conservé."""
+    seen: Dict[str, None] = {}
+    for keyword in decode_keywords(value):
+        keyword = " ".join(keyword.lower().split())[:MAX_KEYWORD_LENGTH]
+        if keyword:
+            seen.setdefault(keyword, None)
+    return list(seen)[:MAX_KEYWORDS]
+
+
+def index_keywords(db: Session, classification_id: int, keywords: List[str], day: date) -> None:
+    """Indexe les mots-clés (déjà normalisés) d'une classification ; à appeler avant le commit."""
+    if not keywords:
+        return
+    db.execute(
+        insert(ClassificationKeyword),
+        [{"keyword": k, "classification_id": classification_id} for k in keywords],
+    )
+    _add_counts(db, {(day, k): 1 for k in keywords})
+
+
+def _add_counts(db: Session, counts: Dict[tuple, int]) -> None:
+    """keyword_daily_counts[day, keyword] += n, en un upsert quand la base le permet."""
+    rows = [{"day": day, "keyword": k, "count": n} for (day, k), n in counts.items()]
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(KeywordDailyCount)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["day", "keyword"],
+                set_={"count": KeywordDailyCount.count + stmt.excluded["count"]},
+            ),
+            rows,
+        )
+        return
+    for row in rows:
+        updated = db.execute(
+            update(KeywordDailyCount)
+            .where(KeywordDailyCount.day == row["day"], KeywordDailyCount.keyword == row["keyword"])
+            .values(count=KeywordDailyCount.count + row["count"])
+        )
+        if updated.rowcount == 0:
+            db.execute(insert(KeywordDailyCount).values(**row))
+
+
+def trending(db: Session, days: int = 7, limit: int = 10, today: Optional[date] = None) -> List[Dict]:
+    """Mots-clés les plus fréquents sur les `days` derniers jours (aujourd'hui inclus)."""
+    since = (today or datetime.now(timezone.utc).date()) - timedelta(days=days - 1)
+    total = func.sum(KeywordDailyCount.count).label("count")
+    rows = db.execute(
+        select(KeywordDailyCount.keyword, total)
+        .where(KeywordDailyCount.day >= since)
+        .group_by(KeywordDailyCount.keyword)
+        .order_by(total.desc(), KeywordDailyCount.keyword)
+        .limit(limit)
+    ).all()
+    return [{"keyword": keyword, "count": count} for keyword, count in rows]
+
+
+def keyword_filter(keyword: str):
+    """Critère « la classification porte ce mot-clé » (sous-requête sur l'index)."""
+    return Classification.id.in_(
+        select(ClassificationKeyword.classification_id).where(
+            ClassificationKeyword.keyword == " ".join(keyword.lower().split())
+        )
+    )
+
+
+def backfill(db: Session, batch_size: int = 1000) -> int:
+    """Réécrit les mots-clés en liste JSON et reconstruit l'index et les compteurs."""
+    db.execute(delete(ClassificationKeyword))
+    db.execute(delete(KeywordDailyCount))
+    counts: Counter = Counter()
+    done, last_id = 0, 0
+    while True:
+        rows = db.execute(
+            select(Classification.id, Classification.keywords, Classification.classified_at)
+            .where(Classification.id > last_id)
+            .order_by(Classification.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        pairs = []
+        for row in rows:
+            if isinstance(row.keywords, str):
+                db.execute(
+                    update(Classification)
+                    .where(Classification.id == row.id)
+                    .values(keywords=decode_keywords(row.keywords))
+                    .execution_options(synchronize_session=False)
+                )
+            keywords = normalize_keywords(row.keywords)
+            pairs.extend({"keyword": k, "classification_id": row.id} for k in keywords)
+            counts.update((row.classified_at.date(), k) for k in keywords)
+        if pairs:
+            db.execute(insert(ClassificationKeyword), pairs)
+        done += len(rows)
+        last_id = rows[-1].id
+    _add_counts(db, counts)
+    db.commit()
+    return done
+
+
+def main(argv: List[str] = None) -> None:
+    from configs import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Index des mots-clés de classification")
+    parser.add_argument("command", choices=["backfill", "trending"])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            print(f"{backfill(db)} classifications indexées")
+        else:
+            for item in trending(db, args.days, args.limit):
+                print(f"{item['count']:>6}  {item['keyword']}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
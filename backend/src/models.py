@@ -3,21 +3,26 @@
 from __future__ import annotations
 
 import enum
-from datetime import datetime
+from datetime import datetime, timezone
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
+    Date,
     DateTime,
     Enum,
+    Float,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     func,
     JSON,
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, relationship, validates
 
 Base = declarative_base()
 
@@ -28,6 +33,11 @@ class RoleEnum(str, enum.Enum):
     ASSISTANT = "assistant"
 
 
+# Rang de tri de la file des agents : le plus urgent d'abord
+URGENCY_RANKS = {"Urgent": 0, "Moyen": 1, "Faible": 2}
+DEFAULT_URGENCY_RANK = URGENCY_RANKS["Moyen"]
+
+
 # ---------- Models ---------- #
 class User(Base):
     __tablename__ = "users"
@@ -65,6 +75,16 @@ class Session(Base):
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
     ended_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=True)  # messages déplacés vers messages_archive
+
+    # Compteurs incrémentaux, mis à jour dans la transaction de chaque message
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
+    user_message_count = Column(Integer, default=0, server_default="0", nullable=False)
+    assistant_message_count = Column(Integer, default=0, server_default="0", nullable=False)
+    total_chars = Column(Integer, default=0, server_default="0", nullable=False)
+    response_time_sum = Column(Float, default=0.0, server_default="0", nullable=False)  # secondes
+    response_time_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_activity_at = Column(DateTime(timezone=True), nullable=True)
 
     # Relations
     user = relationship("User", back_populates="sessions")
@@ -73,7 +93,7 @@ class Session(Base):
         back_populates="session",
         cascade="all, delete-orphan",
         passive_deletes=True,
-        order_by="Message.timestamp",
+        order_by="(Message.seq, Message.id)",
     )
     classification = relationship(
         "Classification",
@@ -87,15 +107,29 @@ class Session(Base):
         return f"<Session {self.id} user={self.user_id}>"
 
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Historique d'une session = parcours d'intervalle sur cet index, dans l'ordre
+        Index("ix_messages_session_seq", "session_id", "seq", unique=True),
+        # Déduplication des renvois client (NULL pour les messages sans clé)
+        Index("ix_messages_session_client_id", "session_id", "client_message_id", unique=True),
+        # Les ids archivés (messages_archive) ne doivent jamais être réattribués
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False, index=True)
+    seq = Column(Integer, nullable=True)  # rang dans la session (1, 2, …), attribué au commit
+    client_message_id = Column(String(64), nullable=True)  # clé d'idempotence fournie par le client
     role = Column(Enum(RoleEnum), nullable=False)
     content = Column(Text, nullable=False)
     timestamp = Column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True), default=_utcnow, server_default=func.now(), nullable=False
     )
 
     # Relations
@@ -105,6 +139,28 @@ class Message(Base):
         return f"<Message {self.id} role={self.role}>"
 
 
+class ArchivedMessage(Base):
+    """Messages froids : sessions terminées depuis longtemps (voir src/archive.py)."""
+
+    __tablename__ = "messages_archive"
+    __table_args__ = (
+        Index("ix_messages_archive_session_seq", "session_id", "seq"),
+    )
+
+    id = Column(Integer, primary_key=True)  # même id que dans `messages`
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False, index=True)
+    seq = Column(Integer, nullable=True)
+    role = Column(Enum(RoleEnum), nullable=False)
+    content = Column(Text, nullable=False)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"<ArchivedMessage {self.id} session={self.session_id}>"
+
+
 class Classification(Base):
     __tablename__ = "classifications"
 
@@ -124,8 +180,78 @@ class Classification(Base):
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
+    # File de traitement des agents (voir src/work_queue.py)
+    urgency_rank = Column(Integer, default=DEFAULT_URGENCY_RANK, server_default="1", nullable=False)
+    claimed_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)  # prise en charge expirée : ticket libre
+    resolved_at = Column(DateTime(timezone=True), nullable=True)
+
     # Relations
     session = relationship("Session", back_populates="classification")
 
+    @validates("urgency")
+    def _set_urgency_rank(self, key: str, urgency: str) -> str:
+        self.urgency_rank = URGENCY_RANKS.get(urgency, DEFAULT_URGENCY_RANK)
+        return urgency
+
     def __repr__(self) -> str:  # pragma: no cover
         return f"<Classification {self.id} {self.category}/{self.urgency}>"
+
+
+# File des agents : tickets non résolus, par urgence puis du plus récent au
+# plus ancien. Index partiel : les tickets résolus n'y figurent pas.
+Index(
+    "ix_classifications_queue",
+    Classification.urgency_rank,
+    Classification.classified_at.desc(),
+    sqlite_where=Classification.resolved_at.is_(None),
+    postgresql_where=Classification.resolved_at.is_(None),
+)
+
+
+class ClassificationKeyword(Base):
+    """Mots-clés normalisés d'une classification (filtrage indexé, voir src/keywords.py)."""
+    __tablename__ = "classification_keywords"
+
+    keyword = Column(String(50), primary_key=True)
+    classification_id = Column(
+        Integer, ForeignKey("classifications.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+
+
+class KeywordDailyCount(Base):
+    """Occurrences d'un mot-clé par jour de classification, incrémentées à l'insertion."""
+    __tablename__ = "keyword_daily_counts"
+
+    day = Column(Date, primary_key=True)
+    keyword = Column(String(50), primary_key=True)
+    count = Column(Integer, default=0, server_default="0", nullable=False)
+
+
+class SessionSignature(Base):
+    """Signature MinHash du texte client d'une session (voir src/similarity.py)."""
+    __tablename__ = "session_signatures"
+
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+
+
+class LSHBucket(Base):
+    """Index LSH : une ligne par bande de la signature, recherche par (band, bucket)."""
+    __tablename__ = "lsh_buckets"
+    __table_args__ = (Index("ix_lsh_buckets_session", "session_id"),)
+
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+
+
+class SchemaVersion(Base):
+    """Empreinte du schéma appliqué (voir configs.ensure_schema)."""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String(40), nullable=False)
+    applied_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
@@ -0,0 +1,49 @@
+"""Réponses JSON rapides (orjson) et compression HTTP"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable, Optional
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:  # compression brotli optionnelle
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # pragma: no cover - dépend de l'environnement
+    BrotliMiddleware = None
+
+
+def fast_json(content: Any, response: Optional[Response] = None, status_code: int = 200) -> ORJSONResponse:
+    """
+    Sérialise directement avec orjson, sans validation Pydantic.
+    À réserver aux projections ORM de confiance (dicts déjà au format du schéma).
+    Les en-têtes posés sur la `response` injectée (ETag…) sont reportés.
+    """
+    headers = None
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
+
+
+class CompressionMiddleware:
+    """
+    Compression brotli (si `brotli_asgi` est installé) ou gzip au-delà de
+    `minimum_size` octets. Les chemins `exclude_paths` (flux SSE) ne sont pas
+    compressés : la compression retarderait l'envoi des événements.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, exclude_paths: Iterable[str] = ()):
+        self.app = app
+        self.exclude_paths = tuple(exclude_paths)
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=6)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and not scope["path"].startswith(self.exclude_paths):
+            await self.compressed(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
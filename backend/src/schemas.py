@@ -65,6 +65,9 @@ class SessionResponse(BaseModel):
 class MessageCreate(BaseModel):
     content: str = Field(..., example="Bonjour, j'aimerais avoir des informations sur un crédit.")
     role: Literal["user", "assistant"] = Field(default="user", example="user")
+    client_message_id: Optional[str] = Field(
+        default=None, max_length=64, example="7f9c2e4a-1b3d-4c5e-9f10-2a6b8c0d4e21"
+    )
 
 
 class MessageResponse(BaseModel):
@@ -97,6 +100,59 @@ class ClassificationResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class SimilarSession(BaseModel):
+    """Session proche (similarité de Jaccard estimée par MinHash) et sa classification éventuelle."""
+    session_id: int
+    similarity: float
+    title: Optional[str]
+    created_at: datetime
+    category: Optional[str] = None
+    urgency: Optional[str] = None
+    summary: Optional[str] = None
+    keywords: Optional[List[str]] = None
+
+
+class KeywordCount(BaseModel):
+    keyword: str
+    count: int
+
+
+class QueueItem(BaseModel):
+    """Ticket de la file des agents (voir src/work_queue.py)."""
+    id: int
+    session_id: int
+    category: str
+    urgency: str
+    summary: Optional[str]
+    classified_at: datetime
+    claimed_by: Optional[int] = None
+    lease_expires_at: Optional[datetime] = None
+    resolved_at: Optional[datetime] = None
+
+
+# ---------- Import ---------- #
+class ImportMessage(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str
+    timestamp: Optional[datetime] = None
+
+
+class ImportSession(BaseModel):
+    """Une ligne NDJSON d'import : une session historique et ses messages."""
+    title: Optional[str] = None
+    created_at: Optional[datetime] = None
+    ended_at: Optional[datetime] = None
+    messages: List[ImportMessage] = Field(default_factory=list)
+
+
+class ImportResult(BaseModel):
+    sessions: int
+    messages: int
+    failed: int = 0
+    errors: List[str] = []
+    classification_queued: int = 0
+
+
 # ---------- Nested ---------- #
 class SessionWithMessages(SessionResponse):
     messages: List[MessageResponse] = []
@@ -130,7 +186,22 @@ class UrgencyStats(BaseModel):
     count: int
 
 
+class ConversationStats(BaseModel):
+    message_count: int
+    user_message_count: int
+    assistant_message_count: int
+    total_chars: int
+    response_count: int
+    avg_response_seconds: float
+    last_activity_at: Optional[datetime] = None
+
+
+class ConversationRollup(ConversationStats):
+    session_count: int
+
+
 class DashboardStatsResponse(BaseModel):
     session_stats: SessionStats
     category_stats: List[CategoryStats]
     urgency_stats: List[UrgencyStats]
+    conversation_stats: Optional[ConversationRollup] = None
@@ -2,14 +2,19 @@
 
 from __future__ import annotations
 
+import os
+import time
 from datetime import datetime, timezone
 from typing import Dict, List, Optional
 
 import requests
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from .models import (
     Session as SessionModel,
+    ArchivedMessage,
     Message,
     Classification,
     RoleEnum,
@@ -18,15 +23,104 @@ from .schemas import (
     SessionCreate,
     MessageCreate,
 )
-from .utils import generate_session_title, keywords_to_json
+from .archive import all_messages
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .events import CLASSIFICATION_CREATED, MESSAGE_CREATED, event_bus
+from .idempotency import RequestInProgress, in_flight
+from .shared_state import shared_state
+from .similarity import index_text, reusable_classification
+from .stats import record_messages
+from .keywords import decode_keywords, index_keywords, keyword_filter, normalize_keywords
+from .utils import generate_session_title
 
 # URL du micro-service LLM
-LLM_API_URL = "http://localhost:8001"
+LLM_API_URL = os.getenv("LLM_API_URL", "http://localhost:8001")
+# (connexion, lecture) : un service arrêté est détecté en quelques secondes
+LLM_TIMEOUT = (3, 30)
+# Attente maximale d'un renvoi (même clé d'idempotence) sur le premier envoi en cours
+IDEMPOTENCY_WAIT = sum(LLM_TIMEOUT) + 5
+# Historique des sessions actives gardé dans l'état partagé (0 : désactivé)
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "900"))
+
+
+
+def _llm_breaker(endpoint: str, slow_call_threshold: Optional[float]) -> CircuitBreaker:
+    return CircuitBreaker(
+        f"llm_api{endpoint}",
+        failure_rate_threshold=float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5")),
+        slow_call_threshold=slow_call_threshold,
+        min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "5")),
+        open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30")),
+    )
+
+
+# Un disjoncteur par endpoint, partagé par toutes les requêtes du processus :
+# un arriéré de classifications ne coupe pas les conversations. La durée
+# d'une classification comprend l'attente volontaire dans la file d'api_llm,
+# elle n'est donc pas comptée comme lenteur.
+llm_chat_breaker = _llm_breaker("/chats", float(os.getenv("LLM_BREAKER_SLOW_CALL", "10")))
+llm_classify_breaker = _llm_breaker("/classify", None)
+LLM_BREAKERS = (llm_chat_breaker, llm_classify_breaker)
+
+
+def _llm_failure(resp: requests.Response) -> bool:
+    """
+    Échec pour le disjoncteur : erreur serveur (api_llm répond 502 si le
+    modèle échoue), ou réponse 200 portant une erreur (versions antérieures
+    d'api_llm, qui renvoyaient le message d'erreur comme contenu). Un 429 ou
+    503 avec Retry-After est un délestage volontaire d'api_llm, pas une panne.
+    """
+    if resp.status_code in (429, 503) and "Retry-After" in resp.headers:
+        return False
+    if resp.status_code >= 500:
+        return True
+    if resp.status_code != 200:
+        return False
+    try:
+        data = resp.json()
+    except ValueError:
+        return True
+    return not isinstance(data, dict) or bool(data.get("error"))
+
+
+def message_to_dict(message: Message) -> Dict:
+    return {
+        "id": message.id,
+        "session_id": message.session_id,
+        "role": message.role.value,
+        "content": message.content,
+        "timestamp": message.timestamp,
+    }
+
+
+def classification_to_dict(c: Classification) -> Dict:
+    return {
+        "id": c.id,
+        "session_id": c.session_id,
+        "category": c.category,
+        "urgency": c.urgency,
+        "summary": c.summary,
+        "keywords": decode_keywords(c.keywords),
+        "classified_at": c.classified_at,
+        "created_at": c.session.created_at,
+    }
+
+
+def session_to_dict(session: SessionModel) -> Dict:
+    return {
+        "id": session.id,
+        "title": session.title,
+        "is_active": session.is_active,
+        "created_at": session.created_at,
+        "ended_at": session.ended_at,
+    }
 
 
 class SessionManager:
     def __init__(self, db: Session):
         self.db = db
+        # Dernier message utilisateur resté sans réponse (service IA indisponible)
+        self.assistant_unavailable = False
 
     def create_session(self, user_id: int, session_data: SessionCreate) -> SessionModel:
         new_session = SessionModel(user_id=user_id, title=session_data.title)
@@ -50,35 +144,121 @@ class SessionManager:
             .first()
         )
 
-    def add_message(self, session_id: int, message_data: MessageCreate) -> Message:
+    def add_message(
+        self, session_id: int, message_data: MessageCreate, client_message_id: Optional[str] = None
+    ) -> Message:
+        """
+        Enregistre un message (et la réponse du LLM pour un message utilisateur).
+        Avec `client_message_id`, un renvoi retourne le message déjà enregistré,
+        ou attend le premier envoi encore en cours, sans rappeler le LLM.
+        """
+        if not client_message_id:
+            return self._add_message(session_id, message_data)
+
+        key = (session_id, client_message_id)
+        while True:
+            existing = self._find_client_message(session_id, client_message_id, message_data.content)
+            if existing:
+                return self._replay(existing)
+            waiter = in_flight.begin(key, ttl=IDEMPOTENCY_WAIT)
+            if waiter is None:
+                break
+            # Premier envoi terminé (succès : on relit le résultat ; échec : on reprend la main)
+            if not waiter.wait(IDEMPOTENCY_WAIT):
+                raise RequestInProgress("Message en cours de traitement, réessayez plus tard.")
+
+        try:
+            return self._add_message(session_id, message_data, client_message_id)
+        except IntegrityError:
+            # Même clé validée entre-temps par un autre processus
+            self.db.rollback()
+            existing = self._find_client_message(session_id, client_message_id, message_data.content)
+            if existing:
+                return self._replay(existing)
+            raise
+        finally:
+            in_flight.end(key)
+
+    def _find_client_message(self, session_id: int, client_message_id: str, content: str) -> Optional[Message]:
+        message = (
+            self.db.query(Message)
+            .filter(Message.session_id == session_id, Message.client_message_id == client_message_id)
+            .first()
+        )
+        if message is not None and message.content != content:
+            raise ValueError("Clé d'idempotence déjà utilisée pour un autre message.")
+        return message
+
+    def _replay(self, message: Message) -> Message:
+        """
+        Renvoi d'un message déjà enregistré : même statut que le premier envoi.
+        La réponse du modèle est enregistrée dans le même tour (seq suivant) ;
+        sans elle, le service IA était indisponible.
+        """
+        if message.role == RoleEnum.USER:
+            next_role = self.db.scalar(
+                select(Message.role).where(Message.session_id == message.session_id, Message.seq == message.seq + 1)
+            )
+            self.assistant_unavailable = next_role != RoleEnum.ASSISTANT
+        return message
+
+    def _add_message(
+        self, session_id: int, message_data: MessageCreate, client_message_id: Optional[str] = None
+    ) -> Message:
         session = self.db.query(SessionModel).filter(SessionModel.id == session_id).first()
         if not session or not session.is_active:
             raise ValueError("Session non trouvée ou inactive.")
+        known_count = session.message_count or 0
 
         # Ajout du message utilisateur
+        assistant_message = history = None
         user_message = Message(
             session_id=session_id,
             role=RoleEnum(message_data.role),
             content=message_data.content,
+            client_message_id=client_message_id,
         )
         self.db.add(user_message)
+        turn = [(user_message.role, message_data.content)]
+        response_seconds = None
 
         if message_data.role == "user":
-            history = self._get_conversation_history(session_id)
+            history = self._get_conversation_history(session_id, known_count)
+            started = time.monotonic()
             assistant_content = self._call_llm_api(message_data.content, history)
 
-            assistant_message = Message(
-                session_id=session_id,
-                role=RoleEnum.ASSISTANT,
-                content=assistant_content,
-            )
-            self.db.add(assistant_message)
+            # Pas de réponse du modèle : rien n'est enregistré (le texte de
+            # repli ne doit pas revenir dans l'historique des tours suivants)
+            self.assistant_unavailable = assistant_content is None
+            if assistant_content is not None:
+                assistant_message = Message(
+                    session_id=session_id,
+                    role=RoleEnum.ASSISTANT,
+                    content=assistant_content,
+                )
+                self.db.add(assistant_message)
+                turn.append((RoleEnum.ASSISTANT, assistant_content))
+                response_seconds = time.monotonic() - started
 
             if not session.title or session.title == "Nouvelle conversation":
                 session.title = generate_session_title(message_data.content)
 
+        seqs = record_messages(self.db, session, turn, datetime.now(timezone.utc), response_seconds)
+        if message_data.role == "user":
+            # Signature MinHash de la session (sessions similaires, src/similarity.py)
+            index_text(self.db, session_id, message_data.content)
+        for message, seq in zip((user_message, assistant_message), seqs):
+            message.seq = seq
         self.db.commit()
         self.db.refresh(user_message)
+        for message in (user_message, assistant_message):
+            if message is not None:
+                event_bus.publish(MESSAGE_CREATED, session.user_id, session_id, message_to_dict(message))
+        if history is not None and seqs.start == known_count + 1:
+            # Aucun message concurrent : l'historique suivant se déduit sans relire la base
+            self._cache_history(session_id, history + [
+                self._history_entry(message) for message in (user_message, assistant_message) if message is not None
+            ], seqs.stop - 1)
         return user_message
 
     def end_session(self, session_id: int, user_id: int) -> bool:
@@ -99,102 +279,189 @@ class SessionManager:
     def classify_session(self, session_id: int) -> Optional[Classification]:
         return self._classify_session(session_id)
 
-    def get_all_classifications(self) -> List[Dict]:
-        classifications = self.db.query(Classification).all()
+    def get_all_classifications(self, keyword: Optional[str] = None) -> List[Dict]:
+        # Projection en une seule requête (pas de chargement paresseux de c.session)
+        query = (
+            self.db.query(
+                Classification.id,
+                Classification.session_id,
+                Classification.category,
+                Classification.urgency,
+                Classification.summary,
+                Classification.keywords,
+                Classification.classified_at,
+                SessionModel.created_at,
+            )
+            .join(SessionModel, SessionModel.id == Classification.session_id)
+        )
+        if keyword:
+            query = query.filter(keyword_filter(keyword))
+        rows = query.all()
         return [
             {
-                "id": c.id,
-                "session_id": c.session_id,
-                "category": c.category,
-                "urgency": c.urgency,
-                "summary": c.summary,
-                "keywords": c.keywords,
-                "classified_at": c.classified_at,
-                "created_at": c.session.created_at,
+                "id": r.id,
+                "session_id": r.session_id,
+                "category": r.category,
+                "urgency": r.urgency,
+                "summary": r.summary,
+                "keywords": decode_keywords(r.keywords),
+                "classified_at": r.classified_at,
+                "created_at": r.created_at,
             }
-            for c in classifications
+            for r in rows
         ]
 
+    def list_messages(
+        self, session_id: int, after_id: Optional[int] = None, archived: bool = False
+    ) -> List[Dict]:
+        """
+        Messages d'une session sous forme de dicts prêts à sérialiser.
+        `archived` : lire la table froide (session archivée par src/archive.py).
+        """
+        table = ArchivedMessage if archived else Message
+        query = self.db.query(
+            table.id, table.session_id, table.role, table.content, table.timestamp
+        ).filter(table.session_id == session_id)
+        if after_id is not None:
+            query = query.filter(table.id > after_id)
+        return [
+            {
+                "id": r.id,
+                "session_id": r.session_id,
+                "role": r.role.value,
+                "content": r.content,
+                "timestamp": r.timestamp,
+            }
+            for r in query.order_by(table.seq, table.id)
+        ]
+
+    def get_session_detail(self, session: SessionModel) -> Dict:
+        messages = self.list_messages(session.id, archived=session.archived_at is not None)
+        return {**session_to_dict(session), "messages": messages}
+
     def get_active_sessions_count(self) -> int:
         return self.db.query(SessionModel).filter(SessionModel.is_active.is_(True)).count()
 
     def search_sessions(self, user_id: int, query: str) -> List[SessionModel]:
+        messages = all_messages()
+        matching = select(messages.c.session_id).where(messages.c.content.ilike(f"%{query}%"))
         return (
             self.db.query(SessionModel)
-            .join(Message)
-            .filter(SessionModel.user_id == user_id, Message.content.ilike(f"%{query}%"))
-            .distinct()
+            .filter(SessionModel.user_id == user_id, SessionModel.id.in_(matching))
+            .order_by(SessionModel.created_at.desc())
             .all()
         )
 
-    def _get_conversation_history(self, session_id: int) -> List[Dict]:
+    def _get_conversation_history(self, session_id: int, message_count: Optional[int] = None) -> List[Dict]:
+        """
+        Historique de la session. Avec `message_count` (compteur lu en base),
+        la copie de l'état partagé est servie si elle est à jour ; un autre
+        réplica qui a écrit entre-temps aura avancé le compteur.
+        """
+        key = f"history:{session_id}"
+        if message_count is not None and HISTORY_CACHE_TTL > 0:
+            cached = shared_state.get_json(key)
+            if cached is not None and cached["count"] == message_count:
+                return cached["history"]
+
         messages = (
             self.db.query(Message)
             .filter(Message.session_id == session_id)
-            .order_by(Message.timestamp)
+            .order_by(Message.seq, Message.id)
             .all()
         )
-        return [
-            {
-                "role": msg.role.value,
-                "content": msg.content,
-                "timestamp": msg.timestamp.isoformat(),
-            }
-            for msg in messages
-        ]
+        history = [self._history_entry(msg) for msg in messages]
+        if message_count is not None and len(history) == message_count:
+            self._cache_history(session_id, history, message_count)
+        return history
+
+    @staticmethod
+    def _history_entry(message: Message) -> Dict:
+        return {
+            "role": message.role.value,
+            "content": message.content,
+            "timestamp": message.timestamp.isoformat(),
+        }
+
+    @staticmethod
+    def _cache_history(session_id: int, history: List[Dict], message_count: int) -> None:
+        if HISTORY_CACHE_TTL > 0:
+            shared_state.set_json(
+                f"history:{session_id}", {"count": message_count, "history": history}, HISTORY_CACHE_TTL
+            )
 
-    def _call_llm_api(self, prompt: str, history: List[Dict]) -> str:
+    def _call_llm_api(self, prompt: str, history: List[Dict]) -> Optional[str]:
+        """Réponse du modèle ; None si le service IA a échoué ou est coupé par le disjoncteur."""
         try:
-            messages = [
-                {"role": "system", "content": (
-                    "Tu es SmartSupport, un assistant client virtuel intelligent. "
-                    "Tu dois être clair, courtois, professionnel et répondre en français. "
-                    "Si la question n’a pas de sens ou est hors sujet, réponds poliment que tu ne peux pas aider."
-                )},
-                *[
-                    {"role": m["role"], "content": m["content"]}
-                    for m in history
-                ],
-                {"role": "user", "content": prompt},
-            ]
+            # Tours précédents uniquement : le prompt système et le message
+            # courant sont assemblés par api_llm (src/prompt_builder.py).
+            messages = [{"role": m["role"], "content": m["content"]} for m in history]
 
-            resp = requests.post(
+            resp = llm_chat_breaker.call(
+                requests.post,
                 f"{LLM_API_URL}/chats",
                 json={"message": prompt, "conversation_history": messages},
-                timeout=30,
+                timeout=LLM_TIMEOUT,
+                is_failure=_llm_failure,
             )
-            if resp.status_code == 200:
-                data = resp.json()
-                return data.get("response") or "Réponse vide du service IA."
-            return "Je rencontre une difficulté technique. Veuillez réessayer plus tard."
+            if not _llm_failure(resp) and resp.status_code == 200:
+                return resp.json().get("response") or None
+            print(f"[LLM] Réponse en erreur : HTTP {resp.status_code}")
+        except CircuitOpenError:
+            pass
         except Exception as exc:
-            return f"Erreur de connexion au service IA : {str(exc)}"
+            print(f"[LLM] Erreur de connexion au service IA : {exc}")
+        return None
 
     def _classify_session(self, session_id: int) -> Optional[Classification]:
-        history = self._get_conversation_history(session_id)
+        session = self.db.get(SessionModel, session_id)
+        if session is not None and session.archived_at is not None:
+            # Reclassification d'une session archivée : messages dans la table froide
+            history = [
+                {"role": m["role"], "content": m["content"], "timestamp": m["timestamp"].isoformat()}
+                for m in self.list_messages(session_id, archived=True)
+            ]
+        else:
+            history = self._get_conversation_history(session_id)
         if not history:
             return None
 
         try:
-            resp = requests.post(
-                f"{LLM_API_URL}/classify",
-                json={"conversation_history": history},
-                timeout=30,
-            )
-            if resp.status_code != 200:
-                return None
+            # Session quasi identique déjà classée : sa classification sert, sans appel au LLM
+            data = reusable_classification(self.db, session_id)
+            if data is None:
+                resp = llm_classify_breaker.call(
+                    requests.post,
+                    f"{LLM_API_URL}/classify",
+                    json={"conversation_history": history},
+                    timeout=LLM_TIMEOUT,
+                    is_failure=_llm_failure,
+                )
+                if resp.status_code != 200:
+                    return None
+                data = resp.json().get("classification", {})
 
-            data = resp.json().get("classification", {})
             classification = Classification(
                 session_id=session_id,
-                category=data.get("category", "Support général"),
-                urgency=data.get("urgency", "Moyen"),
-                summary=data.get("summary", ""),
-                keywords=keywords_to_json(data.get("keywords", [])),
+                category=data.get("category") or "Support général",
+                urgency=data.get("urgency") or "Moyen",
+                summary=data.get("summary") or "",
+                keywords=decode_keywords(data.get("keywords")),
             )
             self.db.add(classification)
+            self.db.flush()
+            index_keywords(
+                self.db, classification.id, normalize_keywords(classification.keywords),
+                datetime.now(timezone.utc).date(),
+            )
             self.db.commit()
             self.db.refresh(classification)
+            event_bus.publish(
+                CLASSIFICATION_CREATED,
+                classification.session.user_id,
+                session_id,
+                classification_to_dict(classification),
+            )
             return classification
         except Exception as exc:
             print(f"[Classification] Erreur : {exc}")
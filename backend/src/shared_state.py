@@ -0,0 +1,241 @@
+"""
+État partagé entre les processus / réplicas du backend.
+
+Une seule interface (clé-valeur avec TTL, réservation atomique, pub/sub)
+pour tout ce qui ne doit pas rester local à un worker : cache des
+utilisateurs authentifiés, cache d'historique, clés d'idempotence en cours
+et diffusion des événements SSE. Implémentations, choisies par
+SHARED_STATE_URL :
+
+- (non défini)      MemoryStore : en mémoire du processus (un seul worker) ;
+- redis://…         RedisStore  : réseau, plusieurs machines (paquet `redis`) ;
+- sqlite:///chemin  SqliteStore : substitut local du précédent, plusieurs
+                    workers sur une même machine (fichier WAL, pub/sub par
+                    scrutation d'une table).
+
+Les valeurs sont des chaînes ; `get_json` / `set_json` pour les objets.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Handler = Callable[[str], None]
+
+
+def _guarded(channel: str, handler: Handler) -> Handler:
+    """Gestionnaire pour un thread d'écoute : une erreur est affichée sans arrêter le thread."""
+    def run(payload: str) -> None:
+        try:
+            handler(payload)
+        except Exception as exc:
+            print(f"[État partagé] Gestionnaire du canal {channel} en erreur : {exc!r}")
+
+    return run
+
+
+class _JSONMixin:
+    def get_json(self, key: str) -> Optional[Any]:
+        raw = self.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set(key, json.dumps(value, default=str), ttl)
+
+
+class MemoryStore(_JSONMixin):
+    """Implémentation par défaut, locale au processus (LRU + TTL)."""
+
+    def __init__(self, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._live(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Pose la clé seulement si elle est absente ; True si posée."""
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def publish(self, channel: str, payload: str) -> None:
+        with self._lock:
+            handlers = list(self._handlers[channel])
+        for handler in handlers:
+            handler(payload)
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        with self._lock:
+            self._handlers[channel].append(handler)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"backend": "memory", "keys": len(self._data)}
+
+
+class RedisStore(_JSONMixin):
+    """Redis (optionnel) : état commun à tous les réplicas. Nécessite le paquet `redis`."""
+
+    def __init__(self, url: str, prefix: str = "smart_support:"):
+        import redis  # dépendance optionnelle
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(self.client.set(self.prefix + key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def publish(self, channel: str, payload: str) -> None:
+        self.client.publish(self.prefix + channel, payload)
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        guarded = _guarded(channel, handler)
+        pubsub.subscribe(**{self.prefix + channel: lambda msg: guarded(msg["data"])})
+        pubsub.run_in_thread(sleep_time=0.5, daemon=True)
+
+    def snapshot(self) -> Dict:
+        return {"backend": "redis"}
+
+
+class SqliteStore(_JSONMixin):
+    """
+    Substitut local de Redis : fichier SQLite WAL partagé par les workers
+    d'une machine. Le pub/sub scrute une table d'événements (latence ≈ `poll`).
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL);
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, payload TEXT NOT NULL, created REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: str, poll: float = 0.2, retention: float = 60.0):
+        self.path = path
+        self.poll = poll
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._execute(
+            "INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+            (key, value, time.time() + ttl if ttl else None),
+        )
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        # Une seule instruction : atomique entre processus
+        cursor = self._execute(
+            "INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+            "WHERE kv.expires IS NOT NULL AND kv.expires <= ?",
+            (key, value, now + ttl if ttl else None, now),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key: str) -> None:
+        self._execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def publish(self, channel: str, payload: str) -> None:
+        now = time.time()
+        self._execute("INSERT INTO events (channel, payload, created) VALUES (?, ?, ?)", (channel, payload, now))
+        self._execute("DELETE FROM events WHERE created < ?", (now - self.retention,))
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        last = self._execute("SELECT coalesce(max(id), 0) FROM events").fetchone()[0]
+        threading.Thread(target=self._follow, args=(channel, _guarded(channel, handler), last), daemon=True).start()
+
+    def _follow(self, channel: str, handler: Handler, last: int) -> None:
+        conn = self._connect()  # connexion propre au thread de scrutation
+        while True:
+            try:
+                rows = conn.execute(
+                    "SELECT id, payload FROM events WHERE id > ? AND channel = ? ORDER BY id", (last, channel)
+                ).fetchall()
+            except sqlite3.Error as exc:  # base verrouillée : nouvel essai au tour suivant
+                print(f"[État partagé] Scrutation du canal {channel} en erreur : {exc!r}")
+                rows = []
+            for last, payload in rows:
+                handler(payload)
+            time.sleep(self.poll)
+
+    def snapshot(self) -> Dict:
+        keys = self._execute("SELECT count(*) FROM kv").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "keys": keys}
+
+
+def store_from_env(url: Optional[str] = None):
+    url = url or os.getenv("SHARED_STATE_URL", "")
+    if url.startswith(("redis://", "rediss://")):
+        return RedisStore(url)
+    if url.startswith("sqlite:///"):
+        return SqliteStore(url[len("sqlite:///"):])
+    return MemoryStore()
+
+
+shared_state = store_from_env()
@@ -0,0 +1,320 @@
+"""
+Détection des conversations quasi identiques (MinHash + LSH).
+
+Le texte client d'une session est découpé en 3-grammes de mots ; la
+signature MinHash (NUM_PERM minimums de hachages permutés) estime la
+similarité de Jaccard entre deux sessions. Elle est mise à jour à chaque
+message client : le minimum sur l'union des 3-grammes est le minimum des
+minimums, aucun texte antérieur n'est relu.
+
+L'index LSH découpe la signature en BANDS bandes de ROWS valeurs ; deux
+sessions sont candidates si au moins une bande est identique (une ligne
+`lsh_buckets` par bande, recherche par clé primaire). Avec 16 × 4, une paire
+à 0,8 de similarité est trouvée presque toujours, une paire à 0,3 rarement.
+Seuls les candidats sont comparés : la recherche ne parcourt pas les sessions.
+
+Reconstruction de l'index depuis backend/ :
+    python -m src.similarity backfill
+    python -m src.similarity similar 42
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select, tuple_, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .keywords import decode_keywords
+from .models import (
+    ArchivedMessage,
+    Classification,
+    LSHBucket,
+    Message,
+    RoleEnum,
+    Session as SessionModel,
+    SessionSignature,
+)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Similarité estimée minimale des sessions retournées
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.5"))
+# Réutilisation de la classification du plus proche voisin au-delà de ce seuil (0 : désactivée)
+SIMILAR_CLASSIFICATION_REUSE = float(os.getenv("SIMILAR_CLASSIFICATION_REUSE", "0"))
+MAX_CANDIDATES = 200
+INDEX_ATTEMPTS = 3
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)  # graine fixe : signatures stables entre processus et redémarrages
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_PACK = struct.Struct(f"<{NUM_PERM}Q")
+_TOKEN = re.compile(r"\w+")
+
+
+# ---------- Signatures ---------- #
+def shingles(text: str) -> Set[int]:
+    """Empreintes 64 bits des 3-grammes de mots (le texte entier s'il est plus court)."""
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) <= SHINGLE_SIZE:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+    return {int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big") for g in grams}
+
+
+def minhash(hashes: Iterable[int], signature: Optional[Sequence[int]] = None) -> List[int]:
+    """Signature de `hashes`, combinée (minimum) avec une signature existante."""
+    hashes = list(hashes)
+    result = list(signature) if signature is not None else [_PRIME] * NUM_PERM
+    if not hashes:
+        return result
+    for i, (a, b) in enumerate(_PERMUTATIONS):
+        value = min((a * h + b) % _PRIME for h in hashes)
+        if value < result[i]:
+            result[i] = value
+    return result
+
+
+def band_keys(signature: Sequence[int]) -> List[Tuple[int, int]]:
+    """(bande, empreinte de la bande) ; entier positif sur 56 bits (BIGINT signé)."""
+    keys = []
+    for band in range(BANDS):
+        chunk = struct.pack(f"<{ROWS}Q", *signature[band * ROWS:(band + 1) * ROWS])
+        keys.append((band, int.from_bytes(hashlib.blake2b(chunk, digest_size=7).digest(), "big")))
+    return keys
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimation de la similarité de Jaccard : part des minimums égaux."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def pack(signature: Sequence[int]) -> bytes:
+    return _PACK.pack(*signature)
+
+
+def unpack(data: bytes) -> List[int]:
+    return list(_PACK.unpack(data))
+
+
+# ---------- Index ---------- #
+def load_signature(db: Session, session_id: int) -> Optional[List[int]]:
+    data = db.execute(
+        select(SessionSignature.signature).where(SessionSignature.session_id == session_id)
+    ).scalar()
+    return unpack(data) if data is not None else None
+
+
+def index_text(db: Session, session_id: int, text: str) -> None:
+    """
+    Ajoute un message client à la signature de sa session et met à jour les
+    seules bandes LSH modifiées ; à appeler dans la transaction du message.
+
+    Deux messages simultanés de la même session partent de la même signature :
+    l'écriture est conditionnelle (signature inchangée depuis la lecture,
+    ou première insertion) et le perdant recommence depuis la signature du
+    gagnant. L'index n'étant qu'une aide, le message est enregistré même si
+    les tentatives s'épuisent (voir `backfill`).
+    """
+    hashes = shingles(text)
+    if not hashes:
+        return
+    for _ in range(INDEX_ATTEMPTS):
+        previous = load_signature(db, session_id)
+        signature = minhash(hashes, previous)
+        if signature == previous:
+            return
+        try:
+            with db.begin_nested():
+                if _store_signature(db, session_id, previous, signature):
+                    return
+        except IntegrityError:
+            continue  # première signature insérée entre-temps par un autre message
+    print(f"[similarity] signature de la session {session_id} non mise à jour (écritures concurrentes)")
+
+
+def _store_signature(db: Session, session_id: int, previous: Optional[List[int]], signature: List[int]) -> bool:
+    """Remplace `previous` par `signature` ; False si elle a changé depuis la lecture."""
+    if previous is None:
+        db.execute(insert(SessionSignature).values(session_id=session_id, signature=pack(signature)))
+        changed = band_keys(signature)
+    else:
+        result = db.execute(
+            update(SessionSignature)
+            .where(SessionSignature.session_id == session_id, SessionSignature.signature == pack(previous))
+            .values(signature=pack(signature))
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        changed = [new for old, new in zip(band_keys(previous), band_keys(signature)) if old != new]
+        db.execute(
+            delete(LSHBucket).where(
+                LSHBucket.session_id == session_id, LSHBucket.band.in_([band for band, _ in changed])
+            )
+        )
+    db.execute(
+        insert(LSHBucket),
+        [{"band": band, "bucket": bucket, "session_id": session_id} for band, bucket in changed],
+    )
+    return True
+
+
+def index_sessions(db: Session, texts: Dict[int, List[str]]) -> int:
+    """Indexe des sessions qui n'ont pas encore de signature (import, reconstruction)."""
+    signatures, buckets = [], []
+    for session_id, parts in texts.items():
+        hashes = set()
+        for part in parts:
+            hashes |= shingles(part)
+        if not hashes:
+            continue
+        signature = minhash(hashes)
+        signatures.append({"session_id": session_id, "signature": pack(signature)})
+        buckets.extend(
+            {"band": band, "bucket": bucket, "session_id": session_id} for band, bucket in band_keys(signature)
+        )
+    if signatures:
+        db.execute(insert(SessionSignature), signatures)
+        db.execute(insert(LSHBucket), buckets)
+    return len(signatures)
+
+
+# ---------- Recherche ---------- #
+def find_similar(
+    db: Session,
+    session_id: int,
+    limit: int = 5,
+    threshold: float = SIMILARITY_THRESHOLD,
+    classified_only: bool = False,
+) -> List[Dict]:
+    """Sessions les plus proches (similarité estimée ≥ `threshold`), avec leur classification."""
+    signature = load_signature(db, session_id)
+    if signature is None:
+        return []
+    # Candidats partageant le plus de bandes d'abord (les plus similaires),
+    # puis les plus récents : la limite écarte les moins prometteurs
+    candidates = db.execute(
+        select(LSHBucket.session_id)
+        .where(tuple_(LSHBucket.band, LSHBucket.bucket).in_(band_keys(signature)))
+        .where(LSHBucket.session_id != session_id)
+        .group_by(LSHBucket.session_id)
+        .order_by(func.count().desc(), LSHBucket.session_id.desc())
+        .limit(MAX_CANDIDATES)
+    ).scalars().all()
+    if not candidates:
+        return []
+
+    query = (
+        select(
+            SessionSignature.session_id,
+            SessionSignature.signature,
+            SessionModel.title,
+            SessionModel.created_at,
+            Classification.category,
+            Classification.urgency,
+            Classification.summary,
+            Classification.keywords,
+        )
+        .join(SessionModel, SessionModel.id == SessionSignature.session_id)
+        .outerjoin(Classification, Classification.session_id == SessionSignature.session_id)
+        .where(SessionSignature.session_id.in_(candidates))
+    )
+    if classified_only:
+        query = query.where(Classification.id.is_not(None))
+
+    scored = []
+    for row in db.execute(query):
+        score = similarity(signature, unpack(row.signature))
+        if score >= threshold:
+            scored.append({
+                "session_id": row.session_id,
+                "similarity": score,
+                "title": row.title,
+                "created_at": row.created_at,
+                "category": row.category,
+                "urgency": row.urgency,
+                "summary": row.summary,
+                "keywords": decode_keywords(row.keywords) if row.category else None,
+            })
+    scored.sort(key=lambda item: (-item["similarity"], -item["session_id"]))
+    return scored[:limit]
+
+
+def reusable_classification(db: Session, session_id: int) -> Optional[Dict]:
+    """
+    Classification du plus proche voisin déjà classé, si la réutilisation est
+    activée et la similarité suffisante : l'appel au LLM peut être évité.
+    """
+    if SIMILAR_CLASSIFICATION_REUSE <= 0:
+        return None
+    neighbours = find_similar(db, session_id, limit=1, threshold=SIMILAR_CLASSIFICATION_REUSE, classified_only=True)
+    return neighbours[0] if neighbours else None
+
+
+# ---------- Reconstruction ---------- #
+def backfill(db: Session, batch_size: int = 500) -> int:
+    """Recalcule toutes les signatures depuis les messages clients (tables chaude et froide)."""
+    db.execute(delete(LSHBucket))
+    db.execute(delete(SessionSignature))
+    messages = union_all(
+        *(
+            select(t.session_id, t.seq, t.id, t.content).where(t.role == RoleEnum.USER)
+            for t in (Message, ArchivedMessage)
+        )
+    ).subquery()
+    indexed, last_id = 0, 0
+    while True:
+        session_ids = db.execute(
+            select(SessionModel.id).where(SessionModel.id > last_id).order_by(SessionModel.id).limit(batch_size)
+        ).scalars().all()
+        if not session_ids:
+            break
+        texts: Dict[int, List[str]] = {sid: [] for sid in session_ids}
+        rows = db.execute(
+            select(messages.c.session_id, messages.c.content)
+            .where(messages.c.session_id.in_(session_ids))
+            .order_by(messages.c.session_id, messages.c.seq, messages.c.id)
+        )
+        for sid, content in rows:
+            texts[sid].append(content)
+        indexed += index_sessions(db, texts)
+        last_id = session_ids[-1]
+    db.commit()
+    return indexed
+
+
+def main(argv: List[str] = None) -> None:
+    from configs import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Sessions similaires (MinHash / LSH)")
+    parser.add_argument("command", choices=["backfill", "similar"])
+    parser.add_argument("session_id", type=int, nargs="?")
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            print(f"{backfill(db)} sessions indexées")
+        elif args.session_id is None:
+            parser.error("session_id requis")
+        else:
+            for item in find_similar(db, args.session_id, args.limit):
+                print(f"{item['similarity']:.2f}  #{item['session_id']}  {item['title']}  {item['category'] or '-'}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
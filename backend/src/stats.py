@@ -0,0 +1,178 @@
+"""
+Statistiques de conversation incrémentales.
+
+Les compteurs vivent sur `Session` et sont mis à jour dans la même
+transaction que chaque insertion de message : les agrégats par
+utilisateur et globaux se calculent sur la table `sessions`, sans
+jamais parcourir les messages.
+
+Recalcul complet (après import ou migration) depuis backend/ :
+    python -m src.stats backfill
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select, union_all, update
+from sqlalchemy.orm import Session
+
+from .models import ArchivedMessage, Message, RoleEnum, Session as SessionModel
+
+COUNTERS = (
+    "message_count",
+    "user_message_count",
+    "assistant_message_count",
+    "total_chars",
+    "response_time_sum",
+    "response_time_count",
+)
+
+
+def record_messages(
+    db: Session,
+    session: SessionModel,
+    messages: List[Tuple[RoleEnum, str]],
+    at: datetime,
+    response_seconds: Optional[float] = None,
+) -> range:
+    """
+    Incrémente les compteurs de la session pour les messages d'une même
+    transaction (à appeler une seule fois, juste avant le commit).
+
+    Un seul UPDATE … SET col = col + n … RETURNING : pas de mise à jour
+    perdue en cas d'écritures concurrentes, et le nouveau `message_count`
+    fournit les numéros de séquence (`Message.seq`) des messages insérés.
+    """
+    users = sum(1 for role, _ in messages if role == RoleEnum.USER)
+    values = {
+        "message_count": SessionModel.message_count + len(messages),
+        "user_message_count": SessionModel.user_message_count + users,
+        "assistant_message_count": SessionModel.assistant_message_count + (len(messages) - users),
+        "total_chars": SessionModel.total_chars + sum(len(content or "") for _, content in messages),
+        "last_activity_at": at,
+    }
+    if response_seconds is not None:
+        values["response_time_sum"] = SessionModel.response_time_sum + response_seconds
+        values["response_time_count"] = SessionModel.response_time_count + 1
+
+    new_count = db.execute(
+        update(SessionModel)
+        .where(SessionModel.id == session.id)
+        .values(**values)
+        .returning(SessionModel.message_count)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    db.expire(session, list(values))
+    return range(new_count - len(messages) + 1, new_count + 1)
+
+
+def _format(row: Dict) -> Dict:
+    count = row.get("response_time_count") or 0
+    total = row.get("response_time_sum") or 0.0
+    return {
+        "message_count": row.get("message_count") or 0,
+        "user_message_count": row.get("user_message_count") or 0,
+        "assistant_message_count": row.get("assistant_message_count") or 0,
+        "total_chars": row.get("total_chars") or 0,
+        "response_count": count,
+        "avg_response_seconds": round(total / count, 3) if count else 0.0,
+        "last_activity_at": row.get("last_activity_at"),
+    }
+
+
+def session_stats(session: SessionModel) -> Dict:
+    return _format({name: getattr(session, name) for name in COUNTERS + ("last_activity_at",)})
+
+
+def rollup(db: Session, user_id: Optional[int] = None) -> Dict:
+    """Somme des compteurs de sessions (d'un utilisateur, ou globale)."""
+    stmt = select(
+        func.count(SessionModel.id).label("session_count"),
+        *(func.sum(getattr(SessionModel, name)).label(name) for name in COUNTERS),
+        func.max(SessionModel.last_activity_at).label("last_activity_at"),
+    )
+    if user_id is not None:
+        stmt = stmt.where(SessionModel.user_id == user_id)
+    row = dict(db.execute(stmt).mappings().one())
+    return {"session_count": row["session_count"], **_format(row)}
+
+
+def backfill(db: Session) -> int:
+    """
+    Recalcule les compteurs de messages depuis les tables chaude et froide.
+    Les temps de réponse historiques ne sont pas reconstruits (non mesurés).
+    """
+    messages = union_all(
+        *(select(t.session_id, t.role, t.content, t.timestamp) for t in (Message, ArchivedMessage))
+    ).subquery()
+    rows = db.execute(
+        select(
+            messages.c.session_id,
+            func.count().label("message_count"),
+            func.sum(func.length(messages.c.content)).label("total_chars"),
+            func.sum(case((messages.c.role == RoleEnum.USER, 1), else_=0)).label("users"),
+            func.max(messages.c.timestamp).label("last_activity_at"),
+        ).group_by(messages.c.session_id)
+    ).all()
+    for row in rows:
+        db.execute(
+            update(SessionModel)
+            .where(SessionModel.id == row.session_id)
+            .values(
+                message_count=row.message_count,
+                user_message_count=row.users or 0,
+                assistant_message_count=row.message_count - (row.users or 0),
+                total_chars=row.total_chars or 0,
+                last_activity_at=row.last_activity_at,
+            )
+        )
+    _backfill_seq(db)
+    db.commit()
+    return len(rows)
+
+
+def backfill_seq(db: Session) -> None:
+    """Numérote les messages sans seq (migration de la colonne)."""
+    _backfill_seq(db)
+    db.commit()
+
+
+def _backfill_seq(db: Session) -> None:
+    """Numérote (seq) les messages antérieurs à la colonne, par session et par ordre d'arrivée."""
+    for table in (Message, ArchivedMessage):
+        ranked = select(
+            table.id,
+            func.row_number().over(
+                partition_by=table.session_id, order_by=(table.timestamp, table.id)
+            ).label("rank"),
+        ).subquery()
+        # Deux passes : valeurs négatives puis positives, pour ne pas heurter
+        # l'index unique (session_id, seq) pendant la renumérotation.
+        for sign in (-1, 1):
+            db.execute(
+                update(table)
+                .values(seq=select(ranked.c.rank * sign).where(ranked.c.id == table.id).scalar_subquery())
+                .execution_options(synchronize_session=False)
+            )
+
+
+def main(argv: List[str] = None) -> None:
+    from configs import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Statistiques de conversation")
+    parser.add_argument("command", choices=["backfill"])
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            print(f"{backfill(db)} sessions recalculées")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,28 +5,36 @@ from __future__ import annotations
 import json
 import os
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Union
 
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.orm import ORMExecuteState, Session
 
 from .models import User
+from .shared_state import shared_state
 
 # ---------- Security settings ---------- #
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.getenv("SMART_SUPPORT_SECRET_KEY", "CHANGE_ME_IN_PRODUCTION")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
 # ---------- Password helpers ---------- #
+@lru_cache(maxsize=1)
+def pwd_context():
+    """Contexte passlib/bcrypt, importé au premier usage (démarrage plus rapide)."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 
 # ---------- JWT helpers ---------- #
@@ -38,10 +46,14 @@ def create_access_token(
         expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     to_encode.update({"exp": expire})
+    from jose import jwt  # import différé : python-jose charge ses backends crypto
+
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
 def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    from jose import JWTError, jwt
+
     try:
         return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
@@ -49,11 +61,6 @@ def verify_token(token: str) -> Optional[Dict[str, Any]]:
 
 
 # ---------- Misc helpers ---------- #
-def keywords_to_json(keywords: Union[List[str], None]) -> str:
-    """Convertit une liste de mots-clés en JSON (texte)."""
-    return json.dumps(keywords or [])
-
-
 def json_to_keywords(json_str: Union[str, None]) -> List[str]:
     try:
         return json.loads(json_str or "[]")
@@ -111,6 +118,59 @@ def get_stats_by_urgency(classifications: List[Dict]) -> Dict[str, int]:
     return stats
 
 
+# ---------- Cache des utilisateurs authentifiés ---------- #
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_FIELDS = ("id", "username", "email", "is_agent")
+
+
+def cached_principal(db: Session, user_id: int) -> Optional[User]:
+    """
+    Utilisateur du token, lu dans l'état partagé plutôt qu'en base à chaque
+    requête. L'objet retourné est détaché (sans hash du mot de passe) :
+    suffisant pour les contrôles d'accès, pas pour une modification.
+    """
+    key = f"principal:{user_id}"
+    fields = shared_state.get_json(key) if PRINCIPAL_CACHE_TTL > 0 else None
+    if fields is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None or PRINCIPAL_CACHE_TTL <= 0:
+            return user
+        fields = {name: getattr(user, name) for name in PRINCIPAL_FIELDS}
+        fields["created_at"] = user.created_at.isoformat()
+        shared_state.set_json(key, fields, PRINCIPAL_CACHE_TTL)
+    return User(**{**fields, "created_at": datetime.fromisoformat(fields["created_at"])})
+
+
+def forget_principal(user_id: int) -> None:
+    """Retire l'utilisateur du cache (rôle ou identité modifiés)."""
+    shared_state.delete(f"principal:{user_id}")
+
+
+# Toute modification d'un utilisateur par l'ORM (objet ou UPDATE/DELETE en
+# masse) retire ses entrées du cache au commit : un agent rétrogradé perd
+# ses droits à la requête suivante, pas après PRINCIPAL_CACHE_TTL.
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(db: Session, flush_context) -> None:
+    changed = db.info.setdefault("changed_users", set())
+    changed.update(obj.id for obj in db.dirty | db.deleted if isinstance(obj, User))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_changed_users(state: ORMExecuteState) -> None:
+    if not (state.is_update or state.is_delete) or state.bind_mapper is not User.__mapper__:
+        return
+    ids = select(User.id)
+    if state.statement.whereclause is not None:
+        ids = ids.where(state.statement.whereclause)
+    state.session.info.setdefault("changed_users", set()).update(state.session.execute(ids).scalars())
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_changed_users(db: Session) -> None:
+    for user_id in db.info.pop("changed_users", ()):
+        forget_principal(user_id)
+
+
 def is_agent(token: str, db: Session) -> bool:
     """
     Vérifie si le token appartient à un utilisateur agent.
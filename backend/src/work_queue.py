@@ -0,0 +1,192 @@
+"""
+File de traitement des agents : sessions classifiées non résolues, la plus
+urgente d'abord, puis la plus récente.
+
+La lecture parcourt l'index partiel `ix_classifications_queue` (urgence,
+date de classification ; tickets résolus exclus) et s'arrête après `limit`
+lignes : le coût ne dépend pas du nombre total de classifications.
+
+Un agent prend un ticket en charge pour une durée limitée (bail de
+QUEUE_LEASE_SECONDS). La prise en charge est un UPDATE conditionnel
+unique : si deux agents visent le même ticket, un seul obtient la ligne.
+Un bail expiré rend le ticket à nouveau disponible ; reprendre un ticket
+déjà détenu prolonge le bail.
+
+Rang d'urgence des classifications antérieures à la colonne (calculé par la
+migration quand elle ajoute la colonne ; à relancer à la main, depuis backend/) :
+    python -m src.work_queue backfill
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.orm import Session
+
+from .models import DEFAULT_URGENCY_RANK, URGENCY_RANKS, Classification
+
+QUEUE_LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", "300"))
+CLAIM_ATTEMPTS = 3
+
+QUEUE_COLUMNS = (
+    Classification.id,
+    Classification.session_id,
+    Classification.category,
+    Classification.urgency,
+    Classification.summary,
+    Classification.classified_at,
+    Classification.claimed_by,
+    Classification.lease_expires_at,
+)
+QUEUE_ORDER = (Classification.urgency_rank, Classification.classified_at.desc())
+
+
+class ClaimConflict(Exception):
+    """Le ticket est pris en charge par un autre agent (bail en cours)."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _available(now: datetime):
+    return or_(Classification.claimed_by.is_(None), Classification.lease_expires_at <= now)
+
+
+def list_queue(db: Session, limit: int = 20, include_claimed: bool = False) -> List[Dict]:
+    """Premiers tickets non résolus (disponibles seulement, sauf `include_claimed`)."""
+    query = select(*QUEUE_COLUMNS).where(Classification.resolved_at.is_(None))
+    if not include_claimed:
+        query = query.where(_available(_now()))
+    rows = db.execute(query.order_by(*QUEUE_ORDER).limit(limit)).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def claim_next(db: Session, agent_id: int) -> Optional[Dict]:
+    """Prend en charge le premier ticket disponible ; None si la file est vide."""
+    for _ in range(CLAIM_ATTEMPTS):
+        now = _now()
+        head = (
+            select(Classification.id)
+            .where(Classification.resolved_at.is_(None), _available(now))
+            .order_by(*QUEUE_ORDER)
+            .limit(1)
+            .scalar_subquery()
+        )
+        row = _claim(db, agent_id, now, Classification.id == head)
+        if row is not None:
+            return row
+        # Ticket pris entre la lecture et l'écriture par un autre agent : suivant
+        if not db.execute(select(head)).scalar():
+            return None
+    return None
+
+
+def claim(db: Session, session_id: int, agent_id: int) -> Optional[Dict]:
+    """
+    Prend en charge (ou prolonge) le ticket d'une session.
+    None si la session n'a pas de ticket ouvert ; ClaimConflict s'il est détenu.
+    """
+    now = _now()
+    row = _claim(db, agent_id, now, Classification.session_id == session_id)
+    if row is None:
+        _raise_if_held(db, session_id, agent_id)
+    return row
+
+
+def _claim(db: Session, agent_id: int, now: datetime, *criteria) -> Optional[Dict]:
+    result = db.execute(
+        update(Classification)
+        .where(*criteria, Classification.resolved_at.is_(None))
+        # Condition re-vérifiée par l'UPDATE lui-même : pas de double prise en charge
+        .where(or_(_available(now), Classification.claimed_by == agent_id))
+        .values(claimed_by=agent_id, lease_expires_at=now + timedelta(seconds=QUEUE_LEASE_SECONDS))
+        .returning(*QUEUE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).mappings().first()
+    db.commit()
+    return dict(result) if result is not None else None
+
+
+def release(db: Session, session_id: int, agent_id: int) -> bool:
+    """Rend un ticket à la file ; seul l'agent qui le détient peut le faire."""
+    result = db.execute(
+        update(Classification)
+        .where(
+            Classification.session_id == session_id,
+            Classification.claimed_by == agent_id,
+            Classification.resolved_at.is_(None),
+        )
+        .values(claimed_by=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def resolve(db: Session, session_id: int, agent_id: int) -> Optional[Dict]:
+    """Marque le ticket résolu (libre ou détenu par l'agent) et le retire de la file."""
+    now = _now()
+    result = db.execute(
+        update(Classification)
+        .where(
+            Classification.session_id == session_id,
+            Classification.resolved_at.is_(None),
+            or_(_available(now), Classification.claimed_by == agent_id),
+        )
+        .values(resolved_at=now, claimed_by=agent_id, lease_expires_at=None)
+        .returning(*QUEUE_COLUMNS, Classification.resolved_at)
+        .execution_options(synchronize_session=False)
+    ).mappings().first()
+    db.commit()
+    if result is None:
+        _raise_if_held(db, session_id, agent_id)
+        return None
+    return dict(result)
+
+
+def _raise_if_held(db: Session, session_id: int, agent_id: int) -> None:
+    holder = db.execute(
+        select(Classification.claimed_by).where(
+            Classification.session_id == session_id,
+            Classification.resolved_at.is_(None),
+            Classification.claimed_by != agent_id,
+            Classification.lease_expires_at > _now(),
+        )
+    ).scalar()
+    if holder is not None:
+        raise ClaimConflict(f"Ticket déjà pris en charge par l'agent {holder}.")
+
+
+def backfill(db: Session) -> int:
+    """Recalcule `urgency_rank` depuis `urgency` (lignes créées avant la colonne)."""
+    result = db.execute(
+        update(Classification)
+        .values(urgency_rank=case(URGENCY_RANKS, value=Classification.urgency, else_=DEFAULT_URGENCY_RANK))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def main(argv: List[str] = None) -> None:
+    from configs import SessionLocal
+
+    parser = argparse.ArgumentParser(description="File de traitement des agents")
+    parser.add_argument("command", choices=["backfill"])
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            print(f"{backfill(db)} classifications mises à jour")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
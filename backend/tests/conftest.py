@@ -0,0 +1,115 @@
+"""
+Tests du backend, depuis backend/ :
+    python -m pytest tests
+
+Base SQLite temporaire (une par exécution) ; le micro-service LLM est
+remplacé par `FakeLLM` (aucun appel réseau).
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DB_DIR = tempfile.mkdtemp(prefix="smart_support_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_DIR}/primary.db"
+os.environ["LLM_API_URL"] = "http://llm.invalid"
+os.environ.setdefault("SMART_SUPPORT_SECRET_KEY", "tests")
+for name in ("DATABASE_READ_URL", "SHARED_STATE_URL"):
+    os.environ.pop(name, None)
+
+_names = itertools.count(1)
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, payload, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+
+class FakeLLM:
+    """Remplace `requests.post` dans src.sessions : réponses de /chats et /classify."""
+
+    def __init__(self):
+        self.calls = []
+        self.chat_status = 200
+        self.chat_payload = {"response": "Réponse de test."}
+        self.classify_status = 200
+        self.classify_headers = {}
+        self.classification = {
+            "category": "Facturation", "urgency": "Moyen", "summary": "Résumé", "keywords": ["facture"],
+        }
+
+    def post(self, url, json=None, timeout=None):
+        self.calls.append((url.rsplit("/", 1)[-1], json))
+        if url.endswith("/chats"):
+            return FakeResponse(self.chat_status, self.chat_payload)
+        if self.classify_status != 200:
+            return FakeResponse(self.classify_status, {"detail": "File de classification saturée"}, self.classify_headers)
+        return FakeResponse(200, {"classification": self.classification, "source": "llm"})
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+    from configs import ensure_schema
+
+    ensure_schema()  # comme `python -m migrate` avant le démarrage
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(autouse=True)
+def llm(monkeypatch):
+    from src import sessions
+
+    fake = FakeLLM()
+    monkeypatch.setattr(sessions.requests, "post", fake.post)
+    for breaker in sessions.LLM_BREAKERS:
+        breaker._state = breaker.CLOSED
+        breaker._calls.clear()
+    return fake
+
+
+@pytest.fixture
+def db():
+    from configs import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def new_user(client, agent: bool = False):
+    """Crée un utilisateur ; retourne (en-têtes d'authentification, id)."""
+    from configs import SessionLocal
+    from src.models import User
+
+    name = f"user{next(_names):04d}"
+    user_id = client.post(
+        "/auth/register", json={"username": name, "email": f"{name}@example.com", "password": "secret1"}
+    ).json()["id"]
+    if agent:
+        with SessionLocal() as session:
+            session.query(User).filter(User.id == user_id).update({"is_agent": True})
+            session.commit()
+    token = client.post("/auth/login", json={"username": name, "password": "secret1"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}, user_id
+
+
+def new_session(client, headers) -> int:
+    return client.post("/sessions", json={}, headers=headers).json()["id"]
+
+
+def send(client, headers, session_id: int, content: str, **kwargs):
+    return client.post("/messages", params={"session_id": session_id}, json={"content": content}, headers=headers, **kwargs)
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from conftest import new_session, new_user, send
+
+from src import archive
+from src.models import ArchivedMessage, Message, Session as SessionModel
+from src.sessions import SessionManager
+
+
+def _archived_session(client, db, content):
+    """Session terminée il y a 100 jours puis archivée ; retourne (en-têtes, user_id, session_id)."""
+    headers, user_id = new_user(client)
+    sid = new_session(client, headers)
+    send(client, headers, sid, content)
+    db.query(SessionModel).filter(SessionModel.id == sid).update({
+        "is_active": False, "ended_at": datetime.now(timezone.utc) - timedelta(days=100),
+    })
+    db.commit()
+    archive.run(db, older_than_days=90)
+    assert db.query(Message).filter(Message.session_id == sid).count() == 0
+    assert db.query(ArchivedMessage).filter(ArchivedMessage.session_id == sid).count() == 2
+    return headers, user_id, sid
+
+
+def test_export_includes_archived_messages(client, db):
+    _, _, sid = _archived_session(client, db, "Mon colis archivé n'est jamais arrivé")
+    agent, _ = new_user(client, agent=True)
+    r = client.get("/export/messages", headers=agent)
+    assert r.status_code == 200
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    contents = [row["content"] for row in rows if row["session_id"] == sid]
+    assert "Mon colis archivé n'est jamais arrivé" in contents
+    assert len(contents) == 2
+
+
+def test_search_finds_archived_sessions(client, db):
+    _, user_id, sid = _archived_session(client, db, "Remboursement du billet zanzibar")
+    found = SessionManager(db).search_sessions(user_id, "zanzibar")
+    assert [s.id for s in found] == [sid]
+
+
+def test_reclassification_reads_archived_messages(client, db, llm):
+    headers, _, sid = _archived_session(client, db, "Ma facture archivée est fausse")
+    r = client.post(f"/sessions/{sid}/classify", headers=headers)
+    assert r.status_code == 200
+    endpoint, payload = llm.calls[-1]
+    assert endpoint == "classify"
+    assert payload["conversation_history"][0]["content"] == "Ma facture archivée est fausse"
+
+
+def test_message_export_reads_each_table_in_index_order(client, db):
+    from sqlalchemy import event
+
+    import configs
+
+    _, _, archived = _archived_session(client, db, "Ancienne réclamation")
+    headers, _ = new_user(client)
+    live = new_session(client, headers)
+    send(client, headers, live, "Nouvelle réclamation")
+    agent, _ = new_user(client, agent=True)
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(configs.engine, "before_cursor_execute", record)
+    try:
+        r = client.get("/export/messages", headers=agent)
+    finally:
+        event.remove(configs.engine, "before_cursor_execute", record)
+
+    sessions = [json.loads(line)["session_id"] for line in r.text.splitlines()]
+    assert sessions.index(archived) < sessions.index(live)  # table froide d'abord
+    exports = [s for s in statements if "FROM messages" in s or "FROM messages_archive" in s]
+    assert exports and not any("UNION" in s.upper() for s in exports)
@@ -0,0 +1,31 @@
+from conftest import new_user
+
+from src.models import User
+
+
+def test_demoted_agent_loses_access_immediately(client, db):
+    headers, user_id = new_user(client, agent=True)
+    assert client.get("/classifications", headers=headers).status_code == 200  # principal mis en cache
+
+    user = db.get(User, user_id)
+    user.is_agent = False
+    db.commit()
+    assert client.get("/classifications", headers=headers).status_code == 403
+
+
+def test_bulk_role_update_clears_the_cache(client, db):
+    headers, user_id = new_user(client)
+    assert client.get("/classifications", headers=headers).status_code == 403
+
+    db.query(User).filter(User.id == user_id).update({"is_agent": True})
+    db.commit()
+    assert client.get("/classifications", headers=headers).status_code == 200
+
+
+def test_identity_change_is_visible_in_me(client, db):
+    headers, user_id = new_user(client)
+    client.get("/auth/me", headers=headers)
+
+    db.query(User).filter(User.id == user_id).update({"email": "nouveau@example.com"})
+    db.commit()
+    assert client.get("/auth/me", headers=headers).json()["email"] == "nouveau@example.com"
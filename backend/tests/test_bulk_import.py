@@ -0,0 +1,94 @@
+import json
+
+from conftest import new_user
+
+from src.models import Classification, Message, Session as SessionModel, SessionSignature
+
+LINES = [
+    {
+        "title": "Colis perdu",
+        "created_at": "2023-05-02T09:14:00",
+        "messages": [
+            {"role": "user", "content": "Mon colis n'est jamais arrivé", "timestamp": "2023-05-02T09:14:00"},
+            {"role": "assistant", "content": "Je lance une enquête.", "timestamp": "2023-05-02T09:15:00"},
+            {"role": "user", "content": "Merci", "timestamp": "2023-05-02T09:20:00"},
+        ],
+    },
+    {"messages": [{"role": "user", "content": "Ma facture de mars est fausse"}]},
+]
+
+
+def _body(*extra: str) -> bytes:
+    return "\n".join([json.dumps(line) for line in LINES] + list(extra)).encode()
+
+
+def test_import_streams_batches_and_reports_bad_lines(client, db):
+    agent, _ = new_user(client, agent=True)
+    _, owner_id = new_user(client)
+    body = _body("{pas du json", json.dumps({"messages": [{"role": "robot", "content": "?"}]}))
+    # Corps envoyé en morceaux qui coupent les lignes
+    chunks = (body[i:i + 37] for i in range(0, len(body), 37))
+
+    r = client.post("/import/sessions", params={"user_id": owner_id}, content=chunks, headers=agent)
+    assert r.status_code == 201
+    result = r.json()
+    assert (result["sessions"], result["messages"], result["classification_queued"]) == (2, 4, 0)
+    assert [e.split(" : ")[0] for e in result["errors"]] == ["ligne 3", "ligne 4"]
+
+    sessions = db.query(SessionModel).filter(SessionModel.user_id == owner_id).order_by(SessionModel.id).all()
+    first = sessions[0]
+    assert first.title == "Colis perdu"
+    assert (first.message_count, first.user_message_count, first.assistant_message_count) == (3, 2, 1)
+    assert not first.is_active and first.ended_at is not None
+    seqs = db.query(Message.seq).filter(Message.session_id == first.id).order_by(Message.id).all()
+    assert [s for (s,) in seqs] == [1, 2, 3]
+    assert db.get(SessionSignature, first.id) is not None
+
+
+def test_import_with_classification(client, db, llm):
+    agent, agent_id = new_user(client, agent=True)
+    r = client.post("/import/sessions", params={"classify": True}, content=_body(), headers=agent)
+    assert r.status_code == 201 and r.json()["classification_queued"] == 2
+
+    ids = [s.id for s in db.query(SessionModel).filter(SessionModel.user_id == agent_id)]
+    assert db.query(Classification).filter(Classification.session_id.in_(ids)).count() == 2
+    assert not [endpoint for endpoint, _ in llm.calls if endpoint == "chats"]
+
+
+def test_import_is_reserved_to_agents(client):
+    headers, _ = new_user(client)
+    assert client.post("/import/sessions", content=_body(), headers=headers).status_code == 403
+
+
+def test_import_for_unknown_user_is_rejected(client):
+    agent, _ = new_user(client, agent=True)
+    r = client.post("/import/sessions", params={"user_id": 10 ** 6}, content=_body(), headers=agent)
+    assert r.status_code == 404
+
+
+def test_failed_batch_is_reported_and_earlier_batches_are_kept(client, db, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+
+    from src import bulk_import
+
+    agent, _ = new_user(client, agent=True)
+    _, owner_id = new_user(client)
+    real = bulk_import.index_sessions
+    calls = []
+
+    def locked_on_second_batch(db, texts):
+        calls.append(1)
+        if len(calls) == 2:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return real(db, texts)
+
+    monkeypatch.setattr(bulk_import, "BATCH_SIZE", 1)
+    monkeypatch.setattr(bulk_import, "index_sessions", locked_on_second_batch)
+    r = client.post("/import/sessions", params={"user_id": owner_id}, content=_body(), headers=agent)
+
+    assert r.status_code == 201
+    result = r.json()
+    assert (result["sessions"], result["messages"], result["failed"]) == (1, 3, 1)
+    assert result["errors"] == ["lignes 2-2 : lot annulé (OperationalError)"]
+    titles = [s.title for s in db.query(SessionModel).filter(SessionModel.user_id == owner_id)]
+    assert titles == ["Colis perdu"]
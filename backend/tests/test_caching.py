@@ -0,0 +1,30 @@
+import time
+
+from conftest import new_session, new_user, send
+
+
+def _conditional(client, headers, url, response):
+    return client.get(url, headers={**headers, "If-Modified-Since": response.headers["Last-Modified"]})
+
+
+def test_sessions_last_modified_follows_new_messages(client):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    first = client.get("/sessions", headers=headers)
+    assert _conditional(client, headers, "/sessions", first).status_code == 304
+
+    time.sleep(1.05)  # Last-Modified a une résolution d'une seconde
+    send(client, headers, sid, "Bonjour, ma commande n'est pas arrivée")
+    again = _conditional(client, headers, "/sessions", first)
+    assert again.status_code == 200
+    assert again.json()[0]["title"] != "Nouvelle conversation"
+    assert again.headers["Last-Modified"] != first.headers["Last-Modified"]
+
+
+def test_sessions_etag_changes_with_title(client):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    first = client.get("/sessions", headers=headers)
+    send(client, headers, sid, "Mon colis est bloqué")
+    r = client.get("/sessions", headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert r.status_code == 200
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+from conftest import new_session, new_user, send
+
+import main
+from src.events import CLASSIFICATION_CREATED, MESSAGE_CREATED, QUEUE_UPDATED, Subscription, event_bus
+
+
+def _event(event_type, user_id, session_id):
+    return {"type": event_type, "user_id": user_id, "session_id": session_id, "data": {}}
+
+
+def test_subscription_filters():
+    loop = asyncio.new_event_loop()
+    try:
+        client = Subscription(loop, user_id=1, is_agent=False)
+        agent = Subscription(loop, user_id=2, is_agent=True)
+        one_session = Subscription(loop, user_id=1, is_agent=False, session_id=10)
+    finally:
+        loop.close()
+
+    assert client.accepts(_event(MESSAGE_CREATED, 1, 10))
+    assert not client.accepts(_event(MESSAGE_CREATED, 3, 10))
+    assert not client.accepts(_event(CLASSIFICATION_CREATED, 3, 10))
+    # Agents : classifications et file de tous les clients, pas leurs messages
+    assert agent.accepts(_event(CLASSIFICATION_CREATED, 3, 10))
+    assert agent.accepts(_event(QUEUE_UPDATED, 3, 10))
+    assert not agent.accepts(_event(MESSAGE_CREATED, 3, 10))
+    assert one_session.accepts(_event(MESSAGE_CREATED, 1, 10))
+    assert not one_session.accepts(_event(MESSAGE_CREATED, 1, 11))
+
+
+def test_events_require_a_valid_token(client):
+    assert client.get("/events").status_code == 403
+    assert client.get("/events", headers={"Authorization": "Bearer invalide"}).status_code == 401
+
+
+def _read_stream(user, session_id, publish):
+    """Ouvre le flux de `user`, appelle `publish()` puis retourne le premier événement reçu."""
+    async def scenario():
+        response = await main.stream_events(session_id=session_id, current_user=user)
+        body = response.body_iterator
+        try:
+            assert await body.__anext__() == ": connected\n\n"
+            await asyncio.to_thread(publish)  # depuis un autre thread, comme un endpoint sync
+            return await asyncio.wait_for(body.__anext__(), timeout=2)
+        finally:
+            await body.aclose()
+
+    return asyncio.run(scenario())
+
+
+def test_stream_delivers_the_users_messages(client, db):
+    from src.models import User
+
+    headers, user_id = new_user(client)
+    sid = new_session(client, headers)
+    user = db.get(User, user_id)
+    subscribers = event_bus.snapshot()["subscribers"]
+
+    chunk = _read_stream(user, sid, lambda: send(client, headers, sid, "Bonjour"))
+    kind, data = chunk.splitlines()[:2]
+    event = json.loads(data.removeprefix("data: "))
+    assert kind == f"event: {MESSAGE_CREATED}"
+    assert (event["session_id"], event["data"]["content"]) == (sid, "Bonjour")
+    assert event_bus.snapshot()["subscribers"] == subscribers  # désabonné à la fermeture
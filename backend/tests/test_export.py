@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+from conftest import new_session, new_user, send
+
+from src.export import columns
+from src.models import Session as SessionModel
+
+
+def test_csv_export_of_classifications(client):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    send(client, headers, sid, "Ma facture est fausse")
+    client.post(f"/sessions/{sid}/classify", headers=headers)
+    agent, _ = new_user(client, agent=True)
+
+    r = client.get("/export/classifications", params={"format": "csv"}, headers=agent)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    assert r.headers["content-disposition"] == 'attachment; filename="classifications.csv"'
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert list(rows[0]) == columns("classifications")
+    row = next(row for row in rows if row["session_id"] == str(sid))
+    assert (row["category"], row["urgency"]) == ("Facturation", "Moyen")
+
+
+def test_export_time_window(client, db):
+    headers, user_id = new_user(client)
+    old, recent = new_session(client, headers), new_session(client, headers)
+    db.query(SessionModel).filter(SessionModel.id == old).update(
+        {"created_at": datetime(2020, 1, 1, tzinfo=timezone.utc)}
+    )
+    db.commit()
+    agent, _ = new_user(client, agent=True)
+
+    since = (datetime.now(timezone.utc) - timedelta(days=1)).replace(tzinfo=None).isoformat()
+    r = client.get("/export/sessions", params={"start": since}, headers=agent)
+    ids = {json.loads(line)["id"] for line in r.text.splitlines()}
+    assert recent in ids and old not in ids
+
+    r = client.get("/export/sessions", params={"end": "2020-06-01T00:00:00"}, headers=agent)
+    ids = {json.loads(line)["id"] for line in r.text.splitlines()}
+    assert old in ids and recent not in ids
+
+
+def test_export_is_reserved_to_agents(client):
+    headers, _ = new_user(client)
+    assert client.get("/export/sessions", headers=headers).status_code == 403
@@ -0,0 +1,78 @@
+from conftest import new_session, new_user, send
+
+
+def _keyed(headers, key):
+    return {**headers, "Idempotency-Key": key}
+
+
+def _chat_calls(llm):
+    return sum(1 for endpoint, _ in llm.calls if endpoint == "chats")
+
+
+def test_resent_message_is_replayed_without_a_second_llm_call(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+
+    first = send(client, _keyed(headers, "envoi-1"), sid, "Ma facture est fausse")
+    again = send(client, _keyed(headers, "envoi-1"), sid, "Ma facture est fausse")
+    assert first.status_code == again.status_code == 201
+    assert again.json()["id"] == first.json()["id"]
+    assert _chat_calls(llm) == 1
+    messages = client.get(f"/sessions/{sid}/messages", headers=headers).json()
+    assert [m["role"] for m in messages] == ["user", "assistant"]
+
+
+def test_client_message_id_in_the_body(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    body = {"content": "Où est mon colis ?", "client_message_id": "corps-1"}
+
+    ids = [
+        client.post("/messages", params={"session_id": sid}, json=body, headers=headers).json()["id"]
+        for _ in range(2)
+    ]
+    assert ids[0] == ids[1]
+    assert _chat_calls(llm) == 1
+
+
+def test_key_reused_for_another_message_is_rejected(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    send(client, _keyed(headers, "envoi-2"), sid, "Premier message")
+
+    r = send(client, _keyed(headers, "envoi-2"), sid, "Autre message")
+    assert r.status_code == 400
+    assert _chat_calls(llm) == 1
+
+
+def test_keys_are_scoped_to_the_session(client, llm):
+    headers, _ = new_user(client)
+    first, second = new_session(client, headers), new_session(client, headers)
+    a = send(client, _keyed(headers, "envoi-3"), first, "Bonjour")
+    b = send(client, _keyed(headers, "envoi-3"), second, "Bonjour")
+    assert a.json()["id"] != b.json()["id"]
+    assert _chat_calls(llm) == 2
+
+
+def test_replay_of_an_unanswered_turn_keeps_the_unavailable_status(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    llm.chat_status = 500
+    first = send(client, _keyed(headers, "envoi-4"), sid, "Ma facture est fausse")
+    assert first.headers["X-Assistant-Status"] == "unavailable"
+
+    llm.chat_status = 200
+    send(client, headers, sid, "Toujours là ?")  # tour suivant, répondu
+    again = send(client, _keyed(headers, "envoi-4"), sid, "Ma facture est fausse")
+    assert again.json()["id"] == first.json()["id"]
+    assert again.headers["X-Assistant-Status"] == "unavailable"
+    answered = send(client, headers, sid, "Merci")
+    assert "X-Assistant-Status" not in answered.headers
+
+
+def test_replay_of_an_answered_turn_has_no_status(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    send(client, _keyed(headers, "envoi-5"), sid, "Où est mon colis ?")
+    again = send(client, _keyed(headers, "envoi-5"), sid, "Où est mon colis ?")
+    assert "X-Assistant-Status" not in again.headers
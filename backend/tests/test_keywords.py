@@ -0,0 +1,85 @@
+import json
+from datetime import date, timedelta
+
+from conftest import new_session, new_user, send
+from sqlalchemy import select
+
+from src.keywords import MAX_KEYWORD_LENGTH, MAX_KEYWORDS, _add_counts, index_keywords, normalize_keywords, trending
+from src.models import Classification, ClassificationKeyword, KeywordDailyCount
+
+DAY = date(2001, 6, 30)  # hors des jours écrits par les autres tests
+
+
+def test_normalize_keywords():
+    legacy = json.dumps(json.dumps(["Facture", " facture ", "LIVRAISON   express"]))  # encodé deux fois
+    assert normalize_keywords(legacy) == ["facture", "livraison express"]
+    assert normalize_keywords(["Colis", "", "  "]) == ["colis"]
+    assert normalize_keywords("pas du json") == ["pas du json"]
+    assert normalize_keywords(None) == []
+    assert normalize_keywords(["x" * 80]) == ["x" * MAX_KEYWORD_LENGTH]
+    assert len(normalize_keywords([f"mot {i}" for i in range(20)])) == MAX_KEYWORDS
+
+
+def _count(db, day, keyword):
+    return db.scalar(select(KeywordDailyCount.count).where(
+        KeywordDailyCount.day == day, KeywordDailyCount.keyword == keyword,
+    ))
+
+
+def test_daily_counts_are_upserted(client, db):
+    _add_counts(db, {(DAY, "upsert-a"): 2, (DAY, "upsert-b"): 1})
+    _add_counts(db, {(DAY, "upsert-a"): 3})
+    db.commit()
+    assert (_count(db, DAY, "upsert-a"), _count(db, DAY, "upsert-b")) == (5, 1)
+
+
+def test_index_keywords_writes_the_index_and_the_counts(client, db):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    classification = Classification(session_id=sid, category="Livraison", urgency="Moyen", keywords=["Index-C"])
+    db.add(classification)
+    db.flush()
+    index_keywords(db, classification.id, normalize_keywords(classification.keywords), DAY)
+    db.commit()
+
+    indexed = db.scalars(select(ClassificationKeyword.keyword).where(
+        ClassificationKeyword.classification_id == classification.id
+    )).all()
+    assert indexed == ["index-c"]
+    assert _count(db, DAY, "index-c") == 1
+
+
+def test_trending_sums_the_window(client, db):
+    _add_counts(db, {
+        (DAY, "fenetre-a"): 1,
+        (DAY - timedelta(days=3), "fenetre-b"): 4,
+        (DAY - timedelta(days=10), "fenetre-a"): 9,  # hors d'une fenêtre de 7 jours
+    })
+    db.commit()
+
+    def window(days):
+        return [item for item in trending(db, days, limit=100, today=DAY) if item["keyword"].startswith("fenetre-")]
+
+    assert window(1) == [{"keyword": "fenetre-a", "count": 1}]
+    assert window(7) == [{"keyword": "fenetre-b", "count": 4}, {"keyword": "fenetre-a", "count": 1}]
+    assert window(30) == [{"keyword": "fenetre-a", "count": 10}, {"keyword": "fenetre-b", "count": 4}]
+
+
+def _classified(client, llm, keywords):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    send(client, headers, sid, "Bonjour")
+    llm.classification = {**llm.classification, "keywords": keywords}
+    assert client.post(f"/sessions/{sid}/classify", headers=headers).status_code == 200
+    return sid
+
+
+def test_classifications_filtered_by_keyword(client, llm):
+    wanted = _classified(client, llm, ["Remboursement  Express", "colis"])
+    _classified(client, llm, ["remboursement"])
+    agent, _ = new_user(client, agent=True)
+
+    r = client.get("/classifications", params={"keyword": "remboursement express"}, headers=agent)
+    assert r.status_code == 200
+    assert [c["session_id"] for c in r.json()] == [wanted]
+    assert r.json()[0]["keywords"] == ["Remboursement  Express", "colis"]  # liste d'origine
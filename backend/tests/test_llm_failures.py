@@ -0,0 +1,85 @@
+from conftest import new_session, new_user, send
+
+from src.sessions import llm_chat_breaker, llm_classify_breaker
+
+
+def test_model_failure_stores_no_assistant_reply(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    llm.chat_status, llm.chat_payload = 502, {"detail": "Erreur lors de la génération"}
+
+    r = send(client, headers, sid, "Bonjour, ma facture est fausse")
+    assert r.status_code == 201
+    assert r.headers["X-Assistant-Status"] == "unavailable"
+    messages = client.get(f"/sessions/{sid}/messages", headers=headers).json()
+    assert [m["role"] for m in messages] == ["user"]
+
+    # Le tour suivant ne renvoie pas de texte de repli dans l'historique
+    llm.chat_status, llm.chat_payload = 200, {"response": "Je regarde."}
+    r = send(client, headers, sid, "Vous êtes là ?")
+    assert "X-Assistant-Status" not in r.headers
+    _, payload = llm.calls[-1]
+    assert payload["conversation_history"] == [{"role": "user", "content": "Bonjour, ma facture est fausse"}]
+    messages = client.get(f"/sessions/{sid}/messages", headers=headers).json()
+    assert [m["role"] for m in messages] == ["user", "user", "assistant"]
+
+
+def test_error_payload_counts_as_breaker_failure(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    # api_llm antérieur : HTTP 200 avec le message d'erreur comme contenu
+    llm.chat_payload = {"response": "Erreur lors de la génération : timeout", "error": "timeout"}
+    for i in range(llm_chat_breaker.min_calls):
+        send(client, headers, sid, f"message {i}")
+    assert llm_chat_breaker.state == llm_chat_breaker.OPEN
+
+    calls = len(llm.calls)
+    r = send(client, headers, sid, "encore là ?")
+    assert r.headers["X-Assistant-Status"] == "unavailable"
+    assert len(llm.calls) == calls  # circuit ouvert : pas d'appel
+    roles = [m["role"] for m in client.get(f"/sessions/{sid}/messages", headers=headers).json()]
+    assert "assistant" not in roles
+
+
+def test_server_errors_open_the_breaker(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    llm.chat_status, llm.chat_payload = 502, {"detail": "modèle indisponible"}
+    for i in range(llm_chat_breaker.min_calls):
+        send(client, headers, sid, f"message {i}")
+    assert llm_chat_breaker.state == llm_chat_breaker.OPEN
+
+
+def test_shed_classifications_leave_the_chat_breaker_closed(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    send(client, headers, sid, "Ma facture est fausse")
+    llm.classify_status, llm.classify_headers = 503, {"Retry-After": "5"}
+    for _ in range(llm_classify_breaker.min_calls + 1):
+        client.post(f"/sessions/{sid}/classify", headers=headers)
+    assert llm_classify_breaker.state == llm_classify_breaker.CLOSED
+    assert llm_chat_breaker.state == llm_chat_breaker.CLOSED
+
+    r = send(client, headers, sid, "Toujours là ?")
+    assert "X-Assistant-Status" not in r.headers
+
+
+def test_classify_failures_do_not_open_the_chat_breaker(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    send(client, headers, sid, "Ma facture est fausse")
+    llm.classify_status = 502
+    for _ in range(llm_classify_breaker.min_calls):
+        client.post(f"/sessions/{sid}/classify", headers=headers)
+    assert llm_classify_breaker.state == llm_classify_breaker.OPEN
+    assert llm_chat_breaker.state == llm_chat_breaker.CLOSED
+
+
+def test_slow_classifications_are_not_failures():
+    # Appels de 60 s : attente volontaire dans la file d'api_llm
+    for _ in range(llm_classify_breaker.min_calls):
+        llm_classify_breaker._after_call(False, 60.0)
+    assert llm_classify_breaker.state == llm_classify_breaker.CLOSED
+    llm_chat_breaker._after_call(False, 60.0)
+    assert llm_chat_breaker.snapshot()["window_calls"] == 1
+    assert llm_chat_breaker.snapshot()["window_failure_rate"] == 1.0
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import configs
+from configs import Base, ensure_schema
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """
+    Base au schéma courant dont on retire ensuite des colonnes, pour simuler
+    un déploiement antérieur ; `drop(table, *colonnes)` les retire.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users (id, username, email, password_hash, is_agent, created_at) "
+            "VALUES (1, 'ancien', 'ancien@example.com', 'x', 0, :t)"
+        ), {"t": T0})
+        conn.execute(text("INSERT INTO sessions (id, user_id, is_active, created_at) VALUES (1, 1, 1, :t)"), {"t": T0})
+        for i, (role, content) in enumerate([("USER", "Bonjour"), ("ASSISTANT", "Bonjour !"), ("USER", "Ma facture")]):
+            conn.execute(text(
+                "INSERT INTO messages (session_id, role, content, timestamp) VALUES (1, :role, :content, :t)"
+            ), {"role": role, "content": content, "t": T0 + timedelta(minutes=i)})
+
+    def drop(table, *columns):
+        with engine.begin() as conn:
+            for index in Base.metadata.tables[table].indexes:
+                if set(columns) & {c.name for c in index.columns}:
+                    conn.execute(text(f"DROP INDEX {index.name}"))
+            for column in columns:
+                conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+    monkeypatch.setattr(configs, "engine", engine)
+    monkeypatch.setattr(configs, "SessionLocal", sessionmaker(bind=engine))
+    yield engine, drop
+    engine.dispose()
+
+
+def test_migration_backfills_session_counters(legacy_db):
+    engine, drop = legacy_db
+    drop("sessions", "message_count", "user_message_count", "assistant_message_count", "total_chars", "last_activity_at")
+
+    assert ensure_schema()
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            "SELECT message_count, user_message_count, assistant_message_count, total_chars, last_activity_at "
+            "FROM sessions WHERE id = 1"
+        )).one()
+    assert row[:4] == (3, 2, 1, len("Bonjour") + len("Bonjour !") + len("Ma facture"))
+    assert row.last_activity_at.startswith("2024-01-01 12:02:00")
+
+
+def test_migration_numbers_messages_before_the_unique_index(legacy_db):
+    engine, drop = legacy_db
+    drop("messages", "seq")
+
+    assert ensure_schema()
+    with engine.connect() as conn:
+        seqs = conn.execute(text("SELECT seq FROM messages WHERE session_id = 1 ORDER BY id")).scalars().all()
+        indexes = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars().all()
+    assert seqs == [1, 2, 3]
+    assert "ix_messages_session_seq" in indexes
+
+
+def test_migration_ranks_existing_classifications(legacy_db):
+    engine, drop = legacy_db
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO classifications (session_id, category, urgency, classified_at) "
+            "VALUES (1, 'Facturation', 'Urgent', :t)"
+        ), {"t": T0})
+    drop("classifications", "urgency_rank")
+
+    assert ensure_schema()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT urgency_rank FROM classifications")).scalar() == 0
+
+
+def test_added_columns_keep_not_null_and_their_default(legacy_db):
+    engine, drop = legacy_db
+    drop("classifications", "urgency_rank")
+
+    assert ensure_schema()
+    with engine.connect() as conn:
+        column = next(c for c in conn.execute(text("PRAGMA table_info(classifications)")) if c.name == "urgency_rank")
+    assert (column.notnull, column.dflt_value) == (1, "'1'")
+
+
+def test_not_null_column_without_server_default_is_refused(legacy_db, monkeypatch):
+    from types import SimpleNamespace
+
+    from sqlalchemy import Column, Integer, MetaData, Table
+
+    metadata = MetaData()
+    Table("users", metadata, Column("id", Integer, primary_key=True), Column("score", Integer, nullable=False))
+    monkeypatch.setattr(configs, "Base", SimpleNamespace(metadata=metadata))
+
+    with pytest.raises(RuntimeError, match="users.score"):
+        configs._add_missing_columns()
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+from conftest import new_session, new_user, send
+from sqlalchemy import event
+
+import configs
+from src.models import Session as SessionModel
+from src.shared_state import shared_state
+from src.utils import forget_principal
+
+
+@pytest.fixture
+def replica(client, tmp_path, monkeypatch):
+    """
+    Réplica sur un second fichier SQLite ; `sync()` y copie l'état courant
+    du primaire (entre deux copies, le réplica est en retard).
+    """
+    primary_path = configs.engine.url.database
+    replica_path = str(tmp_path / "replica.db")
+    replica_engine = configs._create_engine(f"sqlite:///{replica_path}")
+
+    def sync():
+        replica_engine.dispose()
+        source, target = sqlite3.connect(primary_path), sqlite3.connect(replica_path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+
+    sync()
+    monkeypatch.setattr(configs, "read_engine", replica_engine)
+    configs.ReadSessionLocal.configure(bind=replica_engine)
+    yield sync
+    configs.ReadSessionLocal.configure(bind=configs.engine)
+    replica_engine.dispose()
+
+
+@pytest.fixture
+def primary_checkouts():
+    """Connexions prises sur le primaire pendant le test."""
+    checkouts = []
+
+    def count(*args):
+        checkouts.append(1)
+
+    event.listen(configs.engine, "checkout", count)
+    yield checkouts
+    event.remove(configs.engine, "checkout", count)
+
+
+def test_reads_go_to_the_replica_without_touching_the_primary(client, db, replica, primary_checkouts):
+    headers, user_id = new_user(client)
+    sid = new_session(client, headers)
+    replica()
+    # Écrite sur le primaire après la copie : absente du réplica
+    db.add(SessionModel(user_id=user_id, title="pas encore répliquée"))
+    db.commit()
+    shared_state.delete(f"primary_pin:{user_id}")
+    forget_principal(user_id)  # l'utilisateur est relu en base, sur le réplica
+
+    primary_checkouts.clear()
+    r = client.get("/sessions", headers=headers)
+    assert r.status_code == 200
+    assert [s["id"] for s in r.json()] == [sid]
+    assert primary_checkouts == []
+
+
+def test_user_missing_on_the_replica_falls_back_to_the_primary(client, replica):
+    headers, user_id = new_user(client)  # créé après la copie
+    forget_principal(user_id)
+    r = client.get("/sessions", headers=headers)
+    assert r.status_code == 200
+    assert r.json() == []
+
+
+def test_writes_pin_the_user_to_the_primary(client, replica):
+    headers, user_id = new_user(client)
+    sid = new_session(client, headers)
+    replica()
+
+    send(client, headers, sid, "Ma facture est fausse")
+    assert shared_state.get(f"primary_pin:{user_id}")
+    r = client.get(f"/sessions/{sid}/messages", headers=headers)
+    assert [m["content"] for m in r.json()] == ["Ma facture est fausse", "Réponse de test."]
+
+    # Épinglage expiré : retour au réplica, encore en retard
+    shared_state.delete(f"primary_pin:{user_id}")
+    r = client.get(f"/sessions/{sid}/messages", headers=headers)
+    assert r.json() == []
@@ -0,0 +1,52 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from conftest import new_session, new_user, send
+
+from src.responses import CompressionMiddleware
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def test_large_session_detail_is_compressed_and_keeps_its_etag(client, llm):
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    llm.chat_payload = {"response": "Voici le détail de votre commande. " * 40}
+    for i in range(3):
+        send(client, headers, sid, f"Question {i} sur ma commande")
+
+    r = client.get(f"/sessions/{sid}", headers={**headers, **GZIP})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert int(r.headers["content-length"]) < len(r.content)
+    detail = r.json()
+    assert detail["id"] == sid
+    assert [m["role"] for m in detail["messages"]] == ["user", "assistant"] * 3
+
+    r = client.get(f"/sessions/{sid}", headers={**headers, **GZIP, "If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+
+
+def test_small_responses_are_not_compressed(client):
+    headers, _ = new_user(client)
+    r = client.get("/auth/me", headers={**headers, **GZIP})
+    assert "content-encoding" not in r.headers
+
+
+def test_excluded_paths_are_sent_uncompressed():
+    app = FastAPI()
+    body = "événement\n" * 500
+
+    @app.get("/events")
+    def events():
+        return PlainTextResponse(body)
+
+    @app.get("/report")
+    def report():
+        return PlainTextResponse(body)
+
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, exclude_paths=("/events",))
+    with TestClient(app) as test_client:
+        assert "content-encoding" not in test_client.get("/events", headers=GZIP).headers
+        assert test_client.get("/report", headers=GZIP).headers["content-encoding"] == "gzip"
@@ -0,0 +1,35 @@
+import time
+
+from conftest import new_user
+
+from src.shared_state import SqliteStore
+
+
+def test_metrics_are_reserved_to_agents(client):
+    headers, _ = new_user(client)
+    agent, _ = new_user(client, agent=True)
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers=headers).status_code == 403
+    r = client.get("/metrics", headers=agent)
+    assert r.status_code == 200
+    assert {"circuit_breakers", "events", "shared_state"} <= set(r.json())
+
+
+def test_sqlite_subscriber_survives_a_failing_handler(tmp_path, capsys):
+    store = SqliteStore(str(tmp_path / "state.db"), poll=0.01)
+    received = []
+
+    def handler(payload):
+        if payload == "invalide":
+            raise ValueError(payload)
+        received.append(payload)
+
+    store.subscribe("events", handler)
+    for payload in ("premier", "invalide", "second"):
+        store.publish("events", payload)
+    deadline = time.monotonic() + 2
+    while len(received) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert received == ["premier", "second"]
+    assert "ValueError('invalide')" in capsys.readouterr().out
@@ -0,0 +1,78 @@
+from conftest import new_user
+from sqlalchemy import insert, select
+
+from src import similarity
+from src.models import LSHBucket, Session as SessionModel, SessionSignature
+from src.similarity import BANDS, band_keys, find_similar, index_text, load_signature, minhash, pack, shingles
+
+FIRST = "Mon colis commandé le 3 mars n'est jamais arrivé"
+SECOND = "Le transporteur indique une livraison qui n'a pas eu lieu"
+
+
+def _session(db, user_id) -> int:
+    session = SessionModel(user_id=user_id)
+    db.add(session)
+    db.commit()
+    return session.id
+
+
+def _stale_reads(monkeypatch, *values):
+    """Les premières lectures de signature retournent `values` (lecture faite avant l'écriture d'un autre message)."""
+    stale = list(values)
+    real = similarity.load_signature
+    monkeypatch.setattr(similarity, "load_signature", lambda db, sid: stale.pop(0) if stale else real(db, sid))
+
+
+def _buckets(db, session_id):
+    return set(db.execute(select(LSHBucket.band, LSHBucket.bucket).where(LSHBucket.session_id == session_id)))
+
+
+def test_concurrent_first_insert_merges_signatures(client, db, monkeypatch):
+    _, user_id = new_user(client)
+    sid = _session(db, user_id)
+    index_text(db, sid, FIRST)
+    db.commit()
+
+    _stale_reads(monkeypatch, None)  # l'autre message n'avait pas encore vu de signature
+    index_text(db, sid, SECOND)
+    db.commit()
+
+    expected = minhash(shingles(FIRST) | shingles(SECOND))
+    assert load_signature(db, sid) == expected
+    assert _buckets(db, sid) == set(band_keys(expected))
+
+
+def test_stale_signature_is_not_overwritten(client, db, monkeypatch):
+    _, user_id = new_user(client)
+    sid = _session(db, user_id)
+    index_text(db, sid, FIRST)
+    db.commit()
+    before_second = load_signature(db, sid)
+    index_text(db, sid, SECOND)
+    db.commit()
+
+    _stale_reads(monkeypatch, before_second)  # signature lue avant l'écriture de SECOND
+    index_text(db, sid, "Je voudrais un remboursement rapide")
+    db.commit()
+
+    expected = minhash(shingles(FIRST) | shingles(SECOND) | shingles("Je voudrais un remboursement rapide"))
+    assert load_signature(db, sid) == expected
+    assert len(_buckets(db, sid)) == BANDS
+
+
+def test_candidates_sharing_more_bands_come_first(client, db, monkeypatch):
+    _, user_id = new_user(client)
+    target, weak, near = (_session(db, user_id) for _ in range(3))
+    signature = [10 ** 9 + i for i in range(64)]
+    signatures = {
+        target: signature,
+        near: signature[:-1] + [1],  # 15 bandes sur 16 en commun
+        weak: signature[:4] + [2] * 60,  # une seule bande en commun
+    }
+    for sid, values in signatures.items():
+        db.execute(insert(SessionSignature).values(session_id=sid, signature=pack(values)))
+        db.execute(insert(LSHBucket), [{"band": b, "bucket": k, "session_id": sid} for b, k in band_keys(values)])
+    db.commit()
+
+    monkeypatch.setattr(similarity, "MAX_CANDIDATES", 1)
+    assert [item["session_id"] for item in find_similar(db, target, threshold=0)] == [near]
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+from conftest import new_session, new_user, send
+
+from src.models import Classification
+
+
+def _ticket(client, llm, urgency="Moyen") -> int:
+    headers, _ = new_user(client)
+    sid = new_session(client, headers)
+    send(client, headers, sid, "Ma facture est fausse")
+    llm.classification = {**llm.classification, "urgency": urgency}
+    assert client.post(f"/sessions/{sid}/classify", headers=headers).status_code == 200
+    return sid
+
+
+def test_claimed_ticket_is_held_until_the_lease_expires(client, db, llm):
+    sid = _ticket(client, llm)
+    alice, alice_id = new_user(client, agent=True)
+    bob, bob_id = new_user(client, agent=True)
+
+    r = client.post(f"/queue/{sid}/claim", headers=alice)
+    assert r.status_code == 200 and r.json()["claimed_by"] == alice_id
+    assert client.post(f"/queue/{sid}/claim", headers=bob).status_code == 409
+    assert client.post(f"/queue/{sid}/resolve", headers=bob).status_code == 409
+    assert sid not in [t["session_id"] for t in client.get("/queue?limit=200", headers=bob).json()]
+
+    db.query(Classification).filter(Classification.session_id == sid).update(
+        {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}
+    )
+    db.commit()
+    r = client.post(f"/queue/{sid}/claim", headers=bob)
+    assert r.status_code == 200 and r.json()["claimed_by"] == bob_id
+    assert client.post(f"/queue/{sid}/release", headers=alice).status_code == 404
+
+    r = client.post(f"/queue/{sid}/resolve", headers=bob)
+    assert r.status_code == 200 and r.json()["resolved_at"]
+    assert client.post(f"/queue/{sid}/claim", headers=alice).status_code == 404
+
+
+def test_claim_next_takes_the_most_urgent_ticket(client, llm):
+    _ticket(client, llm, "Faible")
+    urgent = _ticket(client, llm, "Urgent")
+    agent, agent_id = new_user(client, agent=True)
+
+    r = client.post("/queue/claim", headers=agent)
+    assert r.status_code == 200
+    assert (r.json()["session_id"], r.json()["claimed_by"]) == (urgent, agent_id)
+    # Le ticket détenu ne revient pas au suivant
+    other, _ = new_user(client, agent=True)
+    assert client.post("/queue/claim", headers=other).json()["session_id"] != urgent
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import time
-from typing import List, Optional
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
+import requests.adapters
 import streamlit as st
 
 BACKEND_URL = "http://localhost:8000"  # URL du backend FastAPI
@@ -11,17 +13,51 @@ BACKEND_URL = "http://localhost:8000"  # URL du backend FastAPI
 # --------------------------------------------------------------------------- #
 # Helpers API
 # --------------------------------------------------------------------------- #
+@st.cache_resource
+def http_session() -> requests.Session:
+    """Session HTTP partagée entre les reruns (connexions keep-alive réutilisées)."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def etag_store() -> Dict[Tuple, Tuple[str, Any]]:
+    """Dernière réponse connue par (endpoint, token, params) : {clé: (etag, json)}."""
+    return {}
+
 def api_post(endpoint: str, token: Optional[str] = None, **kwargs) -> requests.Response:
     headers = kwargs.pop("headers", {})
     if token:
         headers["Authorization"] = f"Bearer {token}"
-    return requests.post(f"{BACKEND_URL}{endpoint}", headers=headers, **kwargs)
+    return http_session().post(f"{BACKEND_URL}{endpoint}", headers=headers, **kwargs)
 
 def api_get(endpoint: str, token: Optional[str] = None, **kwargs) -> requests.Response:
     headers = kwargs.pop("headers", {})
     if token:
         headers["Authorization"] = f"Bearer {token}"
-    return requests.get(f"{BACKEND_URL}{endpoint}", headers=headers, **kwargs)
+    return http_session().get(f"{BACKEND_URL}{endpoint}", headers=headers, **kwargs)
+
+def conditional_get_json(endpoint: str, token: Optional[str] = None, params: Optional[dict] = None) -> Any:
+    """GET conditionnel : renvoie le JSON en cache si le backend répond 304."""
+    key = (endpoint, token, tuple(sorted((params or {}).items())))
+    store = etag_store()
+    cached = store.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    resp = api_get(endpoint, token=token, params=params, headers=headers, timeout=10)
+    if resp.status_code == 304 and cached:
+        return cached[1]
+    resp.raise_for_status()
+    data = resp.json()
+    if resp.headers.get("ETag"):
+        store[key] = (resp.headers["ETag"], data)
+    return data
+
+@st.cache_data(ttl=5, show_spinner=False)
+def cached_get_json(endpoint: str, token: Optional[str] = None, params: Optional[dict] = None) -> Any:
+    """Couche TTL : les reruns rapprochés ne touchent pas le réseau."""
+    return conditional_get_json(endpoint, token, params)
 
 # --------------------------------------------------------------------------- #
 # Auth helpers
@@ -131,13 +167,37 @@ def new_or_existing_session(token: str) -> int:
     st.session_state.session_id = session_id
     return session_id
 
-def fetch_messages(token: str, session_id: int) -> List[dict]:
-    resp = api_get(f"/sessions/{session_id}/messages", token=token, timeout=10)
-    resp.raise_for_status()
-    return resp.json()
+def fetch_messages(token: str, session_id: int, after_id: Optional[int] = None) -> List[dict]:
+    if after_id is None:
+        return list(cached_get_json(f"/sessions/{session_id}/messages", token))
+    return conditional_get_json(f"/sessions/{session_id}/messages", token, {"after_id": after_id})
 
-def send_message_backend(token: str, session_id: int, content: str) -> None:
-    api_post("/messages", token=token, params={"session_id": session_id}, json={"role": "user", "content": content}, timeout=30).raise_for_status()
+ASSISTANT_UNAVAILABLE = (
+    "Notre assistant est momentanément indisponible. "
+    "Votre message a bien été enregistré, veuillez réessayer dans quelques instants."
+)
+
+def send_message_backend(token: str, session_id: int, content: str, client_message_id: str, attempts: int = 3) -> bool:
+    """
+    Envoi idempotent : les renvois après timeout réutilisent la même clé (pas de doublon ni de second appel LLM).
+    Retourne False si le message est enregistré mais que l'assistant n'a pas pu répondre.
+    """
+    for attempt in range(attempts):
+        try:
+            resp = api_post(
+                "/messages",
+                token=token,
+                params={"session_id": session_id},
+                json={"role": "user", "content": content},
+                headers={"Idempotency-Key": client_message_id},
+                timeout=30,
+            )
+            resp.raise_for_status()
+            return resp.headers.get("X-Assistant-Status") != "unavailable"
+        except (requests.Timeout, requests.ConnectionError):
+            if attempt == attempts - 1:
+                raise
+            time.sleep(1 + attempt)
 
 def chat_interface():
     st.set_page_config(page_title="Smart Support - Chat", page_icon="🤖", layout="wide")
@@ -151,7 +211,7 @@ def chat_interface():
     with st.sidebar:
         st.markdown(f"### 👤 {st.session_state.username}")
         if st.button("🚪 Se déconnecter"):
-            for key in ("authenticated", "token", "username", "messages", "session_id"):
+            for key in ("authenticated", "token", "username", "messages", "session_id", "pending_message"):
                 st.session_state.pop(key, None)
             st.query_params.update({"authenticated": "0"})
             st.rerun()
@@ -172,15 +232,25 @@ def chat_interface():
     for msg in st.session_state.messages:
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
+    if st.session_state.pop("assistant_unavailable", False):
+        st.warning(ASSISTANT_UNAVAILABLE)
 
     prompt = st.chat_input("💬 Tapez votre message ici…")
     if prompt:
         with st.chat_message("user"):
             st.markdown(prompt)
+        # Même clé si l'utilisateur renvoie le même texte après un échec
+        pending = st.session_state.get("pending_message")
+        if not pending or pending["content"] != prompt:
+            pending = {"content": prompt, "id": str(uuid.uuid4())}
+            st.session_state.pending_message = pending
         try:
-            send_message_backend(token, session_id, prompt)
-            time.sleep(1)
-            st.session_state.messages = fetch_messages(token, session_id)
+            if not send_message_backend(token, session_id, prompt, pending["id"]):
+                st.session_state.assistant_unavailable = True
+            st.session_state.pop("pending_message", None)
+            # Le backend a déjà enregistré la réponse : on ne récupère que les nouveaux messages
+            last_id = st.session_state.messages[-1]["id"] if st.session_state.messages else None
+            st.session_state.messages += fetch_messages(token, session_id, after_id=last_id)
             st.rerun()
         except requests.RequestException as exc:
             st.error(f"Erreur : {exc}")
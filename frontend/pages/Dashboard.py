@@ -4,13 +4,15 @@ Dashboard Streamlit pour les agents Smart Support.
 
 from __future__ import annotations
 
+import json
 import time
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
 import plotly.express as px
 import requests
+import requests.adapters
 import streamlit as st
 
 API_BASE_URL = "http://localhost:8000"
@@ -38,6 +40,8 @@ def authenticate_admin() -> bool:
                     if resp.status_code == 200:
                         st.session_state.admin_token = resp.json()["access_token"]
                         st.session_state.admin_username = username
+                        me = requests.get(f"{API_BASE_URL}/auth/me", headers={"Authorization": f"Bearer {st.session_state.admin_token}"}, timeout=5)
+                        st.session_state.admin_user_id = me.json().get("id") if me.ok else None
                         st.success("Connexion réussie !")
                         time.sleep(1)
                         st.rerun()
@@ -48,28 +52,94 @@ def authenticate_admin() -> bool:
     return False
 
 
+@st.cache_resource
+def http_session() -> requests.Session:
+    """Session HTTP partagée entre les reruns (connexions keep-alive réutilisées)."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def etag_store() -> Dict[Tuple, Tuple[str, Any]]:
+    """Dernière réponse connue par (endpoint, token, params) : {clé: (etag, json)}."""
+    return {}
+
+
 def api_get(endpoint: str, token: str, **kwargs) -> requests.Response:
-    headers = {"Authorization": f"Bearer {token}"}
-    return requests.get(f"{API_BASE_URL}{endpoint}", headers=headers, **kwargs)
+    headers = {"Authorization": f"Bearer {token}", **kwargs.pop("headers", {})}
+    return http_session().get(f"{API_BASE_URL}{endpoint}", headers=headers, **kwargs)
+
+
+def conditional_get_json(endpoint: str, token: str, params: Optional[dict] = None) -> Any:
+    """GET conditionnel : renvoie le JSON en cache si le backend répond 304."""
+    key = (endpoint, token, tuple(sorted((params or {}).items())))
+    store = etag_store()
+    cached = store.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    resp = api_get(endpoint, token, params=params, headers=headers, timeout=10)
+    if resp.status_code == 304 and cached:
+        return cached[1]
+    resp.raise_for_status()
+    data = resp.json()
+    if resp.headers.get("ETag"):
+        store[key] = (resp.headers["ETag"], data)
+    return data
+
+
+@st.cache_data(ttl=10, show_spinner=False)
+def cached_get_json(endpoint: str, token: str, params: Optional[dict] = None) -> Any:
+    """Couche TTL : les reruns rapprochés ne touchent pas le réseau."""
+    return conditional_get_json(endpoint, token, params)
 
 
 # --------------------------------------------------------------------------- #
 # Data loaders
 # --------------------------------------------------------------------------- #
-def get_classifications(token: str) -> List[Dict]:
+def get_classifications(token: str, fresh: bool = False) -> List[Dict]:
     try:
-        resp = api_get("/classifications", token, timeout=10)
-        if resp.status_code == 200:
-            return resp.json()
-        if resp.status_code == 401:
+        loader = conditional_get_json if fresh else cached_get_json
+        return [dict(item) for item in loader("/classifications", token)]
+    except requests.HTTPError as exc:
+        if exc.response is not None and exc.response.status_code == 401:
             st.error("Session expirée")
             st.session_state.admin_token = None
             st.rerun()
+        st.error(f"Erreur API : {exc}")
     except requests.RequestException as exc:
         st.error(f"Erreur API : {exc}")
     return []
 
 
+def wait_for_classifications(token: str, timeout: float = 25.0) -> List[Dict]:
+    """
+    Écoute le flux SSE /events jusqu'à la première classification reçue
+    (ou jusqu'à `timeout` secondes) et retourne les nouvelles classifications.
+    """
+    received: List[Dict] = []
+    deadline = time.monotonic() + timeout
+    try:
+        with http_session().get(
+            f"{API_BASE_URL}/events",
+            headers={"Authorization": f"Bearer {token}"},
+            stream=True,
+            timeout=(5, timeout),
+        ) as resp:
+            for line in resp.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    event = json.loads(line[len("data: "):])
+                    if event.get("type") == "classification_created":
+                        received.append(event["data"])
+                        break
+                if time.monotonic() > deadline:
+                    break
+    except requests.RequestException:
+        pass
+    return received
+
+
 # --------------------------------------------------------------------------- #
 # Charts & metrics helpers
 # --------------------------------------------------------------------------- #
@@ -106,25 +176,58 @@ def metric_cards(df: pd.DataFrame):
     col3.metric("Catégories", df["category"].nunique())
 
 
+# Les figures sont mises en cache sur leurs données agrégées : un rerun sans
+# changement ne reconstruit aucun graphique plotly.
+@st.cache_data(show_spinner=False)
+def _pie_figure(counts: pd.DataFrame):
+    return px.pie(counts, names="index", values="count", hole=0.3, title="Répartition par catégorie")
+
+
+@st.cache_data(show_spinner=False)
+def _bar_figure(counts: pd.DataFrame):
+    fig = px.bar(counts, x="index", y="count", title="Niveau d'urgence", color="index", color_discrete_map={"Urgent": "#FF6B6B", "Moyen": "#FFD93D", "Faible": "#6BCF7F"})
+    fig.update_layout(showlegend=False, xaxis_title=None, yaxis_title="Demandes")
+    return fig
+
+
+@st.cache_data(show_spinner=False)
+def _timeline_figure(counts: pd.DataFrame):
+    return px.line(counts, x="date", y="count", markers=True, title="Demandes par jour")
+
+
 def pie_categories(df: pd.DataFrame):
     counts = df["category"].value_counts().reset_index(name="count")
-    fig = px.pie(counts, names="index", values="count", hole=0.3, title="Répartition par catégorie")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(_pie_figure(counts), use_container_width=True)
 
 
 def bar_urgency(df: pd.DataFrame):
     order = ["Urgent", "Moyen", "Faible"]
     counts = df["urgency"].value_counts().reindex(order).fillna(0).reset_index(name="count")
-    fig = px.bar(counts, x="index", y="count", title="Niveau d'urgence", color="index", color_discrete_map={"Urgent": "#FF6B6B", "Moyen": "#FFD93D", "Faible": "#6BCF7F"})
-    fig.update_layout(showlegend=False, xaxis_title=None, yaxis_title="Demandes")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(_bar_figure(counts), use_container_width=True)
 
 
 def timeline(df: pd.DataFrame):
     df["date"] = df["created_at"].dt.date
     counts = df.groupby("date").size().reset_index(name="count")
-    fig = px.line(counts, x="date", y="count", markers=True, title="Demandes par jour")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(_timeline_figure(counts), use_container_width=True)
+
+
+@st.cache_data(show_spinner=False)
+def _keywords_figure(counts: pd.DataFrame):
+    fig = px.bar(counts, x="count", y="keyword", orientation="h", title="Mots-clés tendance (7 jours)")
+    fig.update_layout(yaxis={"categoryorder": "total ascending"}, xaxis_title="Occurrences", yaxis_title=None)
+    return fig
+
+
+def trending_keywords(token: str):
+    """Top mots-clés, agrégés côté backend depuis les compteurs journaliers."""
+    try:
+        items = cached_get_json("/keywords/trending", token, {"days": 7, "limit": 10})
+    except requests.RequestException as exc:
+        st.error(f"Erreur API : {exc}")
+        return
+    if items:
+        st.plotly_chart(_keywords_figure(pd.DataFrame(items)), use_container_width=True)
 
 
 def recent_table(df: pd.DataFrame):
@@ -134,6 +237,51 @@ def recent_table(df: pd.DataFrame):
     st.dataframe(display_df[["session_id", "category", "urgency", "Date"]], use_container_width=True)
 
 
+def api_post(endpoint: str, token: str, **kwargs) -> requests.Response:
+    headers = {"Authorization": f"Bearer {token}", **kwargs.pop("headers", {})}
+    return http_session().post(f"{API_BASE_URL}{endpoint}", headers=headers, **kwargs)
+
+
+def work_queue(token: str):
+    """File des agents : tickets non résolus servis par le backend, déjà triés."""
+    st.subheader("🚨 File de traitement")
+    try:
+        resp = api_get("/queue", token, params={"limit": 10, "include_claimed": True}, timeout=10)
+        resp.raise_for_status()
+        items = resp.json()
+    except requests.RequestException as exc:
+        st.error(f"Erreur API : {exc}")
+        return
+    if not items:
+        st.info("Aucun ticket en attente")
+        return
+
+    mine = st.session_state.get("admin_user_id")
+    for item in items:
+        col1, col2, col3 = st.columns([6, 1, 1])
+        held = item["claimed_by"] is not None and item["lease_expires_at"] is not None
+        owner = " · pris en charge" if held else ""
+        col1.markdown(f"**{item['urgency']}** · {item['category']} · session {item['session_id']}{owner}  \n{item.get('summary') or ''}")
+        sid = item["session_id"]
+        if col2.button("Prendre", key=f"claim_{sid}", disabled=held and item["claimed_by"] != mine):
+            resp = api_post(f"/queue/{sid}/claim", token, timeout=10)
+            if resp.status_code == 409:
+                st.warning(resp.json().get("detail"))
+            st.rerun()
+        if col3.button("Résolu", key=f"resolve_{sid}"):
+            resp = api_post(f"/queue/{sid}/resolve", token, timeout=10)
+            if resp.status_code == 409:
+                st.warning(resp.json().get("detail"))
+            st.rerun()
+
+
+def follow_live_updates():
+    new_items = wait_for_classifications(st.session_state.admin_token)
+    if new_items:
+        st.session_state.classifications.extend(new_items)
+    st.rerun()
+
+
 # --------------------------------------------------------------------------- #
 # Main
 # --------------------------------------------------------------------------- #
@@ -146,19 +294,27 @@ def main():
 
     st.sidebar.write(f"Connecté : **{st.session_state.admin_username}**")
     if st.sidebar.button("🚪 Déconnexion"):
-        for key in ("admin_token", "admin_username"):
+        for key in ("admin_token", "admin_username", "admin_user_id", "classifications"):
             st.session_state.pop(key, None)
         st.experimental_rerun()
 
     period = st.sidebar.selectbox("Période", ["Aujourd'hui", "7 derniers jours", "30 derniers jours", "Tout"])
-    if st.sidebar.button("🔄 Actualiser"):
-        st.rerun()
-
-    with st.spinner("Chargement…"):
-        raw_data = get_classifications(st.session_state.admin_token)
+    live = st.sidebar.checkbox("🔴 Temps réel", value=False)
+    refresh = st.sidebar.button("🔄 Actualiser")
+
+    # Chargement complet une seule fois ; ensuite seuls les événements sont ajoutés.
+    # « Actualiser » fait un GET conditionnel : 304 si rien n'a changé.
+    if refresh or "classifications" not in st.session_state:
+        with st.spinner("Chargement…"):
+            st.session_state.classifications = get_classifications(
+                st.session_state.admin_token, fresh=refresh
+            )
+    raw_data = [dict(item) for item in st.session_state.classifications]
 
     if not raw_data:
         st.warning("Aucune donnée")
+        if live:
+            follow_live_updates()
         return
 
     filtered = apply_period_filter(raw_data, period)
@@ -173,8 +329,13 @@ def main():
         bar_urgency(df)
 
     timeline(df)
+    trending_keywords(st.session_state.admin_token)
+    work_queue(st.session_state.admin_token)
     recent_table(df)
 
+    if live:
+        follow_live_updates()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file